@@ -6,7 +6,10 @@ import os
 
 import streamlit as st
 
-from chatbot import MemoryChatbot
+from chatbot import MemoryChatbot, create_llm
+from memory.manager_pool import MemoryManagerPool
+from memory.tracing import tracer
+from memory.warmup import warm_up
 
 # Cấu hình trang
 st.set_page_config(
@@ -17,6 +20,17 @@ st.set_page_config(
 )
 
 
+@st.cache_resource
+def get_memory_pool(api_key: str) -> MemoryManagerPool:
+    """Pool MemoryManager và LLM dùng chung cho mọi phiên Streamlit (cache theo API key)"""
+    pool = MemoryManagerPool(llm=create_llm())
+    # Nạp model và index của người dùng hoạt động nhiều một lần khi tạo pool
+    report = warm_up(pool)
+    if not report["ready"]:
+        print(f"Warm-up chưa hoàn tất: {report['steps']}")
+    return pool
+
+
 def main():
     st.title("Chatbot Demo")
 
@@ -46,6 +60,13 @@ def main():
 
         st.divider()
 
+        # Bật tracing để xem phân rã thời gian của từng lượt
+        tracer.enabled = st.checkbox(
+            "🐞 Debug: đo thời gian mỗi lượt",
+            value=tracer.enabled,
+            help="Bật tracing cho process (chi phí gần như bằng 0 khi tắt)",
+        )
+
         # Thông tin memory
         # if st.button("📊 Xem thông tin Memory"):
         #     if google_api_key:
@@ -85,13 +106,17 @@ def main():
 
     # Khởi tạo chatbot
     try:
-        if (
-            "chatbot" not in st.session_state
-            or st.session_state.get("current_user_id") != user_id
-        ):
-            st.info("Khởi tạo chatbot...")
-            st.session_state.chatbot = MemoryChatbot(user_id, session_id)
-            st.session_state.current_user_id = user_id
+        if "chatbot" not in st.session_state or st.session_state.get(
+            "current_key"
+        ) != (user_id, session_id):
+            pool = get_memory_pool(google_api_key)
+            st.session_state.chatbot = MemoryChatbot(
+                user_id,
+                session_id,
+                llm=pool.llm,
+                memory_manager=pool.get(user_id, session_id),
+            )
+            st.session_state.current_key = (user_id, session_id)
             st.session_state.messages = []
 
         chatbot = st.session_state.chatbot
@@ -124,6 +149,19 @@ def main():
                             {"role": "assistant", "content": error_msg}
                         )
 
+        # Debug panel: phân rã thời gian và token của lượt gần nhất
+        if tracer.enabled and chatbot.last_turn_trace:
+            with st.expander("🐞 Lượt gần nhất", expanded=False):
+                trace = chatbot.last_turn_trace
+                st.metric("Tổng thời gian", f"{trace['total_ms']:.0f} ms")
+                st.bar_chart(
+                    {name: entry["ms"] for name, entry in trace["breakdown"].items()},
+                    horizontal=True,
+                )
+                st.json(
+                    {"breakdown": trace["breakdown"], "prompt": chatbot.last_prompt_stats}
+                )
+
         # Tìm kiếm memory
         # st.divider()
         # st.subheader("🔍 Tìm kiếm Memory")
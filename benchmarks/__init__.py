@@ -0,0 +1,3 @@
+"""
+Benchmark cho memory subsystem, chạy offline với embeddings giả và LLM stub
+"""
@@ -0,0 +1,93 @@
+"""
+So sánh hai file kết quả benchmark (ví dụ giữa hai commit)
+
+Ví dụ:
+    python -m benchmarks.compare baseline.json results.json --threshold 0.15
+
+Thoát với mã 1 nếu có chỉ số chậm/tốn hơn baseline quá ngưỡng.
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _ratio(old: Optional[float], new: Optional[float]) -> Optional[float]:
+    if not old or new is None:
+        return None
+    return new / old
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float
+) -> Tuple[List[Tuple[str, float, float, float]], List[str]]:
+    """
+    So sánh các chỉ số p50/p99, bytes ghi mỗi lượt và RAM đỉnh
+
+    Args:
+        baseline: Kết quả gốc
+        current: Kết quả mới
+        threshold: Tỷ lệ tăng tối đa cho phép (0.1 = 10%)
+
+    Returns:
+        (các dòng (chỉ số, cũ, mới, tỷ lệ), danh sách chỉ số bị regression)
+    """
+    rows, regressions = [], []
+
+    def check(name: str, old: Optional[float], new: Optional[float]) -> None:
+        ratio = _ratio(old, new)
+        if ratio is None:
+            return
+        rows.append((name, old, new, ratio))
+        if ratio > 1 + threshold:
+            regressions.append(name)
+
+    for operation, stats in current["operations"].items():
+        old_stats = baseline["operations"].get(operation)
+        if old_stats is None:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            check(f"{operation}.{key}", old_stats[key], stats[key])
+
+    if "bytes_written_per_turn" in current:
+        check(
+            "bytes_written_per_turn.mean",
+            baseline.get("bytes_written_per_turn", {}).get("mean"),
+            current["bytes_written_per_turn"]["mean"],
+        )
+    check("peak_rss_mb", baseline.get("peak_rss_mb"), current.get("peak_rss_mb"))
+    return rows, regressions
+
+
+def main():
+    """Entry point của CLI"""
+    parser = argparse.ArgumentParser(description="So sánh kết quả benchmark")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = json.load(f)
+
+    if baseline.get("parameters") != current.get("parameters"):
+        print("⚠️  Tham số của hai lần chạy khác nhau, kết quả có thể không so sánh được")
+
+    rows, regressions = compare(baseline, current, args.threshold)
+    print(f"{'Chỉ số':<48}{'baseline':>12}{'hiện tại':>12}{'tỷ lệ':>9}")
+    print("─" * 81)
+    for name, old, new, ratio in rows:
+        marker = " ❌" if name in regressions else ""
+        print(f"{name:<48}{old:>12.2f}{new:>12.2f}{ratio:>8.2f}x{marker}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} chỉ số vượt ngưỡng {args.threshold:.0%}")
+        sys.exit(1)
+    print("\n✅ Không có regression")
+
+
+if __name__ == "__main__":
+    main()
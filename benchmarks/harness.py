@@ -0,0 +1,147 @@
+"""
+Đo thời gian theo thao tác, số bytes ghi và RAM đỉnh cho benchmark
+"""
+
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows không có module resource
+    resource = None
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """
+    Percentile theo nội suy tuyến tính (giống numpy.percentile)
+
+    Args:
+        samples: Các giá trị đo
+        q: Phần trăm (0-100)
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class Recorder:
+    """Ghi nhận thời gian của từng thao tác"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    @contextmanager
+    def measure(self, operation: str) -> Iterator[None]:
+        """Đo thời gian chạy của một khối lệnh"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[operation].append(time.perf_counter() - started)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Thống kê (ms) cho từng thao tác"""
+        result = {}
+        for operation, samples in sorted(self.samples.items()):
+            result[operation] = {
+                "count": len(samples),
+                "p50_ms": round(percentile(samples, 50) * 1000, 3),
+                "p99_ms": round(percentile(samples, 99) * 1000, 3),
+                "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+                "max_ms": round(max(samples) * 1000, 3),
+            }
+        return result
+
+
+def bytes_written() -> Optional[int]:
+    """
+    Tổng số bytes process đã ghi qua write() (Linux /proc/self/io)
+
+    Returns:
+        Số bytes, None nếu hệ thống không hỗ trợ
+    """
+    try:
+        with open("/proc/self/io", "r") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def directory_size(path: Path) -> int:
+    """Tổng kích thước các file trong thư mục (dùng khi không có /proc)"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class WriteMeter:
+    """Đo số bytes ghi xuống đĩa trong một khoảng thời gian"""
+
+    def __init__(self, data_dir: Path):
+        self.data_dir = data_dir
+        self.method = "proc_wchar" if bytes_written() is not None else "dir_size_delta"
+        self._start = 0
+
+    def _read(self) -> int:
+        if self.method == "proc_wchar":
+            return bytes_written()
+        return directory_size(self.data_dir)
+
+    def start(self) -> None:
+        """Bắt đầu đo"""
+        self._start = self._read()
+
+    def stop(self) -> int:
+        """Kết thúc đo, trả về số bytes đã ghi"""
+        return max(self._read() - self._start, 0)
+
+
+def peak_rss_mb() -> Optional[float]:
+    """RAM đỉnh của process (MB), None nếu không đo được"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về bytes
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def environment_info(root: Path) -> Dict[str, Any]:
+    """Thông tin môi trường để so sánh kết quả giữa các commit"""
+    commit = None
+    try:
+        import subprocess
+
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=root,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        ).stdout.strip() or None
+    except Exception:
+        pass
+    return {
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
@@ -0,0 +1,140 @@
+"""
+Benchmark thời gian import (khởi động CLI) của các module chính
+
+Mỗi lần đo chạy `import <module>` trong một process Python mới nên không bị
+ảnh hưởng bởi cache của sys.modules. Ngoài thời gian, benchmark còn kiểm tra
+các thư viện nặng (torch, sentence_transformers, langchain_google_genai, ...)
+không bị nạp chỉ vì import, và việc import config không tạo thư mục dữ liệu.
+
+Ví dụ:
+    python -m benchmarks.import_time --repeat 10 --output imports.json
+    python -m benchmarks.compare imports_baseline.json imports.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .harness import environment_info, percentile
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_MODULES = ["config", "memory", "memory.memory_manager", "chatbot", "demo_cli"]
+
+# Các thư viện chỉ được nạp khi thật sự dùng tới
+HEAVY_MODULES = [
+    "torch",
+    "transformers",
+    "sentence_transformers",
+    "langchain_google_genai",
+    "faiss",
+]
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"seconds": elapsed, "heavy": heavy}}))
+"""
+
+
+def measure_import(module: str, env: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Import module trong một process mới
+
+    Args:
+        module: Tên module
+        env: Biến môi trường của process con
+
+    Returns:
+        {"seconds": thời gian import, "heavy": các thư viện nặng đã bị nạp}
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_benchmark(modules: List[str], repeat: int, data_dir: Path) -> Dict[str, Any]:
+    """
+    Đo thời gian import của từng module
+
+    Returns:
+        Kết quả dạng dict (cùng định dạng "operations" với benchmarks.run)
+    """
+    env = dict(os.environ, DATA_DIR=str(data_dir))
+    for name in ("ENTITIES_DIR", "CHAT_HISTORY_DIR", "VECTOR_STORE_DIR"):
+        env[name] = str(data_dir / name.lower())
+
+    operations, heavy = {}, {}
+    for module in modules:
+        samples, loaded = [], set()
+        for _ in range(repeat):
+            result = measure_import(module, env)
+            samples.append(result["seconds"])
+            loaded.update(result["heavy"])
+        operations[f"import {module}"] = {
+            "count": len(samples),
+            "p50_ms": round(percentile(samples, 50) * 1000, 3),
+            "p99_ms": round(percentile(samples, 99) * 1000, 3),
+            "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+            "max_ms": round(max(samples) * 1000, 3),
+        }
+        heavy[module] = sorted(loaded)
+
+    return {
+        "benchmark": "import_time",
+        "environment": environment_info(ROOT),
+        "parameters": {"modules": modules, "repeat": repeat},
+        "operations": operations,
+        "heavy_modules": heavy,
+        "created_dirs": sorted(p.name for p in data_dir.iterdir()),
+    }
+
+
+def main():
+    """Entry point của CLI"""
+    parser = argparse.ArgumentParser(description="Benchmark thời gian import")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=5, help="Số lần đo mỗi module")
+    parser.add_argument("--output", help="Ghi kết quả JSON ra file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="import-bench-") as tmp:
+        results = run_benchmark(args.modules, args.repeat, Path(tmp))
+
+    print(f"\n{'Module':<36}{'p50 ms':>11}{'p99 ms':>11}  Thư viện nặng đã nạp")
+    print("─" * 80)
+    for module in args.modules:
+        stats = results["operations"][f"import {module}"]
+        loaded = ", ".join(results["heavy_modules"][module]) or "-"
+        print(f"{module:<36}{stats['p50_ms']:>11.1f}{stats['p99_ms']:>11.1f}  {loaded}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"✅ Đã ghi kết quả vào {args.output}")
+
+    problems = [m for m, loaded in results["heavy_modules"].items() if loaded]
+    if results["created_dirs"]:
+        print(f"❌ Import đã tạo thư mục dữ liệu: {', '.join(results['created_dirs'])}")
+        sys.exit(1)
+    if problems:
+        print(f"❌ Import nạp thư viện nặng: {', '.join(problems)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Load test cho ASGI service (server.py)
+
+Mặc định chạy service ngay trong process (httpx.ASGITransport) với LLM stub
+và embeddings băm nên không cần mạng hay uvicorn; dùng --url để bắn vào một
+server đang chạy. Mỗi người dùng ảo gửi lần lượt các request (chat, chat
+stream, tìm kiếm memory, tóm tắt) với --concurrency request song song, báo
+cáo p50/p99 theo endpoint, throughput và số request bị từ chối (429/503).
+
+Ví dụ:
+    python -m benchmarks.load --users 20 --requests 10 --workers 2
+    python -m benchmarks.load --users 5 --concurrency 8   # thấy backpressure 429
+    python -m benchmarks.load --url http://localhost:8000 --users 100
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .harness import Recorder, environment_info, peak_rss_mb
+from .run import ROOT, configure_environment
+from .synthetic import SyntheticUser
+
+# Tỷ lệ các loại request của một người dùng
+MIX = [("chat", 0.6), ("chat_stream", 0.2), ("search", 0.15), ("summary", 0.05)]
+
+
+async def _request(client: Any, kind: str, user: SyntheticUser, turn: int) -> int:
+    """Gửi một request, trả về HTTP status"""
+    if kind == "chat":
+        body = {"user_id": user.user_id, "message": user.user_message(turn)}
+        response = await client.post("/chat", json=body)
+    elif kind == "chat_stream":
+        body = {"user_id": user.user_id, "message": user.user_message(turn)}
+        async with client.stream("POST", "/chat/stream", json=body) as response:
+            async for _ in response.aiter_bytes():
+                pass
+    elif kind == "search":
+        params = {"user_id": user.user_id, "q": user.user_message(turn)}
+        response = await client.get("/memory/search", params=params)
+    else:
+        response = await client.get("/memory/summary", params={"user_id": user.user_id})
+    return response.status_code
+
+
+async def _user_loop(
+    client: Any, user: SyntheticUser, args: argparse.Namespace,
+    recorder: Recorder, statuses: Counter,
+) -> None:
+    """Một người dùng ảo gửi args.requests request, args.concurrency request một lúc"""
+    rng = random.Random(user.user_id)
+    kinds, weights = zip(*MIX)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(turn: int) -> None:
+        kind = rng.choices(kinds, weights)[0]
+        async with semaphore:
+            started = time.perf_counter()
+            status = await _request(client, kind, user, turn)
+            if status == 200:
+                recorder.samples[kind].append(time.perf_counter() - started)
+            statuses[status] += 1
+
+    await asyncio.gather(*(one(turn) for turn in range(args.requests)))
+
+
+async def run_load(args: argparse.Namespace, service: Optional[Any]) -> Dict[str, Any]:
+    """
+    Chạy load test
+
+    Args:
+        args: Tham số dòng lệnh
+        service: ChatService chạy trong process (None khi dùng --url)
+    """
+    import httpx
+
+    if service is not None:
+        transport = httpx.ASGITransport(app=service)
+        client = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None)
+        await service.startup()
+        while not service.pool.health()["ready"]:
+            await asyncio.sleep(0.05)
+    else:
+        client = httpx.AsyncClient(base_url=args.url, timeout=None)
+
+    recorder, statuses = Recorder(), Counter()
+    users = [SyntheticUser(index, seed=args.seed) for index in range(args.users)]
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(_user_loop(client, u, args, recorder, statuses) for u in users))
+        elapsed = time.perf_counter() - started
+        health = (await client.get("/healthz")).json()
+    finally:
+        await client.aclose()
+        if service is not None:
+            await service.shutdown()
+
+    total = sum(statuses.values())
+    return {
+        "benchmark": "server_load",
+        "environment": environment_info(ROOT),
+        "parameters": {
+            key: value for key, value in vars(args).items() if key not in ("output", "url")
+        },
+        "operations": recorder.summary(),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "server_stats": health.get("stats"),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    """Entry point của CLI"""
+    parser = argparse.ArgumentParser(description="Load test ASGI service")
+    parser.add_argument("--url", help="URL của server đang chạy (mặc định chạy trong process)")
+    parser.add_argument("--users", type=int, default=20, help="Số người dùng ảo")
+    parser.add_argument("--requests", type=int, default=10, help="Số request mỗi người dùng")
+    parser.add_argument(
+        "--concurrency", type=int, default=1, help="Số request song song của mỗi người dùng"
+    )
+    parser.add_argument("--workers", type=int, default=2, help="SERVER_WORKERS (trong process)")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--dim", type=int, default=256, help="Số chiều của hashing embeddings")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Ghi kết quả JSON ra file")
+    args = parser.parse_args()
+
+    data_dir = None
+    service = None
+    if args.url is None:
+        data_dir = Path(tempfile.mkdtemp(prefix="memory-load-"))
+        configure_environment(data_dir, args.backend)
+        # Worker process được spawn nên kế thừa các biến môi trường này
+        os.environ.update(
+            {
+                "LLM_PROVIDER": "stub",
+                "EMBEDDING_PROVIDER": "hashing",
+                "HASHING_EMBEDDING_DIMENSION": str(args.dim),
+                "STUB_LLM_LATENCY_MS": str(args.llm_latency_ms),
+            }
+        )
+        from server import ChatService, WorkerPool
+
+        service = ChatService(WorkerPool(workers=args.workers))
+
+    try:
+        results = asyncio.run(run_load(args, service))
+    finally:
+        if data_dir is not None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"\n{'Endpoint':<20}{'n':>7}{'p50 ms':>11}{'p99 ms':>11}{'max ms':>11}")
+    print("─" * 60)
+    for operation, stats in results["operations"].items():
+        print(
+            f"{operation:<20}{stats['count']:>7}{stats['p50_ms']:>11.2f}"
+            f"{stats['p99_ms']:>11.2f}{stats['max_ms']:>11.2f}"
+        )
+    print("─" * 60)
+    print(f"Throughput: {results['throughput_rps']} request/s ({results['requests']} request)")
+    print(f"HTTP status: {results['statuses']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"✅ Đã ghi kết quả vào {args.output}")
+
+
+if __name__ == "__main__":
+    main()
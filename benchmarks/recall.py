@@ -0,0 +1,197 @@
+"""
+Benchmark recall, dung lượng và độ trễ tìm kiếm của các loại vector index
+
+So sánh index lượng tử hóa (fp16, int8 có/không xếp hạng lại) với IndexFlatL2
+chính xác trên cùng một tập vector: recall@k so với top-k chính xác, bytes
+trên đĩa (thư mục save_local), bytes vector giữ trong RAM và p50/p99 của một
+lần tìm kiếm. Vector được sinh theo cụm gaussian đã chuẩn hóa (giống
+embeddings dày thật) hoặc bằng embeddings băm từ hội thoại tổng hợp.
+
+Ví dụ:
+    python -m benchmarks.recall --vectors 20000 --dim 768 --queries 200
+    python -m benchmarks.recall --data hashing --rerank-factors 1 2 4 8
+"""
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from .harness import Recorder, directory_size, environment_info, peak_rss_mb
+from .run import ROOT
+from .synthetic import SyntheticUser
+
+
+def clustered_vectors(count: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    """Vector đã chuẩn hóa, tập trung quanh các tâm cụm ngẫu nhiên"""
+    centers = rng.standard_normal((max(count // 50, 1), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), count)]
+    vectors = vectors + 0.5 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def hashing_vectors(count: int, dim: int, seed: int) -> np.ndarray:
+    """Embeddings băm của các tin nhắn tổng hợp (nhiều người dùng)"""
+    from memory.providers import HashingEmbeddings
+
+    embeddings = HashingEmbeddings(dim)
+    texts = []
+    user_index = 0
+    while len(texts) < count:
+        user = SyntheticUser(user_index, seed=seed)
+        for user_message, ai_message in user.conversation(200):
+            texts.extend([user_message, ai_message])
+        user_index += 1
+    return np.array(embeddings.embed_documents(texts[:count]), dtype=np.float32)
+
+
+def run_recall(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Đo recall, dung lượng và độ trễ của từng loại index
+
+    Args:
+        args: Tham số dòng lệnh
+
+    Returns:
+        Kết quả theo định dạng của benchmarks.compare ("operations") kèm
+        "indexes": recall@k, bytes trên đĩa/RAM và tỷ lệ nén so với flat
+    """
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+
+    from memory.providers import HashingEmbeddings
+    from memory.quantized_faiss import QuantizedFAISS, create_index
+
+    rng = np.random.default_rng(args.seed)
+    total = args.vectors + args.queries
+    if args.data == "hashing":
+        data = hashing_vectors(total, args.dim, args.seed)
+        data = data[rng.permutation(total)]
+    else:
+        data = clustered_vectors(total, args.dim, rng)
+    vectors, queries = data[: args.vectors], data[args.vectors :]
+
+    def build(index_type: str, folder: Path) -> Dict[str, Any]:
+        store = QuantizedFAISS(
+            embedding_function=HashingEmbeddings(args.dim),
+            index=create_index(args.dim, index_type),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+        )
+        started = time.perf_counter()
+        for start in range(0, len(vectors), args.batch_size):
+            batch = vectors[start : start + args.batch_size]
+            store.add_embeddings([("", vector) for vector in batch.tolist()])
+        build_seconds = time.perf_counter() - started
+        store.save_local(str(folder))
+        return {
+            "store": store,
+            "build_seconds": round(build_seconds, 3),
+            # Chỉ tính phần vector, docstore (index.pkl) giống nhau ở mọi loại index
+            "disk_bytes": directory_size(folder) - (folder / "index.pkl").stat().st_size,
+        }
+
+    variants = [("flat", 1), ("fp16", 1)] + [
+        ("int8", factor) for factor in args.rerank_factors
+    ]
+    recorder = Recorder()
+    results: Dict[str, Dict[str, Any]] = {}
+    truth: List[set] = []
+    work_dir = Path(tempfile.mkdtemp(prefix="memory-recall-"))
+    try:
+        built: Dict[str, Dict[str, Any]] = {}
+        for index_type, factor in variants:
+            if index_type not in built:
+                built[index_type] = build(index_type, work_dir / index_type)
+            store = built[index_type]["store"]
+
+            name = index_type if index_type != "int8" else f"int8_rerank{factor}"
+            hits = 0
+            for i, query in enumerate(queries):
+                with recorder.measure(f"search.{name}"):
+                    _, positions = store.search_vectors(query[None, :], args.k, factor)
+                found = {int(p) for p in positions[0] if p != -1}
+                if index_type == "flat":
+                    truth.append(found)
+                hits += len(found & truth[i])
+
+            results[name] = {
+                "recall_at_k": round(hits / (len(queries) * args.k), 4),
+                "disk_bytes": built[index_type]["disk_bytes"],
+                "ram_bytes": store.memory_bytes(),
+                "build_seconds": built[index_type]["build_seconds"],
+            }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    flat = results["flat"]
+    for stats in results.values():
+        stats["disk_reduction"] = round(flat["disk_bytes"] / stats["disk_bytes"], 2)
+        stats["ram_reduction"] = round(flat["ram_bytes"] / stats["ram_bytes"], 2)
+
+    return {
+        "benchmark": "vector_recall",
+        "environment": environment_info(ROOT),
+        "parameters": {key: value for key, value in vars(args).items() if key != "output"},
+        "operations": recorder.summary(),
+        "indexes": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    """Entry point của CLI (thoát với mã 1 nếu recall thấp hơn --min-recall)"""
+    parser = argparse.ArgumentParser(description="Benchmark recall của index lượng tử hóa")
+    parser.add_argument("--vectors", type=int, default=20000, help="Số vector trong index")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--data", choices=["clustered", "hashing"], default="clustered")
+    parser.add_argument(
+        "--rerank-factors", type=int, nargs="+", default=[1, 4],
+        help="Các hệ số xếp hạng lại của int8 cần đo (1 = không xếp hạng lại)",
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--min-recall", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Ghi kết quả JSON ra file")
+    args = parser.parse_args()
+
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    results = run_recall(args)
+
+    print(
+        f"\n{'Index':<18}{'recall@k':>10}{'đĩa MB':>10}{'RAM MB':>10}"
+        f"{'giảm RAM':>10}{'p50 ms':>10}{'p99 ms':>10}"
+    )
+    print("─" * 78)
+    failed = []
+    for name, stats in results["indexes"].items():
+        timing = results["operations"][f"search.{name}"]
+        print(
+            f"{name:<18}{stats['recall_at_k']:>10.4f}"
+            f"{stats['disk_bytes'] / 1024 / 1024:>10.2f}"
+            f"{stats['ram_bytes'] / 1024 / 1024:>10.2f}"
+            f"{stats['ram_reduction']:>9.2f}x"
+            f"{timing['p50_ms']:>10.3f}{timing['p99_ms']:>10.3f}"
+        )
+        if stats["recall_at_k"] < args.min_recall:
+            failed.append(name)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"✅ Đã ghi kết quả vào {args.output}")
+    if failed:
+        print(f"❌ Recall thấp hơn {args.min_recall}: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Benchmark chi phí một lượt trò chuyện với người dùng tổng hợp
+
+Mỗi người dùng được nạp sẵn một lịch sử hội thoại tiếng Việt (có thể tới
+hàng trăm nghìn messages) theo trạng thái ổn định của hệ thống: phần cũ đã
+được tóm tắt và chuyển sang cold storage, vector index chứa mọi message.
+Sau đó đo từng thao tác của MemoryManager, chat history, entity store,
+VectorStoreMemory và cả lượt chat đầu-cuối qua MemoryChatbot, dùng
+embeddings băm tất định và LLM stub nên chạy hoàn toàn offline.
+
+Ví dụ:
+    python -m benchmarks.run --users 10 --messages 1000 --turns 50
+    python -m benchmarks.run --users 1 --messages 100000 --output results.json
+    python -m benchmarks.compare baseline.json results.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def configure_environment(data_dir: Path, backend: str) -> None:
+    """
+    Trỏ toàn bộ dữ liệu vào thư mục benchmark (phải gọi trước khi import config)
+
+    Args:
+        data_dir: Thư mục dữ liệu tạm của benchmark
+        backend: STORAGE_BACKEND ("json" hoặc "sqlite")
+    """
+    os.environ["DATA_DIR"] = str(data_dir)
+    os.environ["ENTITIES_DIR"] = str(data_dir / "entities")
+    os.environ["CHAT_HISTORY_DIR"] = str(data_dir / "chat_history")
+    os.environ["VECTOR_STORE_DIR"] = str(data_dir / "vector_store")
+    os.environ["SQLITE_DB_PATH"] = str(data_dir / "memory.db")
+    os.environ["STORAGE_BACKEND"] = backend
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark-offline")
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+
+
+def seed_user(manager: Any, user: Any, messages: int, batch_size: int) -> None:
+    """
+    Nạp sẵn lịch sử của một người dùng bằng các thao tác ghi theo lô
+
+    Args:
+        manager: MemoryManager của người dùng
+        user: SyntheticUser
+        messages: Số messages cần nạp
+        batch_size: Số vector mỗi lần ghi vào index
+    """
+    from langchain.schema.messages import AIMessage, HumanMessage
+
+    from config import HISTORY_HOT_MESSAGES, SUMMARY_MAX_SENTENCES
+    from memory.conversation_summary import extractive_summary
+    from memory.storage import file_lock
+
+    conversation = list(user.conversation(messages))
+    history = manager.chat_history
+    lc_messages = [
+        HumanMessage(content=text) if role == "human" else AIMessage(content=text)
+        for role, text in conversation
+    ]
+    if manager.database is not None:
+        with manager.transaction():
+            for message in lc_messages:
+                history.add_message(message)
+    else:
+        with file_lock(history.file_path):
+            history._save_messages([history._message_to_dict(m) for m in lc_messages])
+
+    # Trạng thái ổn định: phần cũ đã được tóm tắt và chuyển sang cold storage
+    archived = max(messages - HISTORY_HOT_MESSAGES, 0)
+    if archived:
+        lines = [
+            f"{'Người dùng' if role == 'human' else 'AI'}: {text}"
+            for role, text in conversation[max(archived - 40, 0) : archived]
+        ]
+        summary = extractive_summary(lines, SUMMARY_MAX_SENTENCES)
+        manager.summary_store.add_block(0, archived, summary, summary)
+        history.archive_messages(archived)
+
+    for entity, fact in user.facts():
+        manager.entity_store.add_fact(entity, fact)
+
+    vector_memory = manager.vector_memory
+    timestamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+    for start in range(0, len(conversation), batch_size):
+        batch = conversation[start : start + batch_size]
+        contents = [
+            f"Người dùng nói: {text}" if role == "human" else f"AI trả lời: {text}"
+            for role, text in batch
+        ]
+        metadatas = [
+            {
+                "user_id": user.user_id,
+                "type": "user_message" if role == "human" else "ai_message",
+                "timestamp": timestamp,
+            }
+            for role, _ in batch
+        ]
+        vectors = vector_memory.embeddings.embed_documents(contents)
+        vector_memory._insert(contents, vectors, metadatas)
+
+
+def run_benchmark(args: argparse.Namespace, data_dir: Path) -> Dict[str, Any]:
+    """
+    Chạy benchmark với các tham số dòng lệnh
+
+    Returns:
+        Kết quả dạng dict (được ghi ra JSON)
+    """
+    from chatbot import MemoryChatbot
+    from memory.memory_manager import MemoryManager
+    from memory.providers import HashingEmbeddings, StubChatModel
+
+    from .harness import (
+        Recorder,
+        WriteMeter,
+        directory_size,
+        environment_info,
+        peak_rss_mb,
+        percentile,
+    )
+    from .synthetic import SyntheticUser
+
+    embeddings = HashingEmbeddings(args.dim)
+    llm = StubChatModel(latency=args.llm_latency_ms / 1000)
+    recorder = Recorder()
+    meter = WriteMeter(data_dir)
+    turn_bytes: List[int] = []
+    seed_seconds = 0.0
+
+    for index in range(args.users):
+        user = SyntheticUser(index, seed=args.seed)
+
+        with recorder.measure("manager.init"):
+            manager = MemoryManager(user.user_id, embeddings=embeddings)
+            manager.initialize_entity_memory_with_llm(llm)
+
+        started = time.perf_counter()
+        seed_user(manager, user, args.messages, args.batch_size)
+        seed_seconds += time.perf_counter() - started
+
+        chatbot = MemoryChatbot(user.user_id, llm=llm, memory_manager=manager)
+        for turn in range(args.turns):
+            question = user.user_message(turn + args.messages)
+
+            with recorder.measure("history.add_message"):
+                manager.chat_history.add_user_message(question)
+            with recorder.measure("entity_store.add_fact"):
+                manager.entity_store.add_fact("sở thích", f"{question} ({turn})")
+            with recorder.measure("vector.add_memory"):
+                manager.vector_memory.add_memory(
+                    f"Người dùng nói: {question}", memory_type="user_message"
+                )
+            with recorder.measure("vector.retrieve_memories"):
+                manager.vector_memory.retrieve_memories(question)
+            with recorder.measure("vector.retrieve_memories_batch"):
+                manager.vector_memory.retrieve_memories_batch(
+                    [question] + [user.user_message(turn + offset) for offset in range(1, 4)]
+                )
+            with recorder.measure("manager.get_comprehensive_context"):
+                manager.get_comprehensive_context(question)
+            with recorder.measure("manager.get_memory_summary"):
+                manager.get_memory_summary()
+
+            meter.start()
+            with recorder.measure("chat_turn"):
+                chatbot.chat(question)
+            turn_bytes.append(meter.stop())
+
+        with recorder.measure("manager.flush"):
+            manager.flush()
+        manager.vector_memory.wait_for_maintenance()
+        del chatbot, manager
+        gc.collect()
+
+        if args.users > 1 and (index + 1) % max(args.users // 10, 1) == 0:
+            print(f"  {index + 1}/{args.users} người dùng")
+
+    bytes_samples = [float(b) for b in turn_bytes]
+    return {
+        "benchmark": "memory_chat_turn",
+        "environment": environment_info(ROOT),
+        "parameters": {
+            key: value for key, value in vars(args).items() if key != "output"
+        },
+        "seed_seconds": round(seed_seconds, 3),
+        "operations": recorder.summary(),
+        "bytes_written_per_turn": {
+            "method": meter.method,
+            "mean": round(sum(bytes_samples) / len(bytes_samples)) if bytes_samples else 0,
+            "p50": round(percentile(bytes_samples, 50)),
+            "p99": round(percentile(bytes_samples, 99)),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "disk_usage_bytes": directory_size(data_dir),
+    }
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    """In bảng kết quả dễ đọc"""
+    print(f"\n{'Thao tác':<36}{'n':>7}{'p50 ms':>11}{'p99 ms':>11}{'max ms':>11}")
+    print("─" * 76)
+    for operation, stats in results["operations"].items():
+        print(
+            f"{operation:<36}{stats['count']:>7}{stats['p50_ms']:>11.2f}"
+            f"{stats['p99_ms']:>11.2f}{stats['max_ms']:>11.2f}"
+        )
+    written = results["bytes_written_per_turn"]
+    print("─" * 76)
+    print(
+        f"Bytes ghi mỗi lượt: trung bình {written['mean']:,}, "
+        f"p50 {written['p50']:,}, p99 {written['p99']:,} ({written['method']})"
+    )
+    print(f"RAM đỉnh: {results['peak_rss_mb']} MB")
+    print(f"Dung lượng dữ liệu: {results['disk_usage_bytes']:,} bytes")
+    print(f"Thời gian nạp dữ liệu: {results['seed_seconds']}s")
+
+
+def main():
+    """Entry point của CLI"""
+    parser = argparse.ArgumentParser(description="Benchmark memory subsystem")
+    parser.add_argument("--users", type=int, default=3, help="Số người dùng")
+    parser.add_argument(
+        "--messages", type=int, default=1000, help="Số messages nạp sẵn mỗi người dùng"
+    )
+    parser.add_argument("--turns", type=int, default=20, help="Số lượt đo mỗi người dùng")
+    parser.add_argument("--dim", type=int, default=768, help="Số chiều của hashing embeddings")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", help="Thư mục dữ liệu (mặc định thư mục tạm)")
+    parser.add_argument("--keep-data", action="store_true")
+    parser.add_argument("--output", help="Ghi kết quả JSON ra file")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir or tempfile.mkdtemp(prefix="memory-bench-"))
+    configure_environment(data_dir, args.backend)
+    try:
+        results = run_benchmark(args, data_dir)
+    finally:
+        if not args.keep_data and not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"✅ Đã ghi kết quả vào {args.output}")
+
+
+if __name__ == "__main__":
+    main()
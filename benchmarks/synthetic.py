@@ -0,0 +1,102 @@
+"""
+Sinh hội thoại tiếng Việt tổng hợp cho benchmark (tất định theo seed)
+"""
+
+import random
+from typing import Iterator, List, Tuple
+
+NAMES = ["An", "Bình", "Chi", "Dũng", "Giang", "Hà", "Hùng", "Lan", "Minh", "Nam",
+         "Ngọc", "Phương", "Quân", "Thảo", "Trang", "Tuấn", "Vy", "Yến"]
+CITIES = ["Hà Nội", "Hải Phòng", "Đà Nẵng", "Huế", "Nha Trang", "Đà Lạt",
+          "TP. Hồ Chí Minh", "Cần Thơ", "Vũng Tàu", "Quy Nhơn"]
+JOBS = ["lập trình viên", "giáo viên", "bác sĩ", "kế toán", "kiến trúc sư",
+        "nhân viên marketing", "kỹ sư cơ khí", "nhà thiết kế", "y tá", "đầu bếp"]
+HOBBIES = ["đọc sách", "du lịch", "nấu ăn", "chơi cầu lông", "chạy bộ", "chụp ảnh",
+           "nghe nhạc", "xem phim", "làm vườn", "bơi lội", "leo núi", "chơi guitar"]
+FOODS = ["phở", "bún chả", "bánh mì", "cơm tấm", "bún bò Huế", "mì Quảng",
+         "bánh xèo", "gỏi cuốn", "chả cá", "hủ tiếu"]
+TOPICS = [
+    "Gợi ý cho tôi một địa điểm du lịch cuối tuần ở gần {city} nhé",
+    "Tôi nên ăn gì tối nay, tôi đang thèm {food}",
+    "Làm sao để cân bằng công việc {job} và cuộc sống?",
+    "Bạn có nhớ tôi thích gì không?",
+    "Cuối tuần này thời tiết ở {city} thế nào?",
+    "Giới thiệu cho tôi vài cuốn sách hay về {hobby}",
+    "Tôi muốn học thêm kỹ năng mới để phát triển sự nghiệp {job}",
+    "Món {food} nấu như thế nào cho ngon?",
+    "Lên kế hoạch giúp tôi một buổi {hobby} vào sáng chủ nhật",
+    "Bạn có nhớ tên tôi không?",
+]
+FACTS = [
+    ("tên", "Tôi tên là {name}"),
+    ("nghề nghiệp", "Tôi làm {job} được {years} năm rồi"),
+    ("sở thích", "Tôi thích {hobby} và {hobby2}"),
+    ("địa chỉ", "Tôi sống ở {city}"),
+    ("tuổi", "Năm nay tôi {age} tuổi"),
+    ("gia đình", "Vợ tôi cũng thích {hobby2}"),
+]
+ANSWERS = [
+    "Chắc chắn rồi {name}! Với sở thích {hobby} của bạn, mình gợi ý bạn thử đến {city2}.",
+    "Theo những gì bạn kể, bạn làm {job} nên hãy dành thời gian nghỉ ngơi hợp lý nhé.",
+    "Mình nhớ bạn thích {hobby}. Bạn có thể kết hợp {hobby} với một chuyến đi {city2}.",
+    "{food} là lựa chọn tuyệt vời! Bạn nên thử quán quen gần nhà ở {city}.",
+    "Cảm ơn {name} đã chia sẻ. Mình sẽ ghi nhớ để gợi ý phù hợp hơn lần sau.",
+]
+
+
+class SyntheticUser:
+    """Hồ sơ và hội thoại tổng hợp của một người dùng"""
+
+    def __init__(self, index: int, seed: int = 0):
+        """
+        Khởi tạo SyntheticUser
+
+        Args:
+            index: Số thứ tự người dùng (quyết định user_id và hồ sơ)
+            seed: Seed chung của lần chạy benchmark
+        """
+        self.user_id = f"bench_user_{index:05d}"
+        self.rng = random.Random(seed * 1_000_003 + index)
+        hobby, hobby2 = self.rng.sample(HOBBIES, 2)
+        city, city2 = self.rng.sample(CITIES, 2)
+        self.profile = {
+            "name": self.rng.choice(NAMES),
+            "job": self.rng.choice(JOBS),
+            "hobby": hobby,
+            "hobby2": hobby2,
+            "city": city,
+            "city2": city2,
+            "food": self.rng.choice(FOODS),
+            "age": self.rng.randint(18, 65),
+            "years": self.rng.randint(1, 20),
+        }
+
+    def facts(self) -> List[Tuple[str, str]]:
+        """Các cặp (entity, fact) về người dùng"""
+        return [(entity, template.format(**self.profile)) for entity, template in FACTS]
+
+    def user_message(self, turn: int) -> str:
+        """Tin nhắn của người dùng ở lượt thứ turn"""
+        if turn < len(FACTS):
+            return FACTS[turn][1].format(**self.profile)
+        return self.rng.choice(TOPICS).format(**self.profile)
+
+    def ai_message(self) -> str:
+        """Câu trả lời mẫu của AI"""
+        return self.rng.choice(ANSWERS).format(**self.profile)
+
+    def conversation(self, messages: int) -> Iterator[Tuple[str, str]]:
+        """
+        Sinh hội thoại xen kẽ người dùng / AI
+
+        Args:
+            messages: Tổng số messages
+
+        Yields:
+            Cặp (vai trò "human"/"ai", nội dung)
+        """
+        for i in range(messages):
+            if i % 2 == 0:
+                yield "human", self.user_message(i // 2)
+            else:
+                yield "ai", self.ai_message()
@@ -2,13 +2,34 @@
 Chatbot chính sử dụng Gemini với memory tích hợp
 """
 
-from typing import Any, Dict
+import re
+from typing import Any, Dict, Iterator, Optional
 
 from langchain.schema import HumanMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
 
-from config import GOOGLE_API_KEY, MODEL_NAME, TEMPERATURE
+from config import (
+    PROMPT_SECTION_PRIORITIES,
+    PROMPT_SECTION_QUOTAS,
+    PROMPT_TOKEN_BUDGET,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL_SECONDS,
+)
+from memory import providers
+from memory.cache import TTLCache, normalize_query
 from memory.memory_manager import MemoryManager
+from memory.prompt_builder import PromptBuilder, PromptSection
+from memory.tracing import TurnTrace, span, turn
+
+
+# Cache phản hồi dùng chung cho mọi chatbot trong process, khóa theo
+# (user_id, câu hỏi đã chuẩn hóa, memory version)
+response_cache = TTLCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SECONDS)
+
+
+def create_llm() -> Any:
+    """Tạo LLM theo LLM_PROVIDER (có thể dùng chung giữa nhiều chatbot)"""
+    return providers.create_llm()
 
 
 class MemoryChatbot:
@@ -16,30 +37,51 @@ class MemoryChatbot:
     Chatbot với memory tích hợp sử dụng Google Gemini
     """
 
-    def __init__(self, user_id: str, session_id: str = "default"):
+    def __init__(
+        self,
+        user_id: str,
+        session_id: str = "default",
+        llm: Optional[Any] = None,
+        memory_manager: Optional[MemoryManager] = None,
+        response_cache: Optional[TTLCache] = None,
+    ):
         """
         Khởi tạo chatbot
 
         Args:
             user_id: ID của người dùng
             session_id: ID của phiên trò chuyện
+            llm: LLM dùng chung (mặc định tạo LLM mới theo LLM_PROVIDER)
+            memory_manager: MemoryManager đã tải sẵn, ví dụ lấy từ MemoryManagerPool
+            response_cache: Cache phản hồi (mặc định cache dùng chung của process
+                khi RESPONSE_CACHE_ENABLED, ngược lại không cache)
         """
         self.user_id = user_id
         self.session_id = session_id
 
-        # Khởi tạo Gemini model
-        self.llm = ChatGoogleGenerativeAI(
-            model=MODEL_NAME,
-            google_api_key=GOOGLE_API_KEY,
-            temperature=TEMPERATURE,
-            convert_system_message_to_human=True,
-        )
+        # Khởi tạo LLM
+        self.llm = llm or create_llm()
 
         # Khởi tạo Memory Manager
-        self.memory_manager = MemoryManager(user_id, session_id)
-
-        # Khởi tạo entity memory với LLM
-        self.memory_manager.initialize_entity_memory_with_llm(self.llm)
+        if memory_manager is None:
+            memory_manager = MemoryManager(user_id, session_id)
+            # Khởi tạo entity memory với LLM
+            memory_manager.initialize_entity_memory_with_llm(self.llm)
+        self.memory_manager = memory_manager
+
+        # Câu hỏi lặp lại khi memory chưa đổi được trả lời từ cache, bỏ qua
+        # embeddings, tìm kiếm, xây dựng prompt và lời gọi LLM
+        if response_cache is None and RESPONSE_CACHE_ENABLED:
+            response_cache = globals()["response_cache"]
+        self.response_cache = response_cache
+
+        # Prompt builder giới hạn kích thước prompt theo ngân sách token
+        self.prompt_builder = PromptBuilder(
+            PROMPT_TOKEN_BUDGET, PROMPT_SECTION_QUOTAS, PROMPT_SECTION_PRIORITIES
+        )
+        self.last_prompt_stats: Dict[str, Any] = {}
+        # Phân rã thời gian của lượt gần nhất (rỗng khi tracing tắt)
+        self.last_turn_trace: Dict[str, Any] = {}
 
         # System prompt cho chatbot
         self.system_prompt = """Bạn là một AI assistant thông minh và thân thiện. 
@@ -63,41 +105,70 @@ class MemoryChatbot:
         # Lấy context toàn diện
         context = self.memory_manager.get_comprehensive_context(user_input)
 
-        # Xây dựng prompt
-        prompt_parts = [self.system_prompt]
+        sections = []
 
-        # Thêm thông tin về entities (thông tin cá nhân)
+        # Thông tin về entities (thông tin cá nhân)
         if context["relevant_entities"]:
-            prompt_parts.append("\n=== THÔNG TIN ĐÃ BIẾT VỀ NGƯỜI DÙNG ===")
-            for entity, facts in context["relevant_entities"].items():
-                if facts:
-                    prompt_parts.append(f"{entity}: {', '.join(facts)}")
+            sections.append(
+                PromptSection(
+                    name="entities",
+                    header="\n=== THÔNG TIN ĐÃ BIẾT VỀ NGƯỜI DÙNG ===",
+                    lines=[
+                        f"{entity}: {', '.join(facts)}"
+                        for entity, facts in context["relevant_entities"].items()
+                        if facts
+                    ],
+                )
+            )
 
-        # Thêm memories liên quan
+        # Memories liên quan (mỗi memory được đánh số "1. [type] ...")
         if (
             context["relevant_memories"]
             and context["relevant_memories"]
             != "Không tìm thấy thông tin liên quan trong bộ nhớ."
         ):
-            prompt_parts.append(
-                "\n=== THÔNG TIN LIÊN QUAN TỪ CÁC CUỘC TRÒ CHUYỆN TRƯỚC ==="
+            sections.append(
+                PromptSection(
+                    name="memories",
+                    header="\n=== THÔNG TIN LIÊN QUAN TỪ CÁC CUỘC TRÒ CHUYỆN TRƯỚC ===",
+                    lines=re.split(r"\n(?=\d+\. \[)", context["relevant_memories"]),
+                )
+            )
+
+        # Rolling summary của các phần hội thoại cũ
+        if context.get("conversation_summary"):
+            sections.append(
+                PromptSection(
+                    name="conversation_summary",
+                    header="\n=== TÓM TẮT CÁC CUỘC TRÒ CHUYỆN TRƯỚC ===",
+                    lines=context["conversation_summary"].splitlines(),
+                )
             )
-            prompt_parts.append(context["relevant_memories"])
 
-        # Thêm lịch sử trò chuyện gần đây
+        # Lịch sử trò chuyện gần đây, giữ các tin nhắn mới nhất khi bị cắt
         if context["recent_conversation"]:
-            prompt_parts.append("\n=== LỊCH SỬ TRÒ CHUYỆN GẦN ĐÂY ===")
-            for msg in context["recent_conversation"][
-                -5:
-            ]:  # Chỉ lấy 5 tin nhắn gần nhất
-                role = "Người dùng" if msg["role"] == "human" else "AI"
-                prompt_parts.append(f"{role}: {msg['content']}")
+            sections.append(
+                PromptSection(
+                    name="recent_conversation",
+                    header="\n=== LỊCH SỬ TRÒ CHUYỆN GẦN ĐÂY ===",
+                    lines=[
+                        f"{'Người dùng' if msg['role'] == 'human' else 'AI'}: "
+                        f"{msg['content']}"
+                        for msg in context["recent_conversation"][-5:]
+                    ],
+                    keep="tail",
+                )
+            )
 
-        # Thêm câu hỏi hiện tại
-        prompt_parts.append(f"\n=== CÂU HỎI HIỆN TẠI ===\nNgười dùng: {user_input}")
-        prompt_parts.append("\nHãy trả lời một cách tự nhiên và hữu ích:")
+        result = self.prompt_builder.build(
+            system_prompt=self.system_prompt,
+            sections=sections,
+            question=f"\n=== CÂU HỎI HIỆN TẠI ===\nNgười dùng: {user_input}",
+            footer="\nHãy trả lời một cách tự nhiên và hữu ích:",
+        )
+        self.last_prompt_stats = result.to_dict()
 
-        return "\n".join(prompt_parts)
+        return result.text
 
     def _extract_and_save_entities(self, user_input: str, ai_response: str) -> None:
         """
@@ -126,6 +197,54 @@ class MemoryChatbot:
                     self.memory_manager.add_entity_fact(entity_type, user_input)
                     break
 
+    def _response_cache_key(self, user_input: str) -> Optional[tuple]:
+        """Khóa cache phản hồi theo memory hiện tại (None khi không cache)"""
+        if self.response_cache is None:
+            return None
+        return (self.user_id, normalize_query(user_input), self.memory_manager.memory_version)
+
+    def _cached_response(self, user_input: str) -> Optional[str]:
+        """Phản hồi đã cache cho câu hỏi này (lượt được lưu vào chat history)"""
+        key = self._response_cache_key(user_input)
+        if key is None:
+            return None
+        ai_response = self.response_cache.get(key)
+        if ai_response is not None:
+            with span("response_cache.hit"):
+                self.memory_manager.add_cached_exchange(user_input, ai_response)
+        return ai_response
+
+    def _store_response(self, user_input: str, ai_response: str) -> None:
+        """Cache phản hồi theo memory version sau khi lượt đã được ghi"""
+        key = self._response_cache_key(user_input)
+        if key is not None:
+            self.response_cache.set(key, ai_response)
+
+    def _prepare_turn(self, user_input: str) -> str:
+        """Lưu tin nhắn của người dùng và xây dựng prompt cho lượt này"""
+        # Lưu tin nhắn của người dùng
+        self.memory_manager.add_user_message(user_input)
+
+        # Xây dựng prompt với context
+        with span("prompt.build"):
+            return self._build_context_prompt(user_input)
+
+    def _finish_turn(self, user_input: str, ai_response: str) -> None:
+        """Lưu phản hồi và cập nhật các memory sau khi LLM trả lời"""
+        # Các thao tác ghi của lượt này được commit cùng nhau
+        with self.memory_manager.transaction():
+            # Lưu phản hồi của AI
+            self.memory_manager.add_ai_message(ai_response)
+
+            # Trích xuất và lưu thông tin thực thể
+            with span("entity.extract"):
+                self._extract_and_save_entities(user_input, ai_response)
+
+            # Lưu context cho các memory khác
+            self.memory_manager.save_conversation_context(
+                {"input": user_input}, {"output": ai_response}
+            )
+
     def chat(self, user_input: str) -> str:
         """
         Xử lý tin nhắn từ người dùng và trả về phản hồi
@@ -136,34 +255,66 @@ class MemoryChatbot:
         Returns:
             Phản hồi từ AI
         """
-        try:
-            # Lưu tin nhắn của người dùng
-            self.memory_manager.add_user_message(user_input)
+        with turn("chat_turn", user_id=self.user_id, session_id=self.session_id) as trace:
+            try:
+                ai_response = self._cached_response(user_input)
+                if ai_response is None:
+                    full_prompt = self._prepare_turn(user_input)
 
-            # Xây dựng prompt với context
-            full_prompt = self._build_context_prompt(user_input)
+                    # Gọi Gemini để tạo phản hồi
+                    with span("llm.invoke"):
+                        response = self.llm.invoke([HumanMessage(content=full_prompt)])
+                    ai_response = response.content
 
-            # Gọi Gemini để tạo phản hồi
-            response = self.llm.invoke([HumanMessage(content=full_prompt)])
-            ai_response = response.content
+                    self._finish_turn(user_input, ai_response)
+                    self._store_response(user_input, ai_response)
 
-            # Lưu phản hồi của AI
-            self.memory_manager.add_ai_message(ai_response)
+            except Exception as e:
+                ai_response = f"Xin lỗi, đã có lỗi xảy ra: {str(e)}"
+                print(f"Lỗi trong chatbot: {e}")
 
-            # Trích xuất và lưu thông tin thực thể
-            self._extract_and_save_entities(user_input, ai_response)
+        if isinstance(trace, TurnTrace):
+            self.last_turn_trace = trace.to_dict()
+        return ai_response
 
-            # Lưu context cho các memory khác
-            self.memory_manager.save_conversation_context(
-                {"input": user_input}, {"output": ai_response}
-            )
+    def chat_stream(self, user_input: str) -> Iterator[str]:
+        """
+        Giống chat() nhưng trả về phản hồi theo từng phần khi LLM sinh ra
+
+        Memory chỉ được cập nhật sau khi đã nhận đủ phản hồi. Generator cần
+        được duyệt hết trong cùng một thread.
 
-            return ai_response
+        Args:
+            user_input: Tin nhắn từ người dùng
 
-        except Exception as e:
-            error_msg = f"Xin lỗi, đã có lỗi xảy ra: {str(e)}"
-            print(f"Lỗi trong chatbot: {e}")
-            return error_msg
+        Yields:
+            Các phần của phản hồi
+        """
+        with turn("chat_turn", user_id=self.user_id, session_id=self.session_id) as trace:
+            try:
+                cached = self._cached_response(user_input)
+                if cached is not None:
+                    yield cached
+                else:
+                    full_prompt = self._prepare_turn(user_input)
+
+                    chunks = []
+                    with span("llm.stream"):
+                        for chunk in self.llm.stream([HumanMessage(content=full_prompt)]):
+                            if chunk.content:
+                                chunks.append(chunk.content)
+                                yield chunk.content
+
+                    ai_response = "".join(chunks)
+                    self._finish_turn(user_input, ai_response)
+                    self._store_response(user_input, ai_response)
+
+            except Exception as e:
+                print(f"Lỗi trong chatbot: {e}")
+                yield f"Xin lỗi, đã có lỗi xảy ra: {str(e)}"
+
+        if isinstance(trace, TurnTrace):
+            self.last_turn_trace = trace.to_dict()
 
     def get_memory_summary(self) -> Dict[str, Any]:
         """
@@ -172,7 +323,17 @@ class MemoryChatbot:
         Returns:
             Dictionary chứa thông tin tóm tắt
         """
-        return self.memory_manager.get_memory_summary()
+        summary = self.memory_manager.get_memory_summary()
+        # Thống kê token của prompt gần nhất
+        summary["last_prompt"] = self.last_prompt_stats
+        # Phân rã thời gian của lượt gần nhất
+        summary["last_turn"] = self.last_turn_trace
+        # Hiệu quả của các cache
+        summary["cache"] = {
+            "retrieval": self.memory_manager.vector_memory.retrieval_cache.info(),
+            "response": self.response_cache.info() if self.response_cache else None,
+        }
+        return summary
 
     def search_memory(self, query: str) -> str:
         """
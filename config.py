@@ -18,14 +18,124 @@ DATA_DIR = Path(os.getenv("DATA_DIR", "./data"))
 ENTITIES_DIR = Path(os.getenv("ENTITIES_DIR", "./data/entities"))
 CHAT_HISTORY_DIR = Path(os.getenv("CHAT_HISTORY_DIR", "./data/chat_history"))
 VECTOR_STORE_DIR = Path(os.getenv("VECTOR_STORE_DIR", "./data/vector_store"))
+STATS_DIR = Path(os.getenv("STATS_DIR", str(DATA_DIR / "stats")))  # Thống kê tổng quan được materialize (memory/memory_stats.py)
 
-# Tạo các thư mục nếu chưa tồn tại
-for directory in [DATA_DIR, ENTITIES_DIR, CHAT_HISTORY_DIR, VECTOR_STORE_DIR]:
-    directory.mkdir(parents=True, exist_ok=True)
+# Các thư mục được tạo khi ghi lần đầu (file_lock/atomic_write), không tạo lúc import
 
 # Cấu hình vector store
-VECTOR_DIMENSION = 1536  # OpenAI embedding dimension
+VECTOR_DIMENSION = int(os.getenv("VECTOR_DIMENSION", "768"))  # Google embedding-001 dimension
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat")  # flat | fp16 | int8, áp dụng cho index mới tạo (đổi index cũ bằng reindex.py)
+VECTOR_RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))  # int8: số ứng viên = k × hệ số, xếp hạng lại bằng bản fp16
 MAX_RETRIEVED_MEMORIES = 5  # Số lượng memory tối đa được retrieve
 
+# Cắt kết quả truy xuất theo khoảng cách: số memories trả về thay đổi từ 0 đến k
+# Ngưỡng cố định theo embedder (khoảng cách L2 bình phương), ví dụ "hashing:768=1.5,sentence-transformers:all-MiniLM-L6-v2=1.1"
+RETRIEVAL_DISTANCE_THRESHOLDS = {
+    embedder_id.strip(): float(threshold)
+    for embedder_id, threshold in (
+        item.rsplit("=", 1) for item in os.getenv("RETRIEVAL_DISTANCE_THRESHOLDS", "").split(",") if "=" in item
+    )
+}
+RETRIEVAL_DISTANCE_RATIO = float(os.getenv("RETRIEVAL_DISTANCE_RATIO", "0.9"))  # Embedder không có ngưỡng cố định: ngưỡng = tỷ lệ × khoảng cách trung vị giữa các cặp memories (0 = tắt)
+RETRIEVAL_SCORE_GAP = float(os.getenv("RETRIEVAL_SCORE_GAP", "0.25"))  # Dừng khi khoảng cách tăng vọt hơn tỷ lệ này × khoảng cách trung vị (0 = tắt)
+RETRIEVAL_CALIBRATION_MIN_MEMORIES = int(os.getenv("RETRIEVAL_CALIBRATION_MIN_MEMORIES", "50"))  # Số memories tối thiểu để hiệu chỉnh từ index
+
 # Cấu hình entity memory
-MAX_ENTITY_FACTS = 50  # Số lượng facts tối đa cho mỗi entity
\ No newline at end of file
+MAX_ENTITY_FACTS = 50  # Số lượng facts tối đa cho mỗi entity
+
+# Cấu hình prompt
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))  # Số token tối đa của prompt
+# Số token tối đa cho từng section của prompt
+PROMPT_SECTION_QUOTAS = {
+    "entities": 300,
+    "conversation_summary": 300,
+    "recent_conversation": 700,
+    "memories": 600,
+}
+# Độ ưu tiên khi cấp phát token (số nhỏ được cấp trước)
+PROMPT_SECTION_PRIORITIES = {
+    "entities": 0,
+    "recent_conversation": 1,
+    "conversation_summary": 2,
+    "memories": 3,
+}
+
+# Cấu hình tóm tắt hội thoại
+SUMMARY_BLOCK_TURNS = int(os.getenv("SUMMARY_BLOCK_TURNS", "10"))  # Số lượt hỏi-đáp mỗi block (0 = tắt)
+SUMMARY_MODE = os.getenv("SUMMARY_MODE", "extractive")  # "extractive" hoặc "llm"
+SUMMARY_MAX_SENTENCES = 6  # Số câu tối đa của mỗi bản tóm tắt
+HISTORY_HOT_MESSAGES = int(os.getenv("HISTORY_HOT_MESSAGES", "20"))  # Số messages tối thiểu giữ trong file hot
+SUMMARY_ARCHIVE_RAW = os.getenv("SUMMARY_ARCHIVE_RAW", "true").lower() == "true"  # Chuyển messages đã tóm tắt sang cold storage
+
+# Cấu hình cold tier (segment nén zstd chỉ append, memory/cold_storage.py)
+COLD_TIER_AFTER_DAYS = int(os.getenv("COLD_TIER_AFTER_DAYS", "0"))  # Chuyển messages/documents cũ hơn N ngày sang cold tier (0 = tắt)
+HISTORY_HOT_MAX_MESSAGES = int(os.getenv("HISTORY_HOT_MAX_MESSAGES", "0"))  # Số messages tối đa trong file hot (0 = không giới hạn)
+VECTOR_HOT_DOCS = int(os.getenv("VECTOR_HOT_DOCS", "0"))  # Số documents tối đa giữ nội dung trong RAM (0 = không giới hạn)
+COLD_SEGMENT_MAX_BYTES = int(os.getenv("COLD_SEGMENT_MAX_BYTES", str(1024 * 1024)))  # Kích thước (đã nén) để mở segment mới
+COLD_ZSTD_LEVEL = int(os.getenv("COLD_ZSTD_LEVEL", "10"))  # Mức nén zstd
+
+# Cấu hình pool MemoryManager (phục vụ nhiều user trong một process)
+POOL_MAX_MEMORY_MB = int(os.getenv("POOL_MAX_MEMORY_MB", "512"))  # Ngân sách RAM cho các index đang tải
+POOL_MAX_ENTRIES = int(os.getenv("POOL_MAX_ENTRIES", "1000"))  # Số MemoryManager tối đa được giữ
+POOL_TTL_SECONDS = int(os.getenv("POOL_TTL_SECONDS", "1800"))  # Thời gian rảnh tối đa trước khi bị giải phóng
+
+# Cấu hình lưu trữ
+STORAGE_FSYNC = os.getenv("STORAGE_FSYNC", "true").lower() == "true"  # fsync trước khi đổi tên file
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")  # "json" hoặc "sqlite"
+SQLITE_DB_PATH = Path(os.getenv("SQLITE_DB_PATH", str(DATA_DIR / "memory.db")))  # Database khi dùng SQLite
+
+# Cấu hình xóa, TTL và compaction của vector memories
+# Số ngày giữ memory theo type, ví dụ "ai_message=30,user_message=180" (không khai báo = giữ mãi)
+MEMORY_TTL_DAYS = {
+    memory_type.strip(): int(days)
+    for memory_type, days in (
+        item.split("=") for item in os.getenv("MEMORY_TTL_DAYS", "").split(",") if "=" in item
+    )
+}
+VECTOR_COMPACTION_THRESHOLD = float(os.getenv("VECTOR_COMPACTION_THRESHOLD", "0.2"))  # Tỷ lệ tombstone kích hoạt compaction
+VECTOR_MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("VECTOR_MAINTENANCE_INTERVAL_SECONDS", "3600"))  # Chu kỳ tối thiểu giữa 2 lần dọn dẹp
+
+# Chống trùng lặp khi ghi: memory mới gần như trùng memory cũ cùng type thì chỉ tăng số lần gặp
+VECTOR_DEDUP_ENABLED = os.getenv("VECTOR_DEDUP_ENABLED", "false").lower() == "true"
+VECTOR_DEDUP_THRESHOLD = float(os.getenv("VECTOR_DEDUP_THRESHOLD", "0.97"))  # Cosine similarity tối thiểu để coi là trùng
+
+# Cấu hình circuit breaker của embeddings
+EMBEDDING_FAILURE_THRESHOLD = int(os.getenv("EMBEDDING_FAILURE_THRESHOLD", "3"))  # Số lỗi liên tiếp trước khi ngắt
+EMBEDDING_RETRY_SECONDS = float(os.getenv("EMBEDDING_RETRY_SECONDS", "30"))  # Thời gian chờ trước khi thử lại (half-open)
+
+# Cấu hình tracing (đo thời gian từng bước của một lượt trò chuyện)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+# Các exporter, phân tách bằng dấu phẩy: "logging", "prometheus", "otel"
+TRACING_EXPORTERS = [
+    name.strip() for name in os.getenv("TRACING_EXPORTERS", "logging").split(",") if name.strip()
+]
+
+# Cấu hình provider của LLM và embeddings
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")  # "gemini" hoặc "stub" (offline, tất định)
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "google")  # "google", "sentence-transformers" hoặc "hashing"
+STUB_LLM_LATENCY_MS = float(os.getenv("STUB_LLM_LATENCY_MS", "0"))  # Độ trễ giả lập của stub LLM
+HASHING_EMBEDDING_DIMENSION = int(os.getenv("HASHING_EMBEDDING_DIMENSION", str(VECTOR_DIMENSION)))
+
+# Cấu hình warm-up khi khởi động server
+WARMUP_TOP_USERS = int(os.getenv("WARMUP_TOP_USERS", "0"))  # Số người dùng hoạt động gần nhất được nạp sẵn index
+
+# Cấu hình ASGI service (server.py)
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "2"))  # Số worker process, mỗi người dùng luôn về cùng một worker
+SERVER_WORKER_THREADS = int(os.getenv("SERVER_WORKER_THREADS", "8"))  # Số request xử lý đồng thời trong một worker
+SERVER_USER_CONCURRENCY = int(os.getenv("SERVER_USER_CONCURRENCY", "1"))  # Số request chạy đồng thời của một người dùng
+SERVER_USER_QUEUE = int(os.getenv("SERVER_USER_QUEUE", "4"))  # Số request được xếp hàng chờ của một người dùng
+SERVER_WORKER_QUEUE = int(os.getenv("SERVER_WORKER_QUEUE", "64"))  # Số request tối đa đang chờ/chạy ở một worker
+SERVER_REQUEST_TIMEOUT_SECONDS = float(os.getenv("SERVER_REQUEST_TIMEOUT_SECONDS", "120"))
+
+# Cấu hình cache truy xuất và phản hồi
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "256"))  # Số câu hỏi được cache embeddings/kết quả tìm kiếm mỗi người dùng (0 = tắt)
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "600"))
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"  # Trả lời lại câu hỏi lặp khi memory chưa đổi
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))  # Số phản hồi được cache trong một process
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+
+# Cấu hình tri thức dùng chung giữa các người dùng (memory/shared_memory.py)
+SHARED_MEMORY_ENABLED = os.getenv("SHARED_MEMORY_ENABLED", "false").lower() == "true"
+SHARED_MEMORY_DIR = Path(os.getenv("SHARED_MEMORY_DIR", str(VECTOR_STORE_DIR / "shared_knowledge")))
+SHARED_MEMORY_SHARDS = int(os.getenv("SHARED_MEMORY_SHARDS", "8"))  # Không đổi được sau khi đã có dữ liệu
+SHARED_MEMORY_SEARCH_THREADS = int(os.getenv("SHARED_MEMORY_SEARCH_THREADS", "4"))  # Số shard được tìm song song
@@ -1,15 +1,46 @@
 """
 Memory module cho Agent Memory System
+
+Các class được import khi truy cập lần đầu (PEP 562) để `import memory` không
+kéo theo langchain, FAISS hay các model embeddings khi chưa cần dùng.
 """
 
-from .json_entity_store import JSONEntityStore
-from .json_chat_history import JSONChatMessageHistory
-from .vector_memory import VectorStoreMemory
-from .memory_manager import MemoryManager
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .json_chat_history import JSONChatMessageHistory
+    from .json_entity_store import JSONEntityStore
+    from .manager_pool import MemoryManagerPool
+    from .memory_manager import MemoryManager
+    from .vector_memory import VectorStoreMemory
+
+# Tên được export -> module chứa nó
+_LAZY_EXPORTS = {
+    "JSONEntityStore": ".json_entity_store",
+    "JSONChatMessageHistory": ".json_chat_history",
+    "VectorStoreMemory": ".vector_memory",
+    "MemoryManager": ".memory_manager",
+    "MemoryManagerPool": ".manager_pool",
+}
 
 __all__ = [
     "JSONEntityStore",
     "JSONChatMessageHistory", 
     "VectorStoreMemory",
-    "MemoryManager"
-]
\ No newline at end of file
+    "MemoryManager",
+    "MemoryManagerPool"
+]
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value  # Các lần truy cập sau không qua __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,90 @@
+"""
+Cache LRU có TTL cho kết quả truy xuất và phản hồi của chatbot
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """
+    Chuẩn hóa câu hỏi để các câu giống nhau dùng chung một khóa cache
+
+    Chuẩn hóa Unicode (NFC), không phân biệt hoa thường, gộp khoảng trắng và
+    bỏ dấu câu ở cuối: "Bạn nhớ tên tôi không?" và "bạn nhớ  tên tôi không"
+    cho cùng một khóa.
+
+    Args:
+        text: Câu hỏi gốc
+    """
+    text = unicodedata.normalize("NFC", text).casefold()
+    return _SPACES.sub(" ", text).strip().rstrip("?!.… ").strip()
+
+
+class TTLCache:
+    """
+    Cache giới hạn theo số phần tử (LRU) và thời gian sống, an toàn giữa các thread
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        """
+        Khởi tạo TTLCache
+
+        Args:
+            max_entries: Số phần tử tối đa (0 = tắt cache)
+            ttl_seconds: Thời gian sống của mỗi phần tử (giây, 0 = không hết hạn)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Lấy giá trị còn hạn của key (default nếu không có)"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                expires_at, value = item
+                if not expires_at or expires_at > time.monotonic():
+                    self._items.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return value
+                del self._items[key]
+            self.stats["misses"] += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Ghi giá trị, bỏ phần tử ít được dùng nhất khi vượt giới hạn"""
+        if self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else 0
+        with self._lock:
+            self._items[key] = (expires_at, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        """Xóa toàn bộ cache"""
+        with self._lock:
+            self._items.clear()
+
+    def info(self) -> Dict[str, Any]:
+        """Số phần tử và tỷ lệ trúng cache"""
+        with self._lock:
+            total = self.stats["hits"] + self.stats["misses"]
+            return {
+                "entries": len(self._items),
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / total, 3) if total else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._items)
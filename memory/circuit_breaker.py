@@ -0,0 +1,77 @@
+"""
+Circuit breaker cho các dịch vụ từ xa (embeddings, LLM)
+"""
+
+import threading
+import time
+
+from config import EMBEDDING_FAILURE_THRESHOLD, EMBEDDING_RETRY_SECONDS
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker ba trạng thái
+
+    - closed: gọi bình thường, đếm số lỗi liên tiếp
+    - open: sau failure_threshold lỗi liên tiếp, từ chối mọi lời gọi
+    - half_open: hết reset_timeout thì cho đúng một lời gọi thử; thành công
+      thì đóng lại, lỗi thì mở tiếp một chu kỳ nữa
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = EMBEDDING_FAILURE_THRESHOLD,
+        reset_timeout: float = EMBEDDING_RETRY_SECONDS,
+    ):
+        """
+        Khởi tạo CircuitBreaker
+
+        Args:
+            failure_threshold: Số lỗi liên tiếp để chuyển sang open
+            reset_timeout: Số giây ở trạng thái open trước khi thử lại
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Trạng thái hiện tại: "closed", "open" hoặc "half_open" """
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Có được phép gọi dịch vụ hay không"""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """Ghi nhận lời gọi thành công"""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """Ghi nhận lời gọi lỗi"""
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
@@ -0,0 +1,260 @@
+"""
+Cold tier: bản ghi cũ được nén zstd trong các segment file chỉ append
+
+Mỗi SegmentLog là một thư mục gồm các segment `000000.zst`, `000001.zst`...
+và file chỉ mục `segments.json` ghi số bản ghi và số bytes đã commit của
+từng segment. Mỗi lần append nén các bản ghi (JSON lines) thành một zstd
+frame và nối vào segment cuối; khi segment vượt COLD_SEGMENT_MAX_BYTES thì
+mở segment mới. Người đọc chỉ đọc phần đã commit theo chỉ mục nên không
+thấy frame đang ghi dở; frame thừa do bị ngắt giữa chừng bị cắt bỏ ở lần
+append tiếp theo.
+
+Được dùng cho lịch sử chat đã lưu trữ (JSONChatMessageHistory) và nội dung
+các documents cũ của vector memory (TieredDocstore).
+"""
+
+import io
+import json
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+import zstandard
+from langchain.docstore.document import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+
+from config import COLD_SEGMENT_MAX_BYTES, COLD_ZSTD_LEVEL
+
+from .storage import atomic_write_json, file_lock, read_json
+
+INDEX_FILE = "segments.json"
+
+# Số segment đã giải nén được giữ trong RAM cho việc tra cứu theo ID
+_DECODED_SEGMENTS = 2
+
+
+class SegmentLog:
+    """
+    Log các bản ghi JSON trong những segment nén zstd, chỉ append
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_segment_bytes: int = COLD_SEGMENT_MAX_BYTES,
+        level: int = COLD_ZSTD_LEVEL,
+    ):
+        """
+        Khởi tạo SegmentLog (thư mục chỉ được tạo khi append lần đầu)
+
+        Args:
+            directory: Thư mục chứa các segment
+            max_segment_bytes: Kích thước (đã nén) để chuyển sang segment mới
+            level: Mức nén zstd
+        """
+        self.directory = Path(directory)
+        self.index_path = self.directory / INDEX_FILE
+        self.max_segment_bytes = max_segment_bytes
+        self.level = level
+        self._decoded: "OrderedDict[tuple, Dict[str, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def segments(self) -> List[Dict[str, Any]]:
+        """Chỉ mục các segment: [{"id", "file", "records", "bytes"}]"""
+        return read_json(self.index_path, {"segments": []})["segments"]
+
+    def count(self) -> int:
+        """Tổng số bản ghi đã commit"""
+        return sum(segment["records"] for segment in self.segments())
+
+    def compressed_bytes(self) -> int:
+        """Tổng số bytes (đã nén) của các segment"""
+        return sum(segment["bytes"] for segment in self.segments())
+
+    def append(self, records: List[Dict[str, Any]]) -> Optional[int]:
+        """
+        Nén và nối các bản ghi vào segment cuối
+
+        Args:
+            records: Các bản ghi (dict tuần tự hóa được bằng JSON)
+
+        Returns:
+            ID của segment chứa các bản ghi (None nếu không có bản ghi nào)
+        """
+        if not records:
+            return None
+        payload = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        frame = zstandard.ZstdCompressor(level=self.level).compress(payload.encode("utf-8"))
+
+        with file_lock(self.index_path):
+            segments = self.segments()
+            if not segments or segments[-1]["bytes"] >= self.max_segment_bytes:
+                segment_id = segments[-1]["id"] + 1 if segments else 0
+                segments.append(
+                    {"id": segment_id, "file": f"{segment_id:06d}.zst", "records": 0, "bytes": 0}
+                )
+            segment = segments[-1]
+            with open(self.directory / segment["file"], "ab") as f:
+                # Bỏ frame chưa commit của lần ghi bị ngắt trước đó
+                f.truncate(segment["bytes"])
+                f.write(frame)
+                f.flush()
+            segment["records"] += len(records)
+            segment["bytes"] += len(frame)
+            atomic_write_json(self.index_path, {"segments": segments}, indent=None)
+        return segment["id"]
+
+    def _read(self, segment: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Giải nén phần đã commit của một segment"""
+        with open(self.directory / segment["file"], "rb") as f:
+            data = f.read(segment["bytes"])
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            io.BytesIO(data), read_across_frames=True
+        )
+        text = reader.read().decode("utf-8")
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    def read_segment(self, segment_id: int) -> List[Dict[str, Any]]:
+        """
+        Các bản ghi đã commit của một segment
+
+        Args:
+            segment_id: ID của segment
+        """
+        for segment in self.segments():
+            if segment["id"] == segment_id:
+                return self._read(segment)
+        return []
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """Duyệt tất cả bản ghi theo thứ tự ghi, giải nén từng segment một"""
+        for segment in self.segments():
+            yield from self._read(segment)
+
+    def lookup(self, segment_id: int, key: str, field: str = "id") -> Optional[Dict[str, Any]]:
+        """
+        Tìm bản ghi theo khóa trong một segment (segment đã giải nén được cache)
+
+        Args:
+            segment_id: ID của segment
+            key: Giá trị khóa cần tìm
+            field: Tên trường khóa của bản ghi
+        """
+        segment = next((s for s in self.segments() if s["id"] == segment_id), None)
+        if segment is None:
+            return None
+        cache_key = (segment_id, segment["bytes"], field)
+        with self._lock:
+            decoded = self._decoded.get(cache_key)
+            if decoded is not None:
+                self._decoded.move_to_end(cache_key)
+        if decoded is None:
+            try:
+                decoded = {record[field]: record for record in self._read(segment)}
+            except OSError:
+                return None
+            with self._lock:
+                self._decoded[cache_key] = decoded
+                while len(self._decoded) > _DECODED_SEGMENTS:
+                    self._decoded.popitem(last=False)
+        return decoded.get(key)
+
+    def clear(self) -> None:
+        """Xóa toàn bộ segment và chỉ mục"""
+        with file_lock(self.index_path):
+            shutil.rmtree(self.directory, ignore_errors=True)
+        with self._lock:
+            self._decoded.clear()
+
+
+class TieredDocstore(InMemoryDocstore):
+    """
+    Docstore của FAISS với nội dung documents cũ nằm trong cold tier
+
+    Documents nóng nằm trong RAM như InMemoryDocstore; documents đã chuyển
+    sang cold tier chỉ còn ID -> segment trong RAM (được pickle cùng index),
+    nội dung được đọc từ SegmentLog khi truy xuất. SegmentLog không được
+    pickle mà được gắn lại bằng attach() sau khi tải index.
+    """
+
+    def __init__(
+        self,
+        _dict: Optional[Dict[str, Document]] = None,
+        cold: Optional[Dict[str, int]] = None,
+    ):
+        super().__init__(_dict)
+        self._cold: Dict[str, int] = dict(cold or {})
+        self.segments: Optional[SegmentLog] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["segments"] = None
+        return state
+
+    def attach(self, segments: SegmentLog) -> None:
+        """Gắn SegmentLog chứa nội dung các documents cold"""
+        self.segments = segments
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = set(texts).intersection(self._dict).union(
+            set(texts).intersection(self._cold)
+        )
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        # Cập nhật tại chỗ thay vì tạo dict mới ở mỗi lần thêm
+        self._dict.update(texts)
+
+    def delete(self, ids: List) -> None:
+        for doc_id in ids:
+            self._dict.pop(doc_id, None)
+            self._cold.pop(doc_id, None)
+
+    def search(self, search: str) -> Union[str, Document]:
+        document = self._dict.get(search)
+        if document is not None:
+            return document
+        segment_id = self._cold.get(search)
+        if segment_id is None or self.segments is None:
+            return f"ID {search} not found."
+        record = self.segments.lookup(segment_id, search)
+        if record is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=record["page_content"], metadata=record["metadata"])
+
+    def is_hot(self, doc_id: str) -> bool:
+        """Nội dung document có nằm trong RAM không"""
+        return doc_id in self._dict
+
+    def evict(self, ids: Iterable[str]) -> int:
+        """
+        Chuyển nội dung các documents sang cold tier
+
+        Args:
+            ids: ID các documents nóng cần chuyển
+
+        Returns:
+            Số documents đã chuyển
+        """
+        ids = [doc_id for doc_id in ids if doc_id in self._dict]
+        if not ids or self.segments is None:
+            return 0
+        segment_id = self.segments.append(
+            [
+                {
+                    "id": doc_id,
+                    "page_content": self._dict[doc_id].page_content,
+                    "metadata": self._dict[doc_id].metadata,
+                }
+                for doc_id in ids
+            ]
+        )
+        for doc_id in ids:
+            del self._dict[doc_id]
+            self._cold[doc_id] = segment_id
+        return len(ids)
+
+    def stats(self) -> Dict[str, int]:
+        """Số documents nóng/cold"""
+        return {"hot": len(self._dict), "cold": len(self._cold)}
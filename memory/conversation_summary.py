@@ -0,0 +1,152 @@
+"""
+Tầng tóm tắt hội thoại: tóm tắt theo block và tóm tắt cuốn chiếu (rolling summary)
+"""
+
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List
+
+from config import CHAT_HISTORY_DIR
+
+from .storage import atomic_write_json, file_lock, read_json
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?…])\s+|\n+")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Các từ xuất hiện nhiều nhưng không mang thông tin
+_STOPWORDS = {
+    "tôi", "bạn", "mình", "là", "và", "của", "có", "không", "được", "cho",
+    "với", "thì", "mà", "này", "đó", "một", "các", "những", "rất", "cũng",
+    "đã", "sẽ", "đang", "ai", "người", "dùng", "nói", "trả", "lời",
+}
+
+
+def _split_sentences(text: str) -> List[str]:
+    """Tách đoạn text thành các câu"""
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text) if s and s.strip()]
+
+
+def extractive_summary(lines: List[str], max_sentences: int = 6) -> str:
+    """
+    Tóm tắt trích xuất cục bộ (không gọi LLM)
+
+    Chấm điểm mỗi câu theo tần suất các từ mang thông tin trong toàn bộ
+    đoạn hội thoại, giữ lại các câu điểm cao nhất theo thứ tự xuất hiện.
+
+    Args:
+        lines: Các dòng cần tóm tắt (ví dụ "Người dùng: ...")
+        max_sentences: Số câu tối đa của bản tóm tắt
+
+    Returns:
+        Chuỗi tóm tắt
+    """
+    sentences = []
+    for line in lines:
+        prefix = ""
+        if ": " in line[:20]:
+            prefix, line = line.split(": ", 1)
+            prefix += ": "
+        sentences.extend(prefix + s for s in _split_sentences(line))
+
+    if len(sentences) <= max_sentences:
+        return "\n".join(sentences)
+
+    def words(sentence: str) -> List[str]:
+        return [
+            w
+            for w in (w.lower() for w in _WORD.findall(sentence))
+            if len(w) > 1 and w not in _STOPWORDS
+        ]
+
+    frequencies = Counter(w for s in sentences for w in words(s))
+
+    def score(sentence: str) -> float:
+        sentence_words = words(sentence)
+        if not sentence_words:
+            return 0.0
+        return sum(frequencies[w] for w in sentence_words) / len(sentence_words) ** 0.5
+
+    ranked = sorted(range(len(sentences)), key=lambda i: (-score(sentences[i]), i))
+    return "\n".join(sentences[i] for i in sorted(ranked[:max_sentences]))
+
+
+class ConversationSummaryStore:
+    """
+    Lưu các bản tóm tắt block và rolling summary của một phiên trò chuyện
+    Mỗi user_id/session_id có một file JSON nhỏ gọn riêng
+    """
+
+    def __init__(self, user_id: str, session_id: str = "default"):
+        """
+        Khởi tạo ConversationSummaryStore
+
+        Args:
+            user_id: ID của người dùng
+            session_id: ID của phiên trò chuyện
+        """
+        self.user_id = user_id
+        self.session_id = session_id
+        self.file_path = CHAT_HISTORY_DIR / f"{user_id}_{session_id}_summary.json"
+
+    @staticmethod
+    def _empty_state() -> Dict[str, Any]:
+        """Trạng thái rỗng"""
+        return {"rolling_summary": "", "summarized_until": 0, "blocks": []}
+
+    def load(self) -> Dict[str, Any]:
+        """Tải trạng thái tóm tắt từ file JSON"""
+        return read_json(self.file_path, self._empty_state())
+
+    def _save(self, state: Dict[str, Any]) -> None:
+        """Lưu trạng thái tóm tắt (nguyên tử, không indent để file gọn)"""
+        atomic_write_json(self.file_path, state, indent=None)
+
+    def get_rolling_summary(self) -> str:
+        """Lấy rolling summary hiện tại"""
+        return self.load()["rolling_summary"]
+
+    def get_summarized_until(self) -> int:
+        """Lấy vị trí (tuyệt đối) của message đầu tiên chưa được tóm tắt"""
+        return self.load()["summarized_until"]
+
+    def add_block(
+        self, start: int, end: int, block_summary: str, rolling_summary: str
+    ) -> None:
+        """
+        Ghi nhận một block đã được tóm tắt
+
+        Args:
+            start: Vị trí message đầu của block (tuyệt đối)
+            end: Vị trí sau message cuối của block (tuyệt đối)
+            block_summary: Tóm tắt của block
+            rolling_summary: Rolling summary mới sau khi gộp block
+        """
+        with file_lock(self.file_path):
+            state = self.load()
+            state["blocks"].append(
+                {
+                    "start": start,
+                    "end": end,
+                    "summary": block_summary,
+                    "created_at": datetime.now().isoformat(timespec="seconds"),
+                }
+            )
+            state["rolling_summary"] = rolling_summary
+            state["summarized_until"] = end
+            self._save(state)
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        """
+        Thay toàn bộ trạng thái tóm tắt (dùng cho import)
+
+        Args:
+            state: Trạng thái như load() trả về
+        """
+        with file_lock(self.file_path):
+            self._save({**self._empty_state(), **state})
+
+    def clear(self) -> None:
+        """Xóa tất cả bản tóm tắt"""
+        with file_lock(self.file_path):
+            self._save(self._empty_state())
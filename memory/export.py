@@ -0,0 +1,334 @@
+"""
+Export/import toàn bộ memory của một người dùng (sao lưu, chuyển node)
+
+Một file archive có phiên bản duy nhất thay cho bốn loại dữ liệu khác nhau
+(lịch sử chat, entities, metadata và thư mục FAISS). Archive là một luồng:
+
+- Dòng đầu là header JSON: format, version, user/session, embedder_id, số chiều
+- Mỗi bản ghi là một dòng JSON (NDJSON) có trường "kind": "message",
+  "summary", "entity", "pending", "vectors", "memory" và cuối cùng "end"
+- Bản ghi "vectors" có "count" và "dimension", theo sau là count × dimension
+  số float32 little-endian thô, rồi đúng count bản ghi "memory" tương ứng
+
+Cả hai chiều đều xử lý theo lô nên bộ nhớ dùng không phụ thuộc số memories,
+và vector được nạp lại trực tiếp mà không embed lại. Mặc định luồng được nén
+zstd; import tự nhận biết file có nén hay không.
+
+Ví dụ:
+    python -m memory.export export user123 user123.agentmem
+    python -m memory.export import user123 user123.agentmem
+"""
+
+import argparse
+import io
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, Iterator, List, Tuple
+
+import numpy as np
+import zstandard
+
+from config import COLD_ZSTD_LEVEL
+
+from .safe_embeddings import get_embedder_id
+
+if TYPE_CHECKING:
+    from .memory_manager import MemoryManager
+
+FORMAT_NAME = "agent-memory-export"
+FORMAT_VERSION = 1
+
+# Số messages/memories mỗi lô khi export và import
+BATCH_SIZE = 1000
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_FLOAT32 = np.dtype("<f4")
+
+
+def _write_record(stream: BinaryIO, record: Dict[str, Any]) -> None:
+    """Ghi một bản ghi NDJSON"""
+    stream.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+
+
+def _read_record(stream: BinaryIO) -> Dict[str, Any]:
+    """Đọc một bản ghi NDJSON"""
+    line = stream.readline()
+    if not line:
+        raise ValueError("Archive bị cắt cụt (thiếu bản ghi kết thúc)")
+    return json.loads(line)
+
+
+@contextmanager
+def _open_writer(path: str, compress: bool) -> Iterator[BinaryIO]:
+    """Mở luồng ghi archive (nén zstd nếu compress)"""
+    with open(path, "wb") as f:
+        if not compress:
+            yield f
+            return
+        writer = zstandard.ZstdCompressor(level=COLD_ZSTD_LEVEL).stream_writer(f)
+        yield writer
+        writer.flush(zstandard.FLUSH_FRAME)
+
+
+@contextmanager
+def _open_reader(path: str) -> Iterator[BinaryIO]:
+    """Mở luồng đọc archive, tự nhận biết nén zstd"""
+    with open(path, "rb") as f:
+        if f.read(4) != _ZSTD_MAGIC:
+            f.seek(0)
+            yield f
+            return
+        f.seek(0)
+        reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+        yield io.BufferedReader(reader)
+
+
+def export_memory(manager: "MemoryManager", path: str, compress: bool = True) -> Dict[str, int]:
+    """
+    Ghi toàn bộ memory của người dùng (và session của manager) ra một archive
+
+    Args:
+        manager: MemoryManager của người dùng
+        path: Đường dẫn file archive
+        compress: Nén luồng bằng zstd
+
+    Returns:
+        Số bản ghi đã ghi theo từng loại
+    """
+    manager.wait_for_summaries()
+    vector_memory = manager.vector_memory
+    vector_memory.flush_pending_writes()
+    counts = {"messages": 0, "entities": 0, "memories": 0, "pending": 0}
+
+    with _open_writer(path, compress) as stream:
+        _write_record(
+            stream,
+            {
+                "format": FORMAT_NAME,
+                "version": FORMAT_VERSION,
+                "user_id": manager.user_id,
+                "session_id": manager.session_id,
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "embedder_id": vector_memory.index_embedder_id
+                or get_embedder_id(vector_memory.embeddings),
+                "dimension": vector_memory.vector_store.index.d,
+            },
+        )
+
+        for archived in (True, False):
+            for message in manager.chat_history.iter_message_dicts(archived):
+                _write_record(stream, {"kind": "message", "archived": archived, "message": message})
+                counts["messages"] += 1
+        _write_record(stream, {"kind": "summary", "state": manager.summary_store.load()})
+
+        for name, facts in manager.entity_store.get_all_entities().items():
+            _write_record(stream, {"kind": "entity", "name": name, "facts": facts})
+            counts["entities"] += 1
+
+        for item in vector_memory.pending_writes.items():
+            _write_record(stream, {"kind": "pending", **item})
+            counts["pending"] += 1
+
+        for vectors, records in vector_memory.iter_embedded_memories(BATCH_SIZE):
+            vectors = np.ascontiguousarray(vectors, dtype=_FLOAT32)
+            _write_record(
+                stream, {"kind": "vectors", "count": len(records), "dimension": vectors.shape[1]}
+            )
+            stream.write(vectors.tobytes())
+            for record in records:
+                _write_record(stream, {"kind": "memory", **record})
+            counts["memories"] += len(records)
+
+        _write_record(stream, {"kind": "end", "counts": counts})
+    return counts
+
+
+def _read_vectors(
+    stream: BinaryIO, header: Dict[str, Any]
+) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+    """Đọc một khối vector float32 cùng các bản ghi memory theo sau"""
+    count, dimension = header["count"], header["dimension"]
+    size = count * dimension * _FLOAT32.itemsize
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError("Archive bị cắt cụt (khối vector không đủ bytes)")
+    vectors = np.frombuffer(data, dtype=_FLOAT32).reshape(count, dimension)
+    records = []
+    for _ in range(count):
+        record = _read_record(stream)
+        if record.get("kind") != "memory":
+            raise ValueError("Archive không hợp lệ (thiếu bản ghi memory sau khối vector)")
+        records.append(record)
+    return vectors, records
+
+
+def _check_header(header: Dict[str, Any], path: str) -> None:
+    """Kiểm tra header của archive"""
+    if header.get("format") != FORMAT_NAME:
+        raise ValueError(f"{path} không phải archive memory")
+    if header.get("version", 0) > FORMAT_VERSION:
+        raise ValueError(f"Archive version {header['version']} chưa được hỗ trợ")
+
+
+def validate_archive(path: str) -> Dict[str, int]:
+    """
+    Đọc hết archive (không ghi gì) để kiểm tra trước khi import
+
+    Args:
+        path: Đường dẫn file archive
+
+    Returns:
+        Số bản ghi theo từng loại
+
+    Raises:
+        ValueError: Archive bị cắt cụt, hỏng hoặc số bản ghi khác bản ghi kết thúc
+    """
+    counts = {"messages": 0, "entities": 0, "memories": 0, "pending": 0}
+    try:
+        with _open_reader(path) as stream:
+            _check_header(_read_record(stream), path)
+            in_vectors = False
+            while True:
+                record = _read_record(stream)
+                kind = record.get("kind")
+                if kind == "end":
+                    break
+                if in_vectors and kind != "vectors":
+                    raise ValueError(f"Bản ghi không mong đợi sau vector: {kind}")
+                if kind == "message":
+                    counts["messages"] += 1
+                elif kind == "entity":
+                    counts["entities"] += 1
+                elif kind == "pending":
+                    counts["pending"] += 1
+                elif kind == "vectors":
+                    in_vectors = True
+                    counts["memories"] += len(_read_vectors(stream, record)[1])
+                elif kind != "summary":
+                    raise ValueError(f"Loại bản ghi không hợp lệ: {kind}")
+    except (json.JSONDecodeError, KeyError, zstandard.ZstdError) as e:
+        raise ValueError(f"Archive bị hỏng: {e}") from e
+
+    expected = record.get("counts", {})
+    if any(expected.get(name, count) != count for name, count in counts.items()):
+        raise ValueError(f"Số bản ghi trong archive {counts} khác với bản ghi kết thúc {expected}")
+    return counts
+
+
+def import_memory(manager: "MemoryManager", path: str) -> Dict[str, int]:
+    """
+    Nạp archive vào memory của người dùng, thay thế toàn bộ dữ liệu hiện có
+
+    Memories được giữ nguyên ID và vector (không embed lại) nếu embeddings
+    hiện tại giống embeddings đã tạo archive; nếu khác, chúng được xếp hàng
+    để embed lại. Metadata "user_id" được đổi sang người dùng của manager.
+
+    Archive được đọc và kiểm tra hết một lượt trước khi xóa dữ liệu hiện có,
+    nên archive hỏng hoặc bị cắt cụt không làm mất memory của người dùng.
+
+    Args:
+        manager: MemoryManager của người dùng nhận dữ liệu
+        path: Đường dẫn file archive
+
+    Returns:
+        Số bản ghi đã nạp theo từng loại
+
+    Raises:
+        ValueError: Archive không hợp lệ (dữ liệu hiện có được giữ nguyên), hoặc
+            số bản ghi đã nạp khác với archive
+    """
+    expected = validate_archive(path)
+    counts = {"messages": 0, "entities": 0, "memories": 0, "pending": 0}
+    vector_memory = manager.vector_memory
+
+    with _open_reader(path) as stream:
+        header = _read_record(stream)
+        _check_header(header, path)
+
+        manager.wait_for_summaries()
+        manager.chat_history.clear()
+        manager.summary_store.clear()
+        manager.entity_store.clear()
+        vector_memory.clear_memories()
+
+        messages: Dict[bool, List[Dict[str, Any]]] = {True: [], False: []}
+
+        def flush_messages(archived: bool) -> None:
+            if messages[archived]:
+                manager.chat_history.import_message_dicts(messages[archived], archived)
+                counts["messages"] += len(messages[archived])
+                messages[archived] = []
+
+        def memory_batches(
+            record: Dict[str, Any]
+        ) -> Iterator[Tuple[np.ndarray, List[Dict[str, Any]]]]:
+            """Các khối vector, đọc tiếp luồng cho đến bản ghi kết thúc"""
+            while record["kind"] != "end":
+                if record["kind"] != "vectors":
+                    raise ValueError(f"Bản ghi không mong đợi sau vector: {record['kind']}")
+                vectors, records = _read_vectors(stream, record)
+                for memory in records:
+                    memory["metadata"] = {**memory["metadata"], "user_id": manager.user_id}
+                counts["memories"] += len(records)
+                yield vectors, records
+                record = _read_record(stream)
+
+        while True:
+            record = _read_record(stream)
+            kind = record.get("kind")
+            if kind == "message":
+                archived = bool(record["archived"])
+                messages[archived].append(record["message"])
+                if len(messages[archived]) >= BATCH_SIZE:
+                    flush_messages(archived)
+            elif kind == "summary":
+                manager.summary_store.restore(record["state"])
+            elif kind == "entity":
+                for fact in record["facts"]:
+                    manager.entity_store.add_fact(record["name"], fact)
+                counts["entities"] += 1
+            elif kind == "pending":
+                metadata = {**record["metadata"], "user_id": manager.user_id}
+                vector_memory.pending_writes.append(record["content"], metadata)
+                counts["pending"] += 1
+            elif kind in ("vectors", "end"):
+                break
+            else:
+                raise ValueError(f"Loại bản ghi không hợp lệ: {kind}")
+        flush_messages(True)
+        flush_messages(False)
+
+        vector_memory.import_embedded_memories(
+            memory_batches(record), header.get("embedder_id")
+        )
+
+    if counts != expected:
+        raise ValueError(f"Import chưa đầy đủ: đã nạp {counts}, archive có {expected}")
+    return counts
+
+
+def main():
+    """Entry point của CLI"""
+    from .memory_manager import MemoryManager
+
+    parser = argparse.ArgumentParser(description="Export/import memory của một người dùng")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("user_id")
+    parser.add_argument("file")
+    parser.add_argument("--session", default="default", help="Session của lịch sử chat")
+    parser.add_argument("--no-compress", action="store_true", help="Không nén archive (export)")
+    args = parser.parse_args()
+
+    manager = MemoryManager(args.user_id, args.session)
+    if args.command == "export":
+        counts = export_memory(manager, args.file, compress=not args.no_compress)
+        print(f"✅ Đã export {counts} vào {args.file}")
+    else:
+        counts = import_memory(manager, args.file)
+        manager.flush()
+        print(f"✅ Đã import {counts} cho {args.user_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,6 @@ Embeddings alternativos para ambientes Streamlit
 import hashlib
 from typing import List
 
-from sentence_transformers import SentenceTransformer
-
 
 class StreamlitSafeEmbeddings:
     """
@@ -14,6 +12,9 @@ class StreamlitSafeEmbeddings:
     Como fallback se GoogleGenerativeAI falha
     """
 
+    # Dimensión de los vectores de all-MiniLM-L6-v2
+    dimension = 384
+
     def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
         """
         Inicializar con modelo sentence-transformers
@@ -24,15 +25,19 @@ class StreamlitSafeEmbeddings:
         self.model_name = model_name
         self._model = None
         self._cache = {}
+        self.embedder_id = f"sentence-transformers:{model_name}"
 
     def _get_model(self):
         """Lazy loading del modelo"""
         if self._model is None:
             try:
+                # Import diferido: sentence_transformers carga torch y transformers
+                from sentence_transformers import SentenceTransformer
+
                 self._model = SentenceTransformer(self.model_name)
             except Exception as e:
                 print(f"Error loading sentence-transformers model: {e}")
-                # Fallback a embeddings dummy
+                # Se reintentará en la próxima llamada
                 self._model = None
         return self._model
 
@@ -45,8 +50,8 @@ class StreamlitSafeEmbeddings:
         model = self._get_model()
 
         if model is None:
-            # Fallback: embeddings dummy
-            return [[0.0] * 384 for _ in texts]
+            # Vectores cero envenenarían el índice: mejor reportar el error
+            raise RuntimeError(f"Modelo {self.model_name} no disponible")
 
         try:
             # Verificar cache primero
@@ -77,8 +82,12 @@ class StreamlitSafeEmbeddings:
 
         except Exception as e:
             print(f"Error in embed_documents: {e}")
-            return [[0.0] * 384 for _ in texts]
+            raise
 
     def embed_query(self, text: str) -> List[float]:
         """Embed consulta única"""
         return self.embed_documents([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed varias consultas en una sola llamada al modelo"""
+        return self.embed_documents(texts)
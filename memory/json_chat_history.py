@@ -1,12 +1,18 @@
 """
 JSON-based Chat Message History để lưu trữ lịch sử trò chuyện
 """
+import itertools
 import json
+import os
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List
+from typing import Callable, Iterator, List, Optional
 from langchain.schema import BaseChatMessageHistory
 from langchain.schema.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
-from config import CHAT_HISTORY_DIR
+from config import CHAT_HISTORY_DIR, COLD_TIER_AFTER_DAYS, HISTORY_HOT_MAX_MESSAGES
+from .cold_storage import SegmentLog
+from .storage import atomic_write_json, file_lock, read_json
+from .tracing import traced
 
 
 class JSONChatMessageHistory(BaseChatMessageHistory):
@@ -14,6 +20,11 @@ class JSONChatMessageHistory(BaseChatMessageHistory):
     Chat Message History sử dụng file JSON để lưu trữ
     Mỗi user_id sẽ có một file JSON riêng chứa lịch sử trò chuyện
     """
+
+    # Trả về số messages (tính từ đầu session) được phép chuyển sang cold tier
+    # theo chính sách HISTORY_HOT_MAX_MESSAGES / COLD_TIER_AFTER_DAYS; MemoryManager
+    # đặt bằng số messages đã tóm tắt để messages chưa tóm tắt luôn nằm trong file hot
+    archivable_until: Optional[Callable[[], int]] = None
     
     def __init__(self, user_id: str, session_id: str = "default"):
         """
@@ -26,19 +37,41 @@ class JSONChatMessageHistory(BaseChatMessageHistory):
         self.user_id = user_id
         self.session_id = session_id
         self.file_path = CHAT_HISTORY_DIR / f"{user_id}_{session_id}_history.json"
+        # Cold storage cho các messages cũ (segment nén zstd, chỉ append)
+        self.archive = SegmentLog(CHAT_HISTORY_DIR / f"{user_id}_{session_id}_archive")
+        # Định dạng cũ (JSON lines không nén), được chuyển sang segment khi khởi tạo
+        self.archive_path = CHAT_HISTORY_DIR / f"{user_id}_{session_id}_archive.jsonl"
+        # Số messages của file hot kèm (inode, size, mtime_ns) lúc đếm; file đổi thì đếm lại
+        self._counted: Optional[tuple] = None
         self._ensure_file_exists()
+        self._migrate_legacy_archive()
     
     def _ensure_file_exists(self) -> None:
         """Đảm bảo file JSON tồn tại"""
         if not self.file_path.exists():
-            self.file_path.write_text(json.dumps([]))
+            with file_lock(self.file_path):
+                if not self.file_path.exists():
+                    atomic_write_json(self.file_path, [])
     
+    def _migrate_legacy_archive(self) -> None:
+        """Chuyển cold storage dạng JSON lines cũ sang segment nén"""
+        if not self.archive_path.exists():
+            return
+        with file_lock(self.file_path):
+            if not self.archive_path.exists():
+                return
+            with open(self.archive_path, "r", encoding="utf-8") as f:
+                archived = [json.loads(line) for line in f if line.strip()]
+            self.archive.append(archived)
+            self.archive_path.unlink()
+
     def _message_to_dict(self, message: BaseMessage) -> dict:
         """Chuyển đổi BaseMessage thành dictionary"""
         return {
             "type": message.__class__.__name__,
             "content": message.content,
             "additional_kwargs": getattr(message, "additional_kwargs", {}),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
         }
     
     def _dict_to_message(self, message_dict: dict) -> BaseMessage:
@@ -58,17 +91,46 @@ class JSONChatMessageHistory(BaseChatMessageHistory):
             return HumanMessage(content=content, additional_kwargs=additional_kwargs)
     
     def _load_messages(self) -> List[dict]:
-        """Tải messages từ file JSON"""
-        try:
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
+        """Tải messages từ file JSON (snapshot, không bị chặn bởi người ghi)"""
+        return read_json(self.file_path, [])
     
+    @traced("history.write")
     def _save_messages(self, messages: List[dict]) -> None:
-        """Lưu messages vào file JSON"""
-        with open(self.file_path, 'w', encoding='utf-8') as f:
-            json.dump(messages, f, ensure_ascii=False, indent=2)
+        """Lưu messages vào file JSON (nguyên tử, cần giữ file_lock)"""
+        atomic_write_json(self.file_path, messages, indent=None)
+        self._counted = (self._stat(), len(messages))
+
+    def _stat(self) -> Optional[tuple]:
+        """(inode, size, mtime_ns) của file hot, None nếu chưa có"""
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _cold_prefix(self, messages: List[dict]) -> int:
+        """
+        Số messages đầu danh sách cần chuyển sang cold tier theo chính sách
+        HISTORY_HOT_MAX_MESSAGES / COLD_TIER_AFTER_DAYS (0 = tắt)
+        """
+        count = 0
+        if HISTORY_HOT_MAX_MESSAGES > 0 and len(messages) > HISTORY_HOT_MAX_MESSAGES:
+            # Chuyển một nửa giới hạn mỗi lần để segment nhận ít frame lớn
+            # thay vì một frame cho mỗi message mới
+            count = len(messages) - HISTORY_HOT_MAX_MESSAGES // 2
+        if COLD_TIER_AFTER_DAYS > 0:
+            cutoff = (datetime.now() - timedelta(days=COLD_TIER_AFTER_DAYS)).isoformat()
+            aged = 0
+            # Messages cũ (không có timestamp) không được chuyển theo tuổi
+            for message_dict in messages:
+                timestamp = message_dict.get("timestamp")
+                if not timestamp or timestamp >= cutoff:
+                    break
+                aged += 1
+            count = max(count, aged)
+        if count and self.archivable_until is not None:
+            count = min(count, max(self.archivable_until() - self.archive.count(), 0))
+        return count
     
     @property
     def messages(self) -> List[BaseMessage]:
@@ -83,9 +145,15 @@ class JSONChatMessageHistory(BaseChatMessageHistory):
         Args:
             message: Message cần thêm
         """
-        messages = self._load_messages()
-        messages.append(self._message_to_dict(message))
-        self._save_messages(messages)
+        with file_lock(self.file_path):
+            messages = self._load_messages()
+            messages.append(self._message_to_dict(message))
+            cold = self._cold_prefix(messages)
+            if cold:
+                # Ghi vào cold storage trước rồi mới cắt file hot
+                self.archive.append(messages[:cold])
+                messages = messages[cold:]
+            self._save_messages(messages)
     
     def add_user_message(self, message: str) -> None:
         """
@@ -106,12 +174,84 @@ class JSONChatMessageHistory(BaseChatMessageHistory):
         self.add_message(AIMessage(content=message))
     
     def clear(self) -> None:
-        """Xóa tất cả messages"""
-        self._save_messages([])
+        """Xóa tất cả messages (kể cả cold storage)"""
+        with file_lock(self.file_path):
+            self._save_messages([])
+            self.archive.clear()
+            self.archive_path.unlink(missing_ok=True)
     
     def get_messages_count(self) -> int:
-        """Lấy số lượng messages"""
-        return len(self._load_messages())
+        """Lấy số lượng messages trong file hot (chỉ đọc lại file khi process khác đã ghi)"""
+        stat = self._stat()
+        counted = self._counted
+        if counted is not None and counted[0] == stat:
+            return counted[1]
+        count = len(self._load_messages())
+        self._counted = (stat, count)
+        return count
+    
+    def get_archived_count(self) -> int:
+        """Lấy số lượng messages đã chuyển sang cold storage"""
+        return self.archive.count()
+    
+    @traced("history.archive")
+    def archive_messages(self, count: int) -> int:
+        """
+        Chuyển các messages cũ nhất sang cold storage để file hot luôn nhỏ
+        
+        Args:
+            count: Số lượng messages cần chuyển
+            
+        Returns:
+            Số lượng messages thực sự đã chuyển
+        """
+        with file_lock(self.file_path):
+            messages = self._load_messages()
+            archived = messages[:count]
+            if not archived:
+                return 0
+            
+            # Ghi vào cold storage trước rồi mới cắt file hot
+            self.archive.append(archived)
+            self._save_messages(messages[len(archived):])
+            return len(archived)
+    
+    def iter_message_dicts(self, archived: bool) -> Iterator[dict]:
+        """
+        Duyệt messages dạng dictionary theo thứ tự thời gian (dùng cho export)
+
+        Args:
+            archived: True để duyệt cold storage, False để duyệt file hot
+        """
+        if archived:
+            yield from self.archive.iter_records()
+        else:
+            yield from self._load_messages()
+    
+    def import_message_dicts(self, message_dicts: List[dict], archived: bool) -> None:
+        """
+        Thêm một lô messages dạng dictionary vào cuối lịch sử (dùng cho import)
+
+        Args:
+            message_dicts: Các messages theo thứ tự thời gian
+            archived: True để ghi thẳng vào cold storage
+        """
+        with file_lock(self.file_path):
+            if archived:
+                self.archive.append(message_dicts)
+            else:
+                messages = self._load_messages()
+                messages.extend(message_dicts)
+                self._save_messages(messages)
+    
+    def iter_archived_messages(self) -> Iterator[BaseMessage]:
+        """Duyệt các messages trong cold storage theo thứ tự thời gian (giải nén từng segment)"""
+        for message_dict in self.archive.iter_records():
+            yield self._dict_to_message(message_dict)
+    
+    def get_archived_messages(self) -> List[BaseMessage]:
+        """Lấy các messages trong cold storage"""
+        return list(self.iter_archived_messages())
     
     def get_recent_messages(self, limit: int = 10) -> List[BaseMessage]:
         """
@@ -148,7 +288,7 @@ class JSONChatMessageHistory(BaseChatMessageHistory):
     
     def search_messages(self, query: str, limit: int = 5) -> List[BaseMessage]:
         """
-        Tìm kiếm messages theo nội dung
+        Tìm kiếm messages theo nội dung (file hot trước, sau đó cold storage)
         
         Args:
             query: Từ khóa tìm kiếm
@@ -157,10 +297,11 @@ class JSONChatMessageHistory(BaseChatMessageHistory):
         Returns:
             Danh sách messages chứa từ khóa
         """
-        messages = self.messages
         matching_messages = []
+        if limit <= 0:
+            return matching_messages
         
-        for message in messages:
+        for message in itertools.chain(self.messages, self.iter_archived_messages()):
             if query.lower() in message.content.lower():
                 matching_messages.append(message)
                 if len(matching_messages) >= limit:
@@ -2,12 +2,13 @@
 JSON-based Entity Store để lưu trữ thông tin thực thể của người dùng
 """
 
-import json
 from pathlib import Path
 from typing import Dict, List, Optional
 from langchain.memory.entity import BaseEntityStore
 from pydantic import Field
 from config import ENTITIES_DIR
+from .storage import atomic_write_json, file_lock, read_json
+from .tracing import traced
 
 
 class JSONEntityStore(BaseEntityStore):
@@ -28,20 +29,18 @@ class JSONEntityStore(BaseEntityStore):
     def _ensure_file_exists(self) -> None:
         """Đảm bảo file JSON tồn tại"""
         if not self.file_path.exists():
-            self.file_path.write_text(json.dumps({}))
+            with file_lock(self.file_path):
+                if not self.file_path.exists():
+                    atomic_write_json(self.file_path, {})
 
     def _load_entities(self) -> Dict[str, List[str]]:
-        """Tải entities từ file JSON"""
-        try:
-            with open(self.file_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+        """Tải entities từ file JSON (snapshot, không bị chặn bởi người ghi)"""
+        return read_json(self.file_path, {})
 
+    @traced("entity_store.write")
     def _save_entities(self, entities: Dict[str, List[str]]) -> None:
-        """Lưu entities vào file JSON"""
-        with open(self.file_path, "w", encoding="utf-8") as f:
-            json.dump(entities, f, ensure_ascii=False, indent=2)
+        """Lưu entities vào file JSON (nguyên tử, cần giữ file_lock)"""
+        atomic_write_json(self.file_path, entities)
 
     def get(self, entity_key: str, default: Optional[str] = None) -> Optional[str]:
         """
@@ -66,15 +65,16 @@ class JSONEntityStore(BaseEntityStore):
             entity_key: Khóa của entity
             entity_value: Giá trị của entity
         """
-        entities = self._load_entities()
-        if entity_key not in entities:
-            entities[entity_key] = []
+        with file_lock(self.file_path):
+            entities = self._load_entities()
+            if entity_key not in entities:
+                entities[entity_key] = []
 
-        # Tránh lưu trùng lặp
-        if entity_value not in entities[entity_key]:
-            entities[entity_key].append(entity_value)
+            # Tránh lưu trùng lặp
+            if entity_value not in entities[entity_key]:
+                entities[entity_key].append(entity_value)
 
-        self._save_entities(entities)
+            self._save_entities(entities)
 
     def delete(self, entity_key: str) -> None:
         """
@@ -83,10 +83,11 @@ class JSONEntityStore(BaseEntityStore):
         Args:
             entity_key: Khóa của entity cần xóa
         """
-        entities = self._load_entities()
-        if entity_key in entities:
-            del entities[entity_key]
-            self._save_entities(entities)
+        with file_lock(self.file_path):
+            entities = self._load_entities()
+            if entity_key in entities:
+                del entities[entity_key]
+                self._save_entities(entities)
 
     def exists(self, entity_key: str) -> bool:
         """
@@ -103,7 +104,8 @@ class JSONEntityStore(BaseEntityStore):
 
     def clear(self) -> None:
         """Xóa tất cả entities"""
-        self._save_entities({})
+        with file_lock(self.file_path):
+            self._save_entities({})
 
     def get_all_entities(self) -> Dict[str, List[str]]:
         """
@@ -135,15 +137,16 @@ class JSONEntityStore(BaseEntityStore):
             entity_key: Khóa của entity
             fact: Fact mới cần thêm
         """
-        entities = self._load_entities()
-        if entity_key not in entities:
-            entities[entity_key] = []
+        with file_lock(self.file_path):
+            entities = self._load_entities()
+            if entity_key not in entities:
+                entities[entity_key] = []
 
-        # Tránh lưu trùng lặp
-        if fact not in entities[entity_key]:
-            entities[entity_key].append(fact)
+            # Tránh lưu trùng lặp
+            if fact not in entities[entity_key]:
+                entities[entity_key].append(fact)
 
-        self._save_entities(entities)
+            self._save_entities(entities)
 
     def remove_fact(self, entity_key: str, fact: str) -> None:
         """
@@ -153,9 +156,10 @@ class JSONEntityStore(BaseEntityStore):
             entity_key: Khóa của entity
             fact: Fact cần xóa
         """
-        entities = self._load_entities()
-        if entity_key in entities and fact in entities[entity_key]:
-            entities[entity_key].remove(fact)
-            if not entities[entity_key]:  # Xóa entity nếu không còn fact nào
-                del entities[entity_key]
-            self._save_entities(entities)
+        with file_lock(self.file_path):
+            entities = self._load_entities()
+            if entity_key in entities and fact in entities[entity_key]:
+                entities[entity_key].remove(fact)
+                if not entities[entity_key]:  # Xóa entity nếu không còn fact nào
+                    del entities[entity_key]
+                self._save_entities(entities)
@@ -0,0 +1,233 @@
+"""
+Pool MemoryManager để phục vụ nhiều người dùng trong cùng một process
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import POOL_MAX_ENTRIES, POOL_MAX_MEMORY_MB, POOL_TTL_SECONDS
+
+from .memory_manager import MemoryManager
+from .providers import create_embeddings
+from .vector_memory import VectorStoreMemory
+
+PoolKey = Tuple[str, str]
+
+
+class MemoryManagerPool:
+    """
+    Cache các MemoryManager đang hoạt động theo (user_id, session_id)
+
+    - Vector memory (FAISS index) được tải một lần cho mỗi user và dùng chung
+      giữa các session của user đó
+    - Embeddings và LLM được dùng chung cho toàn bộ pool
+    - Giải phóng theo LRU khi vượt ngân sách RAM hoặc số lượng, và theo TTL
+      khi một manager không được dùng quá lâu; trạng thái được flush sau khi
+      nhả lock của pool, nên việc ghi index chậm không chặn người dùng khác
+    """
+
+    def __init__(
+        self,
+        llm: Optional[Any] = None,
+        embeddings: Optional[Any] = None,
+        max_memory_mb: int = POOL_MAX_MEMORY_MB,
+        max_entries: int = POOL_MAX_ENTRIES,
+        ttl_seconds: int = POOL_TTL_SECONDS,
+    ):
+        """
+        Khởi tạo MemoryManagerPool
+
+        Args:
+            llm: LLM dùng chung cho entity memory và tóm tắt
+            embeddings: Embeddings dùng chung cho vector memory (mặc định theo EMBEDDING_PROVIDER)
+            max_memory_mb: Ngân sách RAM (MB) cho các index đang tải
+            max_entries: Số MemoryManager tối đa được giữ
+            ttl_seconds: Thời gian rảnh tối đa (giây), 0 = không giới hạn
+        """
+        self.llm = llm
+        # Một embeddings dùng chung cho mọi người dùng trong pool
+        self.embeddings = embeddings or create_embeddings()
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._managers: "OrderedDict[PoolKey, MemoryManager]" = OrderedDict()
+        self._last_used: Dict[PoolKey, float] = {}
+        self._vector_memories: Dict[str, VectorStoreMemory] = {}
+        self._lock = threading.RLock()
+        self._key_locks: Dict[PoolKey, threading.Lock] = {}
+        # Các manager đã bỏ khỏi pool nhưng chưa flush, và số manager đang chờ
+        # flush của mỗi user (manager mới của user đó phải đợi để tải dữ liệu mới nhất)
+        self._evicted: List[Tuple[PoolKey, MemoryManager]] = []
+        self._flushing: Dict[str, int] = {}
+        self._flushed = threading.Condition(self._lock)
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, user_id: str, session_id: str = "default") -> MemoryManager:
+        """
+        Lấy MemoryManager cho (user_id, session_id), tạo mới nếu chưa có
+
+        Args:
+            user_id: ID của người dùng
+            session_id: ID của phiên trò chuyện
+
+        Returns:
+            MemoryManager đã sẵn sàng
+        """
+        key = (user_id, session_id)
+        with self._lock:
+            manager = self._touch(key)
+            if manager is not None:
+                self.stats["hits"] += 1
+            else:
+                key_lock = self._key_locks.setdefault(key, threading.Lock())
+        self._flush_evicted()
+        if manager is not None:
+            return manager
+
+        # Chỉ một thread tạo manager cho mỗi key, các key khác không bị chặn
+        with key_lock:
+            with self._lock:
+                manager = self._touch(key)
+                if manager is not None:
+                    self.stats["hits"] += 1
+            self._flush_evicted()
+            if manager is not None:
+                return manager
+
+            with self._lock:
+                # Manager cũ của user vừa bị bỏ phải flush xong trước khi tải lại từ đĩa
+                self._flushed.wait_for(lambda: not self._flushing.get(user_id))
+                vector_memory = self._vector_memories.get(user_id)
+
+            manager = MemoryManager(
+                user_id,
+                session_id,
+                embeddings=self.embeddings,
+                vector_memory=vector_memory,
+            )
+            if self.llm is not None:
+                manager.initialize_entity_memory_with_llm(self.llm)
+
+            with self._lock:
+                self.stats["misses"] += 1
+                self._managers[key] = manager
+                self._last_used[key] = time.monotonic()
+                self._vector_memories.setdefault(user_id, manager.vector_memory)
+                self._key_locks.pop(key, None)
+                self._evict(keep=key)
+            self._flush_evicted()
+            return manager
+
+    def _touch(self, key: PoolKey) -> Optional[MemoryManager]:
+        """Đánh dấu key vừa được dùng (gọi khi đang giữ lock)"""
+        manager = self._managers.get(key)
+        if manager is None:
+            return None
+        if self._is_expired(key):
+            self._remove(key)
+            return None
+        self._managers.move_to_end(key)
+        self._last_used[key] = time.monotonic()
+        return manager
+
+    def _is_expired(self, key: PoolKey) -> bool:
+        """Kiểm tra key đã quá TTL chưa"""
+        if self.ttl_seconds <= 0:
+            return False
+        return time.monotonic() - self._last_used[key] > self.ttl_seconds
+
+    def memory_usage_bytes(self) -> int:
+        """Ước lượng tổng RAM của các index đang được tải"""
+        with self._lock:
+            return sum(
+                vector_memory.estimate_memory_bytes()
+                for vector_memory in self._vector_memories.values()
+            )
+
+    def _evict(self, keep: Optional[PoolKey] = None) -> None:
+        """Giải phóng các manager hết hạn rồi theo LRU cho tới khi trong ngân sách"""
+        for key in [key for key in self._managers if self._is_expired(key)]:
+            if key != keep:
+                self._remove(key)
+
+        while len(self._managers) > 1 and (
+            len(self._managers) > self.max_entries
+            or self.memory_usage_bytes() > self.max_memory_bytes
+        ):
+            oldest = next(iter(self._managers))
+            if oldest == keep:
+                break
+            self._remove(oldest)
+
+    def _remove(self, key: PoolKey) -> None:
+        """
+        Bỏ một manager khỏi pool (gọi khi đang giữ lock), manager được flush
+        bởi _flush_evicted() sau khi nhả lock
+        """
+        manager = self._managers.pop(key)
+        self._last_used.pop(key, None)
+        self.stats["evictions"] += 1
+        user_id = key[0]
+        self._evicted.append((key, manager))
+        self._flushing[user_id] = self._flushing.get(user_id, 0) + 1
+
+        # Giải phóng index khi không còn session nào của user trong pool
+        if not any(other[0] == user_id for other in self._managers):
+            self._vector_memories.pop(user_id, None)
+
+    def _flush_evicted(self) -> None:
+        """Flush các manager đã bị bỏ khỏi pool (gọi khi không giữ lock)"""
+        with self._lock:
+            evicted, self._evicted = self._evicted, []
+        for key, manager in evicted:
+            try:
+                manager.flush()
+            except Exception as e:
+                print(f"Lỗi khi flush memory của {key}: {e}")
+            finally:
+                with self._lock:
+                    self._flushing[key[0]] -= 1
+                    if not self._flushing[key[0]]:
+                        del self._flushing[key[0]]
+                    self._flushed.notify_all()
+
+    def evict_expired(self) -> None:
+        """Giải phóng các manager đã quá TTL"""
+        with self._lock:
+            self._evict()
+        self._flush_evicted()
+
+    def invalidate(self, user_id: str, session_id: Optional[str] = None) -> None:
+        """
+        Bỏ các manager của một user khỏi pool
+
+        Args:
+            user_id: ID của người dùng
+            session_id: Chỉ bỏ session này (mặc định bỏ tất cả session của user)
+        """
+        with self._lock:
+            for key in list(self._managers):
+                if key[0] == user_id and session_id in (None, key[1]):
+                    self._remove(key)
+        self._flush_evicted()
+
+    def flush_all(self) -> None:
+        """Flush trạng thái của tất cả manager (ví dụ khi tắt server)"""
+        with self._lock:
+            managers = list(self._managers.values())
+        for manager in managers:
+            manager.flush()
+
+    def keys(self) -> List[PoolKey]:
+        """Danh sách (user_id, session_id) đang được cache, cũ nhất trước"""
+        with self._lock:
+            return list(self._managers)
+
+    def __len__(self) -> int:
+        return len(self._managers)
+
+    def __contains__(self, key: PoolKey) -> bool:
+        return key in self._managers
@@ -2,14 +2,32 @@
 Memory Manager để quản lý và kết hợp tất cả các loại memory
 """
 
-from typing import Any, Dict, List
+import threading
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from langchain.memory import ConversationBufferMemory, ConversationEntityMemory
-from langchain.schema.messages import BaseMessage
-
+from langchain.schema.messages import AIMessage, BaseMessage, HumanMessage
+
+from config import (
+    HISTORY_HOT_MESSAGES,
+    SHARED_MEMORY_ENABLED,
+    STORAGE_BACKEND,
+    SUMMARY_ARCHIVE_RAW,
+    SUMMARY_BLOCK_TURNS,
+    SUMMARY_MAX_SENTENCES,
+    SUMMARY_MODE,
+)
+
+from .conversation_summary import ConversationSummaryStore, extractive_summary
+from .export import export_memory, import_memory
 from .json_chat_history import JSONChatMessageHistory
 from .json_entity_store import JSONEntityStore
-from .vector_memory import VectorStoreMemory
+from .memory_stats import RECENT_LINES, MemoryStatsStore
+from .shared_memory import SharedKnowledgeIndex, get_shared_index
+from .tracing import span, traced
+from .vector_memory import VectorStoreMemory, cut_results, format_memories, merge_results
+from .vector_metadata import JSONVectorMetadataStore
 
 
 class MemoryManager:
@@ -18,33 +36,70 @@ class MemoryManager:
     Kết hợp Entity Memory, Chat History và Vector Memory
     """
 
-    def __init__(self, user_id: str, session_id: str = "default"):
+    def __init__(
+        self,
+        user_id: str,
+        session_id: str = "default",
+        embeddings: Optional[Any] = None,
+        vector_memory: Optional[VectorStoreMemory] = None,
+    ):
         """
         Khởi tạo MemoryManager
 
         Args:
             user_id: ID của người dùng
             session_id: ID của phiên trò chuyện
+            embeddings: Embeddings dùng chung cho vector memory
+            vector_memory: Vector memory đã tải sẵn của user (dùng chung giữa các session)
         """
         self.user_id = user_id
         self.session_id = session_id
+        self._embeddings = embeddings
+        self._shared_vector_memory = vector_memory
+
+        # LLM dùng cho tóm tắt (được gán khi khởi tạo entity memory)
+        self.llm = None
+        self._summary_thread: Optional[threading.Thread] = None
+        self._summary_lock = threading.Lock()
 
         # Khởi tạo các loại memory
         self._initialize_memories()
 
     def _initialize_memories(self) -> None:
         """Khởi tạo tất cả các loại memory"""
-        # 1. Entity Store để lưu thông tin về người dùng
+        # Chọn storage backend theo cấu hình
+        if STORAGE_BACKEND == "sqlite":
+            from .sqlite_store import (
+                SQLiteChatMessageHistory,
+                SQLiteEntityStore,
+                SQLiteVectorMetadataStore,
+                get_database,
+            )
+
+            self.database = get_database()
+            entity_store = SQLiteEntityStore(self.user_id, self.database)
+            chat_history = SQLiteChatMessageHistory(
+                self.user_id, self.session_id, self.database
+            )
+            metadata_store = SQLiteVectorMetadataStore(self.user_id, self.database)
+        else:
+            self.database = None
+            entity_store = JSONEntityStore(self.user_id)
+            chat_history = JSONChatMessageHistory(self.user_id, self.session_id)
+            metadata_store = JSONVectorMetadataStore(self.user_id)
 
-        self.entity_store = JSONEntityStore(self.user_id)
+        # 1. Entity Store để lưu thông tin về người dùng
+        self.entity_store = entity_store
 
         # 2. Chat Message History để lưu lịch sử trò chuyện
-        self.chat_history = JSONChatMessageHistory(self.user_id, self.session_id)
+        self.chat_history = chat_history
 
         # 3. Conversation Buffer Memory với chat history
         self.conversation_memory = ConversationBufferMemory(
             chat_memory=self.chat_history,
             memory_key="chat_history",
+            input_key="input",
+            output_key="output",
             return_messages=True,
         )
 
@@ -54,7 +109,23 @@ class MemoryManager:
         self.entity_memory = None  # Sẽ được khởi tạo khi cần với LLM
 
         # 5. Vector Store Memory để semantic search
-        self.vector_memory = VectorStoreMemory(self.user_id)
+        self.vector_memory = self._shared_vector_memory or VectorStoreMemory(
+            self.user_id, embeddings=self._embeddings, metadata_store=metadata_store
+        )
+
+        # 6. Tầng tóm tắt hội thoại (rolling summary theo block)
+        self.summary_store = ConversationSummaryStore(self.user_id, self.session_id)
+        if SUMMARY_BLOCK_TURNS > 0:
+            # Giới hạn file hot không được chuyển messages chưa tóm tắt sang cold tier
+            self.chat_history.archivable_until = self.summary_store.get_summarized_until
+
+        # 7. Thống kê tổng quan (get_memory_summary), cập nhật dần ở mỗi lần ghi
+        self.stats_store = MemoryStatsStore(self.user_id, self.session_id)
+
+        # 8. Tri thức dùng chung giữa các người dùng (FAQ...), một index cho cả process
+        self.shared_knowledge: Optional[SharedKnowledgeIndex] = (
+            get_shared_index(self.vector_memory.embeddings) if SHARED_MEMORY_ENABLED else None
+        )
 
     def initialize_entity_memory_with_llm(self, llm):
         """
@@ -63,6 +134,7 @@ class MemoryManager:
         Args:
             llm: Language model để sử dụng cho entity extraction
         """
+        self.llm = llm
         self.entity_memory = ConversationEntityMemory(
             entity_store=self.entity_store,
             llm=llm,
@@ -70,6 +142,7 @@ class MemoryManager:
             return_messages=True,
         )
 
+    @traced("memory.add_user_message")
     def add_user_message(self, message: str) -> None:
         """
         Thêm message từ người dùng
@@ -79,12 +152,14 @@ class MemoryManager:
         """
         # Thêm vào chat history
         self.chat_history.add_user_message(message)
+        self._record_messages([HumanMessage(content=message)])
 
         # Thêm vào vector memory
         self.vector_memory.add_memory(
             content=f"Người dùng nói: {message}", memory_type="user_message"
         )
 
+    @traced("memory.add_ai_message")
     def add_ai_message(self, message: str) -> None:
         """
         Thêm message từ AI
@@ -94,12 +169,44 @@ class MemoryManager:
         """
         # Thêm vào chat history
         self.chat_history.add_ai_message(message)
+        self._record_messages([AIMessage(content=message)])
 
         # Thêm vào vector memory
         self.vector_memory.add_memory(
             content=f"AI trả lời: {message}", memory_type="ai_message"
         )
 
+        # Mỗi lượt kết thúc bằng message của AI, kiểm tra block cần tóm tắt
+        self._schedule_summarization()
+
+    def add_cached_exchange(self, user_message: str, ai_message: str) -> None:
+        """
+        Lưu một lượt được trả lời từ cache phản hồi
+
+        Chỉ ghi vào chat history: câu hỏi và câu trả lời giống hệt lượt đã
+        được ghi vào vector memory, nên memory_version giữ nguyên.
+
+        Args:
+            user_message: Tin nhắn của người dùng
+            ai_message: Phản hồi lấy từ cache
+        """
+        with self.transaction():
+            self.chat_history.add_user_message(user_message)
+            self.chat_history.add_ai_message(ai_message)
+        self._record_messages([HumanMessage(content=user_message), AIMessage(content=ai_message)])
+        self._schedule_summarization()
+
+    @property
+    def memory_version(self) -> int:
+        """
+        Version của memory dài hạn, thay đổi sau mỗi lần ghi/xóa
+
+        Mọi thao tác ghi của manager (messages, entity facts, context) đều đi
+        qua vector memory nên dùng version của vector memory.
+        """
+        return self.vector_memory.memory_version
+
+    @traced("memory.add_entity_fact")
     def add_entity_fact(self, entity: str, fact: str) -> None:
         """
         Thêm thông tin về một thực thể
@@ -109,6 +216,7 @@ class MemoryManager:
             fact: Thông tin về thực thể
         """
         self.entity_store.add_fact(entity, fact)
+        self.stats_store.set_entities(self.entity_store.get_all_entities())
 
         # Cũng lưu vào vector memory
         self.vector_memory.add_memory(
@@ -117,6 +225,148 @@ class MemoryManager:
             additional_metadata={"entity": entity},
         )
 
+    def _schedule_summarization(self) -> None:
+        """
+        Chạy tóm tắt ở thread nền nếu đã có đủ một block chưa tóm tắt
+
+        Trong transaction SQLite việc kiểm tra được hoãn tới khi transaction
+        kết thúc, để đếm cả messages của lượt hiện tại (thread nền cũng chỉ
+        đọc được dữ liệu đã commit).
+        """
+        if SUMMARY_BLOCK_TURNS <= 0:
+            return
+        if self.database is not None:
+            self.database.after_transaction(self._start_summarization)
+        else:
+            self._start_summarization()
+
+    def _start_summarization(self) -> None:
+        total = (
+            self.chat_history.get_archived_count()
+            + self.chat_history.get_messages_count()
+        )
+        if total - self.summary_store.get_summarized_until() < 2 * SUMMARY_BLOCK_TURNS:
+            return
+
+        with self._summary_lock:
+            if self._summary_thread is not None and self._summary_thread.is_alive():
+                return
+            self._summary_thread = threading.Thread(
+                target=self._summarize_pending_blocks, daemon=True
+            )
+            self._summary_thread.start()
+
+    def wait_for_summaries(self, timeout: Optional[float] = None) -> None:
+        """
+        Chờ thread tóm tắt nền hoàn tất
+
+        Args:
+            timeout: Thời gian chờ tối đa (giây)
+        """
+        thread = self._summary_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    @staticmethod
+    def _message_lines(messages: List[BaseMessage]) -> List[str]:
+        """Chuyển messages thành các dòng "Người dùng: ..." / "AI: ..." """
+        lines = []
+        for message in messages:
+            if isinstance(message, HumanMessage):
+                lines.append(f"Người dùng: {message.content}")
+            elif isinstance(message, AIMessage):
+                lines.append(f"AI: {message.content}")
+        return lines
+
+    @traced("summary.summarize")
+    def _summarize(self, lines: List[str]) -> str:
+        """
+        Tóm tắt các dòng hội thoại bằng LLM hoặc tóm tắt trích xuất cục bộ
+
+        Args:
+            lines: Các dòng cần tóm tắt
+
+        Returns:
+            Chuỗi tóm tắt
+        """
+        if SUMMARY_MODE == "llm" and self.llm is not None:
+            prompt = (
+                "Tóm tắt ngắn gọn (tối đa "
+                f"{SUMMARY_MAX_SENTENCES} câu) các thông tin quan trọng về người dùng "
+                "và nội dung chính trong đoạn sau:\n\n" + "\n".join(lines)
+            )
+            try:
+                return self.llm.invoke([HumanMessage(content=prompt)]).content.strip()
+            except Exception as e:
+                print(f"Lỗi khi tóm tắt bằng LLM, dùng tóm tắt trích xuất: {e}")
+
+        return extractive_summary(lines, SUMMARY_MAX_SENTENCES)
+
+    def _summarize_pending_blocks(self) -> None:
+        """Tóm tắt tất cả các block đầy đủ chưa tóm tắt rồi lưu trữ messages cũ"""
+        block_size = 2 * SUMMARY_BLOCK_TURNS
+        try:
+            while True:
+                offset = self.chat_history.get_archived_count()
+                start = max(self.summary_store.get_summarized_until(), offset)
+                hot_messages = self.chat_history.messages
+                block = hot_messages[start - offset : start - offset + block_size]
+                if len(block) < block_size:
+                    break
+
+                block_summary = self._summarize(self._message_lines(block))
+                previous = self.summary_store.get_rolling_summary()
+                rolling_summary = (
+                    self._summarize(previous.splitlines() + block_summary.splitlines())
+                    if previous
+                    else block_summary
+                )
+                self.summary_store.add_block(
+                    start, start + block_size, block_summary, rolling_summary
+                )
+                self.stats_store.set_rolling_summary(rolling_summary)
+
+            if SUMMARY_ARCHIVE_RAW:
+                self._archive_summarized_messages()
+        except Exception as e:
+            print(f"Lỗi khi tóm tắt hội thoại: {e}")
+
+    def _archive_summarized_messages(self) -> None:
+        """Chuyển các messages đã tóm tắt sang cold storage, giữ lại phần đuôi"""
+        offset = self.chat_history.get_archived_count()
+        summarized = self.summary_store.get_summarized_until() - offset
+        hot_count = self.chat_history.get_messages_count()
+        count = min(summarized, hot_count - HISTORY_HOT_MESSAGES)
+        if count > 0:
+            self.chat_history.archive_messages(count)
+
+    def transaction(self):
+        """
+        Gom các thao tác ghi của một lượt trò chuyện thành một commit nguyên tử
+        (chỉ có tác dụng với SQLite backend, FAISS index được ghi riêng)
+        """
+        if self.database is None:
+            return nullcontext()
+        return self.database.transaction()
+
+    def flush(self) -> None:
+        """Hoàn tất các tác vụ nền và ghi toàn bộ trạng thái xuống đĩa"""
+        self.wait_for_summaries()
+        self.vector_memory.flush()
+
+    def get_conversation_summary(self) -> str:
+        """
+        Lấy tóm tắt cuộc trò chuyện: rolling summary cộng phần đuôi gần đây
+
+        Returns:
+            Chuỗi tóm tắt cuộc trò chuyện
+        """
+        rolling_summary = self.summary_store.get_rolling_summary()
+        recent = self.chat_history.get_conversation_summary()
+        if not rolling_summary:
+            return recent
+        return f"{rolling_summary}\n\nGần đây:\n{recent}"
+
     def get_conversation_context(self, limit: int = 10) -> List[BaseMessage]:
         """
         Lấy ngữ cảnh cuộc trò chuyện gần đây
@@ -150,18 +400,36 @@ class MemoryManager:
         """
         return self.entity_store.get_all_entities()
 
-    def search_relevant_memories(self, query: str, limit: int = 5) -> str:
+    def search_relevant_memories(
+        self, query: str, limit: int = 5, extra_queries: Sequence[str] = ()
+    ) -> str:
         """
         Tìm kiếm memories liên quan đến query
 
         Args:
             query: Câu hỏi hoặc chủ đề
             limit: Số lượng kết quả tối đa
+            extra_queries: Các query bổ sung (ví dụ câu trả lời gần nhất của AI),
+                được truy xuất cùng lô với query
 
         Returns:
             Chuỗi tóm tắt các memories liên quan
         """
-        return self.vector_memory.get_memory_summary(query)
+        if self.shared_knowledge is None:
+            return self.vector_memory.get_memory_summary(query, extra_queries, k=limit)
+
+        # Gộp memories riêng với tri thức dùng chung theo khoảng cách, dùng lại embedding
+        queries = [query, *extra_queries]
+        batches = self.vector_memory.retrieve_memories_batch(queries, k=limit)
+        try:
+            # Tri thức dùng chung cùng embeddings nên dùng chung ngưỡng cắt
+            cutoff = self.vector_memory.cutoff_params()
+            for vector in self.vector_memory.embed_queries(queries):
+                results = self.shared_knowledge.search(vector, self.user_id, limit)
+                batches.append(cut_results(results, *cutoff))
+        except Exception as e:
+            print(f"Lỗi khi tìm kiếm tri thức dùng chung: {e}")
+        return format_memories(merge_results(batches, limit))
 
     def get_memory_variables_for_chain(self) -> Dict[str, Any]:
         """
@@ -194,41 +462,144 @@ class MemoryManager:
             outputs: Output variables
         """
         # Lưu vào conversation memory
-        self.conversation_memory.save_context(inputs, outputs)
+        with span("conversation_memory.save_context"):
+            self.conversation_memory.save_context(inputs, outputs)
+
+        # ConversationBufferMemory thêm một message người dùng và một message AI; dựng
+        # lại từ inputs/outputs vì trong transaction SQLite chưa đọc được lệnh ghi đang chờ
+        user_input = inputs[self.conversation_memory.input_key]
+        ai_output = outputs[self.conversation_memory.output_key]
+        self._record_messages([HumanMessage(content=user_input), AIMessage(content=ai_output)])
 
         # Lưu vào entity memory (sẽ tự động extract entities) - chỉ nếu đã được khởi tạo
+        # ConversationEntityMemory gọi thêm LLM để trích xuất và tóm tắt entities
         if self.entity_memory is not None:
-            self.entity_memory.save_context(inputs, outputs)
+            with span("entity_memory.save_context"):
+                self.entity_memory.save_context(inputs, outputs)
+            self.stats_store.set_entities(self.entity_store.get_all_entities())
 
         # Lưu vào vector memory
-        self.vector_memory.save_context(inputs, outputs)
+        with span("vector_memory.save_context"):
+            self.vector_memory.save_context(inputs, outputs)
+
+    @staticmethod
+    def _recent_lines(messages: List[BaseMessage]) -> List[str]:
+        """Các dòng hội thoại rút gọn hiển thị trong tóm tắt memory"""
+        lines = []
+        for message in messages:
+            if isinstance(message, HumanMessage):
+                lines.append(f"Người dùng: {message.content[:100]}...")
+            elif isinstance(message, AIMessage):
+                lines.append(f"AI: {message.content[:100]}...")
+        return lines
+
+    def _record_messages(self, messages: List[BaseMessage]) -> None:
+        """Cập nhật thống kê sau khi thêm messages vào chat history"""
+        self.stats_store.record_messages(len(messages), self._recent_lines(messages))
+
+    def refresh_stats(self) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Dựng lại thống kê tổng quan từ dữ liệu gốc (entities, chat history, tóm tắt)
+
+        Returns:
+            (thống kê theo người dùng, thống kê theo session)
+        """
+        entities = self.entity_store.get_all_entities()
+        user_state = {
+            **MemoryStatsStore.empty_user_state(),
+            "total_entities": len(entities),
+            "entities": entities,
+        }
+        session_state = {
+            **MemoryStatsStore.empty_session_state(),
+            "total_messages": self.chat_history.get_archived_count()
+            + self.chat_history.get_messages_count(),
+            "recent": self._recent_lines(self.chat_history.get_recent_messages(RECENT_LINES)),
+            "rolling_summary": self.summary_store.get_rolling_summary(),
+        }
+        self.stats_store.replace(user_state, session_state)
+        return self.stats_store.load() or (user_state, session_state)
 
     def get_memory_summary(self) -> Dict[str, Any]:
         """
         Tạo tóm tắt tổng quan về memory
 
+        Đọc thống kê đã materialize (hai file nhỏ, mỗi file là một snapshot
+        nhất quán) thay vì tải lại entities và lịch sử chat; số vector
+        memories và số memories đang chờ được đọc với chi phí O(1) (hàng đợi
+        chỉ được đếm lại khi bị process khác thay đổi).
+
         Returns:
             Dictionary chứa thông tin tóm tắt
         """
+        stats = self.stats_store.load() or self.refresh_stats()
+        user_state, session_state = stats
+
+        recent = "\n".join(session_state["recent"]) or "Chưa có cuộc trò chuyện nào."
+        rolling_summary = session_state["rolling_summary"]
         return {
             "user_id": self.user_id,
             "session_id": self.session_id,
-            "total_messages": self.chat_history.get_messages_count(),
-            "total_entities": len(self.entity_store.get_all_entities()),
+            "total_messages": session_state["total_messages"],
+            "total_entities": user_state["total_entities"],
             "total_vector_memories": self.vector_memory.get_memories_count(),
-            "conversation_summary": self.chat_history.get_conversation_summary(),
-            "entities": self.entity_store.get_all_entities(),
+            "pending_vector_memories": self.vector_memory.pending_writes.count(),
+            "conversation_summary": (
+                f"{rolling_summary}\n\nGần đây:\n{recent}" if rolling_summary else recent
+            ),
+            "entities": user_state["entities"],
+            "stats_updated_at": max(
+                user_state["updated_at"] or "", session_state["updated_at"] or ""
+            ),
         }
 
     def clear_session_memory(self) -> None:
         """Xóa memory của session hiện tại (giữ lại entities và vector memories)"""
+        self.wait_for_summaries()
         self.chat_history.clear()
+        self.summary_store.clear()
+        self.stats_store.replace(session_state=MemoryStatsStore.empty_session_state())
 
     def clear_all_memory(self) -> None:
         """Xóa tất cả memory của user"""
+        self.wait_for_summaries()
         self.chat_history.clear()
+        self.summary_store.clear()
         self.entity_store.clear()
         self.vector_memory.clear_memories()
+        self.stats_store.replace(
+            MemoryStatsStore.empty_user_state(), MemoryStatsStore.empty_session_state()
+        )
+        if self.shared_knowledge is not None:
+            self.shared_knowledge.delete_owner(self.user_id)
+
+    def export_memory(self, path: str, compress: bool = True) -> Dict[str, int]:
+        """
+        Ghi toàn bộ memory của user (lịch sử chat của session hiện tại,
+        entities, vector memories kèm vector) ra một archive (xem memory/export.py)
+
+        Args:
+            path: Đường dẫn file archive
+            compress: Nén archive bằng zstd
+
+        Returns:
+            Số bản ghi đã ghi theo từng loại
+        """
+        return export_memory(self, path, compress)
+
+    def import_memory(self, path: str) -> Dict[str, int]:
+        """
+        Thay toàn bộ memory của user bằng nội dung một archive (không embed lại)
+
+        Args:
+            path: Đường dẫn file archive
+
+        Returns:
+            Số bản ghi đã nạp theo từng loại
+        """
+        counts = import_memory(self, path)
+        self.refresh_stats()
+        return counts
 
     def search_chat_history(self, query: str, limit: int = 5) -> List[BaseMessage]:
         """
@@ -243,6 +614,7 @@ class MemoryManager:
         """
         return self.chat_history.search_messages(query, limit)
 
+    @traced("memory.get_context")
     def get_comprehensive_context(
         self, current_input: str, context_limit: int = 5
     ) -> Dict[str, Any]:
@@ -256,23 +628,32 @@ class MemoryManager:
         Returns:
             Dictionary chứa tất cả ngữ cảnh liên quan
         """
+        recent_messages = self.get_conversation_context(context_limit)
+        # Câu trả lời gần nhất của AI giúp tìm đúng memories cho câu hỏi nối tiếp
+        # ("nói thêm về cái đó"), được truy xuất cùng lô với câu hỏi hiện tại
+        last_ai_message = next(
+            (msg.content for msg in reversed(recent_messages) if isinstance(msg, AIMessage)),
+            None,
+        )
+
         context = {
             # Lịch sử trò chuyện gần đây
             "recent_conversation": [
                 {
-                    "role": "human"
-                    if isinstance(msg, type(self.chat_history.messages[0]))
-                    and "Human" in str(type(msg))
-                    else "ai",
+                    "role": "human" if isinstance(msg, HumanMessage) else "ai",
                     "content": msg.content,
                 }
-                for msg in self.get_conversation_context(context_limit)
+                for msg in recent_messages
             ],
+            # Rolling summary của các phần hội thoại cũ
+            "conversation_summary": self.summary_store.get_rolling_summary(),
             # Thông tin thực thể liên quan
             "relevant_entities": self.get_all_entities(),
             # Memories liên quan từ vector search
             "relevant_memories": self.search_relevant_memories(
-                current_input, context_limit
+                current_input,
+                context_limit,
+                extra_queries=[last_ai_message] if last_ai_message else (),
             ),
             # Tóm tắt memory tổng quan
             "memory_summary": self.get_memory_summary(),
@@ -0,0 +1,138 @@
+"""
+Thống kê tổng quan về memory, được cập nhật dần ở mỗi lần ghi
+
+Thay vì tải lại toàn bộ entities và lịch sử chat mỗi lần cần tóm tắt, thống
+kê được materialize thành hai file JSON nhỏ, mỗi file là một snapshot nhất
+quán (ghi nguyên tử dưới file_lock) và được đọc với chi phí O(1):
+
+- Theo người dùng (`users/{user_id}.json`): entities và số entities
+- Theo session (`sessions/{user_id}/{session_id}.json`): số messages, các
+  dòng hội thoại gần đây và rolling summary
+
+Hai loại file nằm ở hai thư mục riêng nên user "a_b" không trùng file với
+session "b" của user "a".
+
+Khi file chưa tồn tại (người dùng mới hoặc dữ liệu từ phiên bản cũ), các lần
+cập nhật dần được bỏ qua và MemoryManager dựng lại thống kê từ dữ liệu gốc ở
+lần đọc đầu tiên.
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import STATS_DIR
+
+from .storage import atomic_write_json, file_lock, read_json
+
+# Số dòng hội thoại gần đây được giữ trong thống kê của session
+RECENT_LINES = 10
+
+
+class MemoryStatsStore:
+    """
+    Thống kê tổng quan của một user_id/session_id
+    """
+
+    def __init__(self, user_id: str, session_id: str = "default"):
+        """
+        Khởi tạo MemoryStatsStore
+
+        Args:
+            user_id: ID của người dùng
+            session_id: ID của phiên trò chuyện
+        """
+        self.user_id = user_id
+        self.session_id = session_id
+        self.user_path = STATS_DIR / "users" / f"{user_id}.json"
+        self.session_path = STATS_DIR / "sessions" / user_id / f"{session_id}.json"
+
+    @staticmethod
+    def empty_user_state() -> Dict[str, Any]:
+        """Thống kê rỗng theo người dùng"""
+        return {"total_entities": 0, "entities": {}, "version": 0, "updated_at": None}
+
+    @staticmethod
+    def empty_session_state() -> Dict[str, Any]:
+        """Thống kê rỗng theo session"""
+        return {
+            "total_messages": 0,
+            "recent": [],
+            "rolling_summary": "",
+            "version": 0,
+            "updated_at": None,
+        }
+
+    def load(self) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Đọc thống kê (không cần khóa)
+
+        Returns:
+            (thống kê theo người dùng, thống kê theo session), None nếu chưa có
+        """
+        user_state = read_json(self.user_path, None)
+        session_state = read_json(self.session_path, None)
+        if user_state is None or session_state is None:
+            return None
+        return user_state, session_state
+
+    @staticmethod
+    def _write(path: Path, state: Dict[str, Any]) -> None:
+        """Ghi thống kê kèm version mới (cần giữ file_lock)"""
+        state["version"] = state.get("version", 0) + 1
+        state["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        atomic_write_json(path, state, indent=None)
+
+    def _update(self, path: Path, apply: Callable[[Dict[str, Any]], None]) -> None:
+        """Cập nhật dần một file thống kê (bỏ qua nếu file chưa được dựng)"""
+        with file_lock(path):
+            state = read_json(path, None)
+            if state is None:
+                return
+            apply(state)
+            self._write(path, state)
+
+    def record_messages(self, count: int, lines: List[str]) -> None:
+        """
+        Ghi nhận messages mới của session
+
+        Args:
+            count: Số messages đã thêm
+            lines: Các dòng hiển thị của messages ("Người dùng: ..." / "AI: ...")
+        """
+
+        def apply(state: Dict[str, Any]) -> None:
+            state["total_messages"] += count
+            state["recent"] = (state["recent"] + lines)[-RECENT_LINES:]
+
+        self._update(self.session_path, apply)
+
+    def set_rolling_summary(self, rolling_summary: str) -> None:
+        """Ghi nhận rolling summary mới của session"""
+        self._update(self.session_path, lambda state: state.update(rolling_summary=rolling_summary))
+
+    def set_entities(self, entities: Dict[str, List[str]]) -> None:
+        """Ghi nhận toàn bộ entities sau một lần ghi entity"""
+        self._update(
+            self.user_path,
+            lambda state: state.update(entities=entities, total_entities=len(entities)),
+        )
+
+    def replace(
+        self,
+        user_state: Optional[Dict[str, Any]] = None,
+        session_state: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Thay thống kê bằng giá trị dựng lại từ dữ liệu gốc
+
+        Args:
+            user_state: Thống kê theo người dùng (None = giữ nguyên)
+            session_state: Thống kê theo session (None = giữ nguyên)
+        """
+        for path, state in ((self.user_path, user_state), (self.session_path, session_state)):
+            if state is None:
+                continue
+            with file_lock(path):
+                previous = read_json(path, {})
+                self._write(path, {**state, "version": previous.get("version", 0)})
@@ -0,0 +1,109 @@
+"""
+Hàng đợi các memories chưa embed được (embeddings chính tạm thời không dùng được)
+"""
+
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import VECTOR_STORE_DIR
+
+from .storage import atomic_write_text, file_lock
+
+
+class PendingWriteQueue:
+    """
+    Hàng đợi ghi của vector memory, mỗi user_id có một file JSON lines riêng
+
+    Khi embeddings chính lỗi hoặc index được tạo bởi embeddings khác,
+    memory được xếp hàng ở đây thay vì embed bằng model khác (trộn không
+    gian vector). Hàng đợi được xử lý lại khi embeddings dùng được trở lại.
+    """
+
+    def __init__(self, user_id: str):
+        """
+        Khởi tạo PendingWriteQueue
+
+        Args:
+            user_id: ID của người dùng
+        """
+        self.user_id = user_id
+        self.file_path = VECTOR_STORE_DIR / f"{user_id}_pending.jsonl"
+        # Số memories đã đếm kèm (size, mtime_ns) của file lúc đếm; file đổi thì đếm lại
+        self._counted: Optional[Tuple[int, int, int]] = None
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        """(size, mtime_ns) của file hàng đợi, None nếu chưa có"""
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def append(self, content: str, metadata: Dict[str, Any]) -> None:
+        """
+        Thêm một memory vào hàng đợi
+
+        Args:
+            content: Nội dung memory
+            metadata: Metadata của memory
+        """
+        line = json.dumps({"content": content, "metadata": metadata}, ensure_ascii=False)
+        with file_lock(self.file_path):
+            before = self._stat()
+            with open(self.file_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            # Cập nhật số đếm nếu file không bị process khác đổi kể từ lần đếm trước
+            counted = self._counted
+            if before is None or before[0] == 0:
+                self._counted = (*self._stat(), 1)
+            elif counted is not None and counted[:2] == before:
+                self._counted = (*self._stat(), counted[2] + 1)
+
+    def _load(self) -> List[Dict[str, Any]]:
+        """Đọc toàn bộ hàng đợi"""
+        try:
+            with open(self.file_path, "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def items(self) -> List[Dict[str, Any]]:
+        """Các memories đang chờ ({"content", "metadata"})"""
+        return self._load()
+
+    def count(self) -> int:
+        """Số memories đang chờ (chỉ đếm lại khi file bị process khác thay đổi)"""
+        stat = self._stat()
+        if stat is None or stat[0] == 0:
+            return 0
+        counted = self._counted
+        if counted is not None and counted[:2] == stat:
+            return counted[2]
+        with open(self.file_path, "r", encoding="utf-8") as f:
+            count = sum(1 for line in f if line.strip())
+        self._counted = (*stat, count)
+        return count
+
+    def drain(self, handler: Callable[[List[Dict[str, Any]]], None]) -> int:
+        """
+        Xử lý toàn bộ hàng đợi, chỉ xóa khi handler chạy thành công
+
+        Args:
+            handler: Hàm nhận danh sách {"content", "metadata"} để ghi vào index
+
+        Returns:
+            Số memories đã xử lý
+        """
+        with file_lock(self.file_path):
+            items = self._load()
+            if not items:
+                return 0
+            handler(items)
+            atomic_write_text(self.file_path, "")
+        return len(items)
+
+    def clear(self) -> None:
+        """Xóa hàng đợi"""
+        with file_lock(self.file_path):
+            self.file_path.unlink(missing_ok=True)
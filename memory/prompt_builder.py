@@ -0,0 +1,236 @@
+"""
+Prompt Builder để lắp ráp prompt trong giới hạn token
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Mỗi từ hoặc dấu câu được coi là một đơn vị khi ước lượng token
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+# Số ký tự trung bình của một token với các từ dài
+_CHARS_PER_TOKEN = 4
+
+
+def _piece_tokens(piece: str) -> int:
+    """Số token ước lượng cho một từ hoặc dấu câu"""
+    return max(1, -(-len(piece) // _CHARS_PER_TOKEN))
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Ước lượng nhanh số token của một đoạn text (không gọi API)
+
+    Args:
+        text: Đoạn text cần ước lượng
+
+    Returns:
+        Số token ước lượng
+    """
+    if not text:
+        return 0
+    return sum(_piece_tokens(piece) for piece in _TOKEN_PATTERN.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = "...") -> str:
+    """
+    Cắt text sao cho số token ước lượng không vượt quá max_tokens
+
+    Args:
+        text: Đoạn text cần cắt
+        max_tokens: Số token tối đa (đã bao gồm suffix)
+        suffix: Chuỗi thêm vào cuối khi text bị cắt
+
+    Returns:
+        Text đã được cắt (hoặc nguyên bản nếu đã vừa)
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    allowance = max_tokens - estimate_tokens(suffix)
+    if allowance <= 0:
+        return ""
+
+    used = 0
+    end = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        cost = _piece_tokens(match.group())
+        if used + cost > allowance:
+            break
+        used += cost
+        end = match.end()
+
+    return text[:end].rstrip() + suffix if end else ""
+
+
+@dataclass
+class PromptSection:
+    """
+    Một phần của prompt (entities, memories, lịch sử gần đây...)
+
+    Attributes:
+        name: Tên section, dùng để tra quota và priority
+        header: Dòng tiêu đề của section
+        lines: Các dòng nội dung theo thứ tự hiển thị
+        keep: "head" giữ các dòng đầu, "tail" giữ các dòng cuối khi cắt
+    """
+
+    name: str
+    header: str
+    lines: List[str] = field(default_factory=list)
+    keep: str = "head"
+
+
+@dataclass
+class PromptResult:
+    """Kết quả lắp ráp prompt"""
+
+    text: str
+    total_tokens: int
+    token_budget: int
+    section_tokens: Dict[str, int] = field(default_factory=dict)
+    truncated_sections: List[str] = field(default_factory=list)
+    dropped_sections: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, object]:
+        """Chuyển kết quả (trừ text) thành dictionary để báo cáo"""
+        return {
+            "total_tokens": self.total_tokens,
+            "token_budget": self.token_budget,
+            "section_tokens": dict(self.section_tokens),
+            "truncated_sections": list(self.truncated_sections),
+            "dropped_sections": list(self.dropped_sections),
+        }
+
+
+class PromptBuilder:
+    """
+    Lắp ráp prompt trong một ngân sách token cố định
+
+    System prompt và câu hỏi hiện tại luôn được giữ lại. Các section còn lại
+    được cắt theo quota riêng, sau đó được cấp phát phần ngân sách còn lại
+    theo thứ tự priority (số nhỏ được ưu tiên trước). Section không đủ chỗ
+    cho tiêu đề và ít nhất một dòng sẽ bị bỏ. Cùng input luôn cho cùng output.
+    """
+
+    def __init__(
+        self,
+        token_budget: int,
+        section_quotas: Optional[Dict[str, int]] = None,
+        section_priorities: Optional[Dict[str, int]] = None,
+    ):
+        """
+        Khởi tạo PromptBuilder
+
+        Args:
+            token_budget: Tổng số token tối đa của prompt
+            section_quotas: Số token tối đa cho từng section
+            section_priorities: Độ ưu tiên của từng section (nhỏ hơn = quan trọng hơn)
+        """
+        self.token_budget = token_budget
+        self.section_quotas = dict(section_quotas or {})
+        self.section_priorities = dict(section_priorities or {})
+
+    def _fit_lines(self, section: PromptSection, max_tokens: int) -> List[str]:
+        """
+        Chọn các dòng của section vừa với max_tokens (đã bao gồm tiêu đề)
+
+        Args:
+            section: Section cần cắt
+            max_tokens: Số token tối đa cho section
+
+        Returns:
+            Danh sách dòng được giữ lại (rỗng nếu không đủ chỗ)
+        """
+        remaining = max_tokens - estimate_tokens(section.header)
+        if remaining <= 0:
+            return []
+
+        ordered = section.lines if section.keep == "head" else section.lines[::-1]
+        kept = []
+        for line in ordered:
+            cost = estimate_tokens(line)
+            if cost <= remaining:
+                kept.append(line)
+                remaining -= cost
+                continue
+            # Dòng đầu tiên quá dài thì cắt bớt thay vì bỏ cả section
+            if not kept:
+                shortened = truncate_to_tokens(line, remaining)
+                if shortened:
+                    kept.append(shortened)
+            break
+
+        return kept if section.keep == "head" else kept[::-1]
+
+    def build(
+        self,
+        system_prompt: str,
+        sections: List[PromptSection],
+        question: str,
+        footer: str = "",
+    ) -> PromptResult:
+        """
+        Lắp ráp prompt hoàn chỉnh
+
+        Args:
+            system_prompt: System prompt (luôn giữ lại)
+            sections: Các section theo thứ tự hiển thị
+            question: Phần câu hỏi hiện tại (luôn giữ lại)
+            footer: Dòng hướng dẫn cuối prompt (luôn giữ lại)
+
+        Returns:
+            PromptResult chứa prompt và thống kê token
+        """
+        fixed_parts = [part for part in (system_prompt, question, footer) if part]
+        used = sum(estimate_tokens(part) for part in fixed_parts)
+        remaining = max(self.token_budget - used, 0)
+
+        section_tokens = {}
+        truncated = []
+        dropped = []
+        chosen = {}
+
+        order = sorted(
+            range(len(sections)),
+            key=lambda i: (self.section_priorities.get(sections[i].name, 100), i),
+        )
+        for i in order:
+            section = sections[i]
+            if not section.lines:
+                continue
+
+            quota = self.section_quotas.get(section.name, self.token_budget)
+            lines = self._fit_lines(section, min(quota, remaining))
+            if not lines:
+                dropped.append(section.name)
+                continue
+
+            if lines != section.lines:
+                truncated.append(section.name)
+
+            cost = estimate_tokens(section.header) + sum(
+                estimate_tokens(line) for line in lines
+            )
+            remaining -= cost
+            section_tokens[section.name] = cost
+            chosen[i] = [section.header] + lines
+
+        prompt_parts = [system_prompt]
+        for i in range(len(sections)):
+            if i in chosen:
+                prompt_parts.extend(chosen[i])
+        prompt_parts.append(question)
+        if footer:
+            prompt_parts.append(footer)
+
+        text = "\n".join(prompt_parts)
+        return PromptResult(
+            text=text,
+            total_tokens=estimate_tokens(text),
+            token_budget=self.token_budget,
+            section_tokens=section_tokens,
+            truncated_sections=truncated,
+            dropped_sections=dropped,
+        )
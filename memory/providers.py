@@ -0,0 +1,163 @@
+"""
+Các provider LLM và embeddings, chọn theo LLM_PROVIDER / EMBEDDING_PROVIDER
+
+Ngoài Gemini và Google embeddings còn có các provider chạy offline, tất định:
+HashingEmbeddings (feature hashing, không cần model) và StubChatModel (trả lời
+mẫu sau một độ trễ cấu hình được) để load test không cần mạng.
+"""
+
+import hashlib
+import re
+import time
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from config import (
+    EMBEDDING_PROVIDER,
+    GOOGLE_API_KEY,
+    HASHING_EMBEDDING_DIMENSION,
+    LLM_PROVIDER,
+    MODEL_NAME,
+    STUB_LLM_LATENCY_MS,
+    TEMPERATURE,
+)
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Embeddings băm (feature hashing) các từ và bigram vào vector cố định
+
+    Tất định (không phụ thuộc PYTHONHASHSEED), không cần mạng hay model, và
+    văn bản có nhiều từ chung cho vector gần nhau nên tìm kiếm vẫn có nghĩa.
+    """
+
+    def __init__(self, dimension: int = HASHING_EMBEDDING_DIMENSION):
+        """
+        Khởi tạo HashingEmbeddings
+
+        Args:
+            dimension: Số chiều vector
+        """
+        self.dimension = dimension
+        self.embedder_id = f"hashing:{dimension}"
+
+    def _embed(self, text: str) -> List[float]:
+        words = [w.lower() for w in _TOKEN.findall(text)]
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimension] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed list of documents"""
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed single query"""
+        return self._embed(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed many queries at once"""
+        return self.embed_documents(texts)
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Chat model trả lời bằng câu mẫu sau một độ trễ giả lập
+
+    Là BaseChatModel thật nên dùng được ở mọi nơi cần LLM (ConversationEntityMemory,
+    tóm tắt bằng LLM), nhưng không gọi mạng.
+    """
+
+    latency: float = 0.0  # Độ trễ giả lập mỗi lời gọi (giây)
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        prompt = str(messages[-1].content) if messages else ""
+        question = prompt.rsplit("Người dùng:", 1)[-1].strip().splitlines()[0:1]
+        content = "Cảm ơn bạn đã chia sẻ"
+        if question:
+            content += f' về "{question[0][:60]}"'
+        return content + ". Mình sẽ ghi nhớ điều này để hỗ trợ bạn tốt hơn."
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        content = self._reply(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        # Độ trễ giả lập là thời gian tới phần đầu tiên, sau đó trả từng từ
+        if self.latency:
+            time.sleep(self.latency)
+        for word in re.findall(r"\S+\s*", self._reply(messages)):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+
+def create_llm(provider: str = LLM_PROVIDER) -> Any:
+    """
+    Tạo LLM theo provider
+
+    Args:
+        provider: "gemini" hoặc "stub"
+    """
+    if provider == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        return ChatGoogleGenerativeAI(
+            model=MODEL_NAME,
+            google_api_key=GOOGLE_API_KEY,
+            temperature=TEMPERATURE,
+            convert_system_message_to_human=True,
+        )
+    if provider == "stub":
+        return StubChatModel(latency=STUB_LLM_LATENCY_MS / 1000)
+    raise ValueError(f"LLM provider không hợp lệ: {provider}")
+
+
+def create_embeddings(provider: str = EMBEDDING_PROVIDER) -> Embeddings:
+    """
+    Tạo embeddings theo provider
+
+    Args:
+        provider: "google", "sentence-transformers" hoặc "hashing"
+    """
+    if provider == "google":
+        from .safe_embeddings import SafeGoogleGenerativeAIEmbeddings
+
+        return SafeGoogleGenerativeAIEmbeddings(
+            model="models/embedding-001", google_api_key=GOOGLE_API_KEY
+        )
+    if provider == "sentence-transformers":
+        from .fallback_embeddings import StreamlitSafeEmbeddings
+
+        return StreamlitSafeEmbeddings()
+    if provider == "hashing":
+        return HashingEmbeddings()
+    raise ValueError(f"Embedding provider không hợp lệ: {provider}")
@@ -0,0 +1,209 @@
+"""
+FAISS vector store lưu vector dạng lượng tử hóa (scalar quantization)
+
+Mỗi vector float32 tốn 4 bytes/chiều trong RAM và trên đĩa. Với
+VECTOR_INDEX_TYPE:
+
+- "flat": IndexFlatL2 như trước (chính xác, 4 bytes/chiều)
+- "fp16": IndexScalarQuantizer QT_fp16 (2 bytes/chiều, sai số rất nhỏ nên
+  không cần xếp hạng lại)
+- "int8": IndexScalarQuantizer QT_8bit_uniform (1 byte/chiều); index lấy
+  k × VECTOR_RERANK_FACTOR ứng viên rồi xếp hạng lại bằng khoảng cách tính
+  trên bản fp16 của vector, lưu cạnh index (rerank.npy) và được mmap nên
+  chỉ các hàng ứng viên được đọc vào RAM
+
+Loại index được quyết định khi index được tạo; index cũ (flat) vẫn tải và
+dùng bình thường, đổi loại bằng reindex.py.
+"""
+
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+
+from config import VECTOR_INDEX_TYPE, VECTOR_RERANK_FACTOR
+
+INDEX_TYPES = ("flat", "fp16", "int8")
+RERANK_FILE = "rerank.npy"
+
+# Khoảng giá trị của int8 được nới thêm 20% mỗi phía để vector mới hiếm khi
+# nằm ngoài khoảng đã train (khi đó index được train và mã hóa lại)
+_RANGE_MARGIN = 0.2
+
+
+def create_index(dimension: int, index_type: str = VECTOR_INDEX_TYPE) -> Any:
+    """
+    Tạo FAISS index rỗng theo loại lưu trữ
+
+    Args:
+        dimension: Số chiều vector
+        index_type: "flat", "fp16" hoặc "int8"
+    """
+    faiss = dependable_faiss_import()
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dimension)
+    if index_type == "fp16":
+        return faiss.IndexScalarQuantizer(
+            dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2
+        )
+    if index_type == "int8":
+        index = faiss.IndexScalarQuantizer(
+            dimension, faiss.ScalarQuantizer.QT_8bit_uniform, faiss.METRIC_L2
+        )
+        index.sq.rangestat = faiss.ScalarQuantizer.RS_minmax
+        index.sq.rangestat_arg = _RANGE_MARGIN
+        return index
+    raise ValueError(f"Loại index không hợp lệ: {index_type}")
+
+
+def index_type_of(index: Any) -> str:
+    """Loại lưu trữ của một FAISS index ("flat", "fp16" hoặc "int8")"""
+    faiss = dependable_faiss_import()
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16:
+            return "fp16"
+        return "int8"
+    return "flat"
+
+
+class QuantizedFAISS(FAISS):
+    """
+    FAISS vector store có thể dùng index lượng tử hóa và xếp hạng lại
+
+    Giữ nguyên API của LangChain FAISS (add_embeddings, delete, save_local,
+    load_local) nên compaction, reindex và clear không cần biết loại index.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        # Bản fp16 của các vector theo đúng thứ tự trong index (chỉ với int8)
+        self.rerank_vectors: Optional[np.ndarray] = None
+        if self.index_type == "int8":
+            self.rerank_vectors = np.empty((0, self.index.d), dtype=np.float16)
+
+    @property
+    def index_type(self) -> str:
+        return index_type_of(self.index)
+
+    def _prepare_int8(self, vectors: np.ndarray) -> None:
+        """
+        Train index int8 (lần đầu, hoặc khi vector mới vượt khoảng đã train)
+        rồi mã hóa lại các vector hiện có từ bản fp16
+        """
+        if self.index.is_trained:
+            faiss = dependable_faiss_import()
+            vmin, vdiff = faiss.vector_to_array(self.index.sq.trained)[:2]
+            if vectors.min() >= vmin and vectors.max() <= vmin + vdiff:
+                return
+
+        existing = np.asarray(self.rerank_vectors, dtype=np.float32)
+        index = create_index(self.index.d, "int8")
+        index.train(np.vstack([existing, vectors]))
+        if len(existing):
+            index.add(existing)
+        self.index = index
+
+    def add_embeddings(
+        self,
+        text_embeddings: Iterable[Tuple[str, List[float]]],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        text_embeddings = list(text_embeddings)
+        if self.rerank_vectors is None:
+            return super().add_embeddings(text_embeddings, metadatas, ids, **kwargs)
+
+        vectors = np.array([vector for _, vector in text_embeddings], dtype=np.float32)
+        if self._normalize_L2:
+            dependable_faiss_import().normalize_L2(vectors)
+        self._prepare_int8(vectors)
+        result = super().add_embeddings(text_embeddings, metadatas, ids, **kwargs)
+        self.rerank_vectors = np.concatenate(
+            [self.rerank_vectors, vectors.astype(np.float16)]
+        )
+        return result
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        positions = []
+        if self.rerank_vectors is not None and ids:
+            removed = set(ids)
+            positions = [
+                position
+                for position, doc_id in self.index_to_docstore_id.items()
+                if doc_id in removed
+            ]
+        result = super().delete(ids, **kwargs)
+        if positions:
+            self.rerank_vectors = np.delete(self.rerank_vectors, positions, axis=0)
+        return result
+
+    def search_vectors(
+        self, queries: np.ndarray, k: int, rerank_factor: int = VECTOR_RERANK_FACTOR
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Tìm k vector gần nhất cho ma trận query (n, d), như index.search
+
+        Với index int8, lấy k × rerank_factor ứng viên rồi xếp hạng lại theo
+        khoảng cách L2 tính trên bản fp16.
+
+        Args:
+            queries: Ma trận query float32 (n, d)
+            k: Số kết quả mỗi query
+            rerank_factor: Hệ số ứng viên được xếp hạng lại (<= 1 = không xếp hạng lại)
+
+        Returns:
+            (khoảng cách, vị trí), mỗi mảng có shape (n, k), vị trí -1 là trống
+        """
+        if self.rerank_vectors is None or rerank_factor <= 1:
+            return self.index.search(queries, k)
+
+        fetch_k = min(self.index.ntotal, k * rerank_factor)
+        _, candidates = self.index.search(queries, fetch_k)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        positions = np.full((len(queries), k), -1, dtype=np.int64)
+        for row, (query, row_candidates) in enumerate(zip(queries, candidates)):
+            row_candidates = row_candidates[row_candidates != -1]
+            # mmap: chỉ đọc các hàng ứng viên
+            exact = np.asarray(self.rerank_vectors[row_candidates], dtype=np.float32)
+            row_distances = ((exact - query) ** 2).sum(axis=1)
+            order = np.argsort(row_distances, kind="stable")[:k]
+            distances[row, : len(order)] = row_distances[order]
+            positions[row, : len(order)] = row_candidates[order]
+        return distances, positions
+
+    def memory_bytes(self) -> int:
+        """Số bytes vector được giữ trong RAM (không tính phần mmap của rerank)"""
+        index = self.index
+        if hasattr(index, "code_size"):
+            size = index.ntotal * index.code_size
+        else:
+            size = index.ntotal * index.d * 4
+        if isinstance(self.rerank_vectors, np.ndarray) and not isinstance(
+            self.rerank_vectors, np.memmap
+        ):
+            size += self.rerank_vectors.nbytes
+        return size
+
+    def save_local(self, folder_path: str, index_name: str = "index") -> None:
+        super().save_local(folder_path, index_name)
+        if self.rerank_vectors is not None:
+            path = Path(folder_path) / RERANK_FILE
+            np.save(path, np.ascontiguousarray(self.rerank_vectors))
+            # Dùng bản trên đĩa thay cho mảng trong RAM
+            self.rerank_vectors = np.load(path, mmap_mode="r")
+
+    @classmethod
+    def load_local(
+        cls, folder_path: str, embeddings: Any, index_name: str = "index", **kwargs: Any
+    ) -> "QuantizedFAISS":
+        store = super().load_local(folder_path, embeddings, index_name, **kwargs)
+        path = Path(folder_path) / RERANK_FILE
+        if store.rerank_vectors is not None and path.exists():
+            store.rerank_vectors = np.load(path, mmap_mode="r")
+        elif store.rerank_vectors is not None and store.index.ntotal:
+            # Thiếu bản fp16: xếp hạng bằng chính index int8
+            store.rerank_vectors = None
+        return store
@@ -4,19 +4,44 @@ Safe wrapper cho GoogleGenerativeAIEmbeddings để tránh event loop issues
 
 import asyncio
 import threading
-from typing import List
+from typing import Any, List
 
 from langchain.embeddings.base import Embeddings
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
+from config import VECTOR_DIMENSION
+
+from .circuit_breaker import CircuitBreaker
 from .fallback_embeddings import StreamlitSafeEmbeddings
 
 
+class EmbeddingsUnavailableError(RuntimeError):
+    """Embeddings tạm thời không dùng được (lỗi hoặc circuit breaker đang mở)"""
+
+
+def get_embedder_id(embeddings: Any) -> str:
+    """
+    ID của embeddings, được ghi kèm mỗi index để không trộn các không gian vector
+
+    Args:
+        embeddings: Đối tượng embeddings bất kỳ
+
+    Returns:
+        Chuỗi dạng "<provider>:<model>"
+    """
+    embedder_id = getattr(embeddings, "embedder_id", None)
+    if embedder_id:
+        return embedder_id
+    model = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", "")
+    return f"{type(embeddings).__name__}:{model}"
+
+
 class SafeGoogleGenerativeAIEmbeddings(Embeddings):
     """
     Wrapper an toàn cho GoogleGenerativeAIEmbeddings
     Tự động xử lý event loop issues trong môi trường Streamlit
-    Có fallback sang sentence-transformers nếu Google API fails
+    Chỉ dùng sentence-transformers khi không khởi tạo được Google embeddings;
+    lỗi khi gọi API đi qua circuit breaker và được báo bằng
+    EmbeddingsUnavailableError thay vì âm thầm đổi sang model khác
     Kế thừa từ LangChain Embeddings để tương thích
     """
 
@@ -28,6 +53,23 @@ class SafeGoogleGenerativeAIEmbeddings(Embeddings):
         self._fallback_embeddings = None
         self._lock = threading.Lock()
         self._use_fallback = False
+        self.breaker = CircuitBreaker()
+
+    @property
+    def dimension(self) -> int:
+        """Số chiều vector của embeddings đang được sử dụng"""
+        self._get_embeddings()
+        if self._use_fallback:
+            return StreamlitSafeEmbeddings.dimension
+        return VECTOR_DIMENSION
+
+    @property
+    def embedder_id(self) -> str:
+        """ID của embeddings đang được sử dụng"""
+        embeddings = self._get_embeddings()
+        if self._use_fallback:
+            return embeddings.embedder_id
+        return f"google:{self.model}"
 
     def _get_embeddings(self):
         """Lazy initialization của embeddings"""
@@ -35,6 +77,9 @@ class SafeGoogleGenerativeAIEmbeddings(Embeddings):
             with self._lock:
                 if self._embeddings is None and not self._use_fallback:
                     try:
+                        # Import khi dùng lần đầu: langchain_google_genai nạp cả Google API client
+                        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
                         self._embeddings = GoogleGenerativeAIEmbeddings(
                             model=self.model, google_api_key=self.google_api_key
                         )
@@ -77,42 +122,43 @@ class SafeGoogleGenerativeAIEmbeddings(Embeddings):
 
         return result["value"]
 
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """Embed list of documents"""
-        try:
-            embeddings = self._get_embeddings()
+    def _call(self, method: str, *args, **kwargs):
+        """Gọi embeddings qua circuit breaker"""
+        embeddings = self._get_embeddings()
 
-            if self._use_fallback:
-                # Sử dụng fallback embeddings
-                return embeddings.embed_documents(texts)
-            else:
-                # Sử dụng Google embeddings với thread safety
-                return self._run_in_thread(embeddings.embed_documents, texts)
+        if self._use_fallback:
+            # Google embeddings không khởi tạo được: sentence-transformers là
+            # embeddings duy nhất của instance này nên không trộn không gian vector
+            try:
+                return getattr(embeddings, method)(*args, **kwargs)
+            except Exception as e:
+                raise EmbeddingsUnavailableError(str(e)) from e
 
+        if not self.breaker.allow():
+            raise EmbeddingsUnavailableError(
+                "Google embeddings tạm ngưng sau nhiều lỗi liên tiếp"
+            )
+        try:
+            # Sử dụng Google embeddings với thread safety
+            result = self._run_in_thread(getattr(embeddings, method), *args, **kwargs)
         except Exception as e:
-            print(f"Error in embed_documents: {e}")
-            # Switch to fallback
-            self._use_fallback = True
-            if self._fallback_embeddings is None:
-                self._fallback_embeddings = StreamlitSafeEmbeddings()
-            return self._fallback_embeddings.embed_documents(texts)
+            self.breaker.record_failure()
+            print(f"Error in {method}: {e}")
+            raise EmbeddingsUnavailableError(str(e)) from e
+        self.breaker.record_success()
+        return result
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed list of documents"""
+        return self._call("embed_documents", texts)
 
     def embed_query(self, text: str) -> List[float]:
         """Embed single query"""
-        try:
-            embeddings = self._get_embeddings()
-
-            if self._use_fallback:
-                # Sử dụng fallback embeddings
-                return embeddings.embed_query(text)
-            else:
-                # Sử dụng Google embeddings với thread safety
-                return self._run_in_thread(embeddings.embed_query, text)
-
-        except Exception as e:
-            print(f"Error in embed_query: {e}")
-            # Switch to fallback
-            self._use_fallback = True
-            if self._fallback_embeddings is None:
-                self._fallback_embeddings = StreamlitSafeEmbeddings()
-            return self._fallback_embeddings.embed_query(text)
+        return self._call("embed_query", text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed many queries in one request (query task type, not document)"""
+        self._get_embeddings()
+        if self._use_fallback:
+            return self._call("embed_documents", texts)
+        return self._call("embed_documents", texts, task_type="RETRIEVAL_QUERY")
@@ -0,0 +1,416 @@
+"""
+Tầng tri thức dùng chung giữa các người dùng (FAQ, thông tin chung)
+
+Thay vì embed và lưu cùng một nội dung vào index của từng người dùng, nội dung
+dùng chung được lưu một lần trong một FAISS index chia thành nhiều shard. Mỗi
+document có phạm vi (scope):
+
+- "global": mọi người dùng đều thấy, shard chọn theo hash nội dung
+- "private": chỉ người sở hữu (owner) thấy, shard chọn theo hash của owner
+
+Khi tìm kiếm, các shard được tìm song song bằng thread pool (FAISS nhả GIL khi
+search) rồi gộp top-k; document "private" của người khác luôn bị lọc trước
+khi gộp nên không bao giờ lọt vào kết quả.
+
+Ví dụ nạp FAQ (mỗi dòng một mục):
+    python -m memory.shared_memory import faq.txt
+"""
+
+import argparse
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.faiss import dependable_faiss_import
+
+from config import (
+    SHARED_MEMORY_DIR,
+    SHARED_MEMORY_SEARCH_THREADS,
+    SHARED_MEMORY_SHARDS,
+)
+
+from .safe_embeddings import EmbeddingsUnavailableError, get_embedder_id
+from .storage import (
+    atomic_save_dir,
+    atomic_write_json,
+    dir_generation,
+    file_lock,
+    load_with_retry,
+    read_json,
+)
+from .vector_memory import EMBEDDER_INFO_FILE
+
+SCOPE_GLOBAL = "global"
+SCOPE_PRIVATE = "private"
+
+
+def is_visible(metadata: Dict[str, Any], user_id: Optional[str]) -> bool:
+    """
+    Người dùng có được thấy document này không
+
+    Args:
+        metadata: Metadata của document
+        user_id: Người dùng đang tìm kiếm (None = chỉ thấy nội dung global)
+    """
+    if metadata.get("scope") == SCOPE_GLOBAL:
+        return True
+    return user_id is not None and metadata.get("owner") == user_id
+
+
+class _Shard:
+    """Một shard FAISS, ghi nguyên tử như index của từng người dùng"""
+
+    def __init__(self, path: Path, embeddings: Any):
+        self.path = path
+        self.embeddings = embeddings
+        self.lock = threading.RLock()
+        self.store: Optional[FAISS] = None
+        self.embedder_id: Optional[str] = None
+        self.generation: Optional[str] = None
+        self.warned = False  # Đã báo shard không tương thích với embeddings
+        if self.path.exists():
+            self._load()
+
+    def _load(self) -> None:
+        def load():
+            generation = dir_generation(self.path)
+            store = FAISS.load_local(
+                str(self.path), self.embeddings, allow_dangerous_deserialization=True
+            )
+            info = read_json(self.path / EMBEDDER_INFO_FILE, {})
+            return generation, store, info.get("embedder_id")
+
+        self.generation, self.store, self.embedder_id = load_with_retry(load)
+
+    def _refresh_if_stale(self) -> None:
+        generation = dir_generation(self.path)
+        if generation is not None and generation != self.generation:
+            try:
+                self._load()
+            except Exception as e:
+                print(f"Lỗi khi tải lại shard {self.path.name}: {e}")
+
+    def _save(self) -> None:
+        def write(folder: Path) -> None:
+            self.store.save_local(str(folder))
+            atomic_write_json(
+                folder / EMBEDDER_INFO_FILE,
+                {"embedder_id": self.embedder_id, "dimension": self.store.index.d},
+            )
+
+        self.generation = atomic_save_dir(self.path, write)
+
+    def count(self) -> int:
+        with self.lock:
+            self._refresh_if_stale()
+            return self.store.index.ntotal if self.store is not None else 0
+
+    def compatible(self) -> bool:
+        """Shard rỗng hoặc được tạo bởi cùng embeddings"""
+        if self.store is None or self.store.index.ntotal == 0:
+            return True
+        return self.embedder_id == get_embedder_id(self.embeddings)
+
+    def add(
+        self, contents: List[str], vectors: List[List[float]], metadatas: List[Dict[str, Any]]
+    ) -> List[str]:
+        with file_lock(self.path), self.lock:
+            self._refresh_if_stale()
+            if not self.compatible():
+                raise EmbeddingsUnavailableError(
+                    f"Shard {self.path.name} được tạo bởi {self.embedder_id}, cần reindex"
+                )
+            if self.store is None or self.store.index.ntotal == 0:
+                self.store = self._empty_store(len(vectors[0]))
+                self.embedder_id = get_embedder_id(self.embeddings)
+            ids = self.store.add_embeddings(list(zip(contents, vectors)), metadatas=metadatas)
+            self._save()
+        return ids
+
+    def _empty_store(self, dimension: int) -> FAISS:
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=dependable_faiss_import().IndexFlatL2(dimension),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+        )
+
+    def reembed(self, embed: Callable[[List[str]], List[List[float]]]) -> int:
+        """Embed lại mọi document (giữ nguyên ID) và ghi thành thế hệ mới"""
+        with file_lock(self.path), self.lock:
+            self._refresh_if_stale()
+            if self.store is None or self.store.index.ntotal == 0:
+                return 0
+            doc_ids = list(self.store.index_to_docstore_id.values())
+            docs = [self.store.docstore.search(doc_id) for doc_id in doc_ids]
+            vectors = embed([doc.page_content for doc in docs])
+            store = self._empty_store(len(vectors[0]))
+            store.add_embeddings(
+                [(doc.page_content, vector) for doc, vector in zip(docs, vectors)],
+                metadatas=[doc.metadata for doc in docs],
+                ids=doc_ids,
+            )
+            self.store, self.embedder_id = store, get_embedder_id(self.embeddings)
+            self._save()
+        return len(doc_ids)
+
+    def delete_where(self, predicate: Callable[[Dict[str, Any]], bool]) -> int:
+        with file_lock(self.path), self.lock:
+            self._refresh_if_stale()
+            if self.store is None:
+                return 0
+            docstore = self.store.docstore
+            ids = [
+                doc_id
+                for doc_id in self.store.index_to_docstore_id.values()
+                if predicate(docstore.search(doc_id).metadata)
+            ]
+            if ids:
+                self.store.delete(ids)
+                self._save()
+        return len(ids)
+
+    def search(
+        self, query: np.ndarray, k: int, user_id: Optional[str]
+    ) -> List[Tuple[Document, float]]:
+        """
+        Top-k documents người dùng được thấy trong shard
+
+        Lấy thêm ứng viên (gấp đôi mỗi vòng) cho tới khi đủ k document hợp lệ
+        hoặc đã xét hết shard.
+        """
+        with self.lock:
+            self._refresh_if_stale()
+            if self.store is None:
+                return []
+            if not self.compatible():
+                if not self.warned:
+                    self.warned = True
+                    print(
+                        f"Shard {self.path.name} được tạo bởi {self.embedder_id}, "
+                        f"bị bỏ qua cho tới khi chạy reindex.py"
+                    )
+                return []
+            index = self.store.index
+            ntotal = index.ntotal
+            fetch_k = min(ntotal, k)
+            while fetch_k > 0:
+                scores, positions = index.search(query, fetch_k)
+                results = []
+                for position, score in zip(positions[0], scores[0]):
+                    if position == -1:
+                        continue
+                    doc = self.store.docstore.search(self.store.index_to_docstore_id[position])
+                    if isinstance(doc, Document) and is_visible(doc.metadata, user_id):
+                        results.append((doc, float(score)))
+                        if len(results) == k:
+                            return results
+                if fetch_k == ntotal:
+                    return results
+                fetch_k = min(ntotal, fetch_k * 2)
+            return []
+
+
+class SharedKnowledgeIndex:
+    """
+    Index tri thức dùng chung, chia shard và tìm kiếm song song
+    """
+
+    def __init__(
+        self,
+        embeddings: Any,
+        path: Path = SHARED_MEMORY_DIR,
+        shards: int = SHARED_MEMORY_SHARDS,
+        threads: int = SHARED_MEMORY_SEARCH_THREADS,
+    ):
+        """
+        Khởi tạo SharedKnowledgeIndex
+
+        Args:
+            embeddings: Embeddings dùng chung (phải giống embeddings của index người dùng
+                để khoảng cách so sánh được với nhau)
+            path: Thư mục chứa các shard
+            shards: Số shard (không đổi được sau khi đã có dữ liệu)
+            threads: Số thread tìm kiếm song song
+        """
+        self.embeddings = embeddings
+        self.path = Path(path)
+        self.shards = [
+            _Shard(self.path / f"shard_{index:03d}", embeddings) for index in range(shards)
+        ]
+        self.executor = ThreadPoolExecutor(
+            max(threads, 1), thread_name_prefix="shared-memory"
+        )
+
+    def shard_for(self, content: str, owner: Optional[str] = None) -> int:
+        """Shard của một document: theo owner nếu có, ngược lại theo nội dung"""
+        key = owner if owner is not None else content
+        return zlib.crc32(key.encode("utf-8")) % len(self.shards)
+
+    def add(
+        self,
+        contents: List[str],
+        owner: Optional[str] = None,
+        scope: str = SCOPE_GLOBAL,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+    ) -> int:
+        """
+        Thêm documents vào index dùng chung
+
+        Args:
+            contents: Nội dung các documents
+            owner: Người dùng sở hữu (bắt buộc với scope "private")
+            scope: "global" hoặc "private"
+            metadatas: Metadata bổ sung cho từng document
+
+        Returns:
+            Số documents đã thêm
+        """
+        if scope not in (SCOPE_GLOBAL, SCOPE_PRIVATE):
+            raise ValueError(f"Scope không hợp lệ: {scope}")
+        if scope == SCOPE_PRIVATE and owner is None:
+            raise ValueError("Document private cần owner")
+        if not contents:
+            return 0
+
+        vectors = self.embeddings.embed_documents(contents)
+        groups: Dict[int, List[int]] = {}
+        for i, content in enumerate(contents):
+            groups.setdefault(self.shard_for(content, owner), []).append(i)
+
+        for shard_index, positions in groups.items():
+            self.shards[shard_index].add(
+                [contents[i] for i in positions],
+                [vectors[i] for i in positions],
+                [
+                    {
+                        "type": "shared_knowledge",
+                        **((metadatas or [{}] * len(contents))[i]),
+                        "scope": scope,
+                        "owner": owner,
+                    }
+                    for i in positions
+                ],
+            )
+        return len(contents)
+
+    def search(
+        self, embedding: List[float], user_id: Optional[str], k: int
+    ) -> List[Tuple[Document, float]]:
+        """
+        Tìm song song trên mọi shard và gộp top-k theo khoảng cách L2
+
+        Args:
+            embedding: Vector của câu hỏi
+            user_id: Người dùng đang tìm kiếm (chỉ thấy global và private của mình)
+            k: Số kết quả tối đa
+
+        Returns:
+            Danh sách (document, khoảng cách), gần nhất trước
+        """
+        query = np.array([embedding], dtype=np.float32)
+        futures = [
+            self.executor.submit(shard.search, query, k, user_id) for shard in self.shards
+        ]
+        results = []
+        for future in futures:
+            try:
+                results.extend(future.result())
+            except Exception as e:
+                print(f"Lỗi khi tìm kiếm shard: {e}")
+        results.sort(key=lambda item: item[1])
+        return results[:k]
+
+    def delete_owner(self, user_id: str) -> int:
+        """
+        Xóa mọi document private của một người dùng (ví dụ khi xóa toàn bộ memory)
+
+        Returns:
+            Số documents đã xóa
+        """
+        shard = self.shards[self.shard_for("", user_id)]
+        return shard.delete_where(
+            lambda metadata: metadata.get("scope") == SCOPE_PRIVATE
+            and metadata.get("owner") == user_id
+        )
+
+    def reindex(self, batch_size: int = 256) -> int:
+        """
+        Embed lại mọi shard bằng embeddings của index (sau khi đổi embedding
+        model; shard của embeddings cũ bị bỏ qua khi tìm kiếm)
+
+        Args:
+            batch_size: Số texts mỗi lần gọi embeddings
+
+        Returns:
+            Số documents đã embed lại
+        """
+
+        def embed(texts: List[str]) -> List[List[float]]:
+            vectors = []
+            for start in range(0, len(texts), batch_size):
+                vectors.extend(self.embeddings.embed_documents(texts[start : start + batch_size]))
+            return vectors
+
+        return sum(shard.reembed(embed) for shard in self.shards)
+
+    def count(self) -> int:
+        """Tổng số documents trong mọi shard"""
+        return sum(shard.count() for shard in self.shards)
+
+
+_shared_indexes: Dict[str, SharedKnowledgeIndex] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_index(embeddings: Any) -> SharedKnowledgeIndex:
+    """
+    Index dùng chung của process cho một loại embeddings (tải một lần)
+
+    Args:
+        embeddings: Embeddings của người dùng
+    """
+    embedder_id = get_embedder_id(embeddings)
+    with _shared_lock:
+        index = _shared_indexes.get(embedder_id)
+        if index is None:
+            index = _shared_indexes[embedder_id] = SharedKnowledgeIndex(embeddings)
+        return index
+
+
+def main():
+    """Entry point của CLI"""
+    from .providers import create_embeddings
+
+    parser = argparse.ArgumentParser(description="Quản lý tri thức dùng chung")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    importer = subparsers.add_parser("import", help="Nạp file text, mỗi dòng một mục")
+    importer.add_argument("file")
+    importer.add_argument("--owner", help="Người sở hữu (kèm --private)")
+    importer.add_argument("--private", action="store_true")
+    subparsers.add_parser("count", help="Số documents trong index")
+    args = parser.parse_args()
+
+    index = get_shared_index(create_embeddings())
+    if args.command == "count":
+        print(index.count())
+        return
+
+    with open(args.file, "r", encoding="utf-8") as f:
+        contents = [line.strip() for line in f if line.strip()]
+    added = index.add(
+        contents,
+        owner=args.owner,
+        scope=SCOPE_PRIVATE if args.private else SCOPE_GLOBAL,
+    )
+    print(f"✅ Đã thêm {added} mục vào tri thức dùng chung")
+
+
+if __name__ == "__main__":
+    main()
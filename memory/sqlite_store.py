@@ -0,0 +1,730 @@
+"""
+SQLite storage engine: lưu chat history, entities và metadata của vector memory
+của tất cả người dùng trong một database duy nhất (WAL mode)
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from langchain.memory.entity import BaseEntityStore
+from langchain.schema.messages import AIMessage, BaseMessage, HumanMessage
+from pydantic import Field
+
+from config import SQLITE_DB_PATH
+
+from .json_chat_history import JSONChatMessageHistory
+from .tracing import traced
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    type TEXT NOT NULL,
+    content TEXT NOT NULL,
+    additional_kwargs TEXT NOT NULL DEFAULT '{}',
+    archived INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_messages_user_session_ts
+    ON messages (user_id, session_id, ts);
+
+CREATE TABLE IF NOT EXISTS entities (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    entity_key TEXT NOT NULL,
+    fact TEXT NOT NULL,
+    ts REAL NOT NULL,
+    UNIQUE (user_id, entity_key, fact)
+);
+
+CREATE TABLE IF NOT EXISTS vector_metadata (
+    user_id TEXT NOT NULL,
+    memory_id TEXT NOT NULL,
+    type TEXT,
+    ts REAL NOT NULL,
+    metadata TEXT NOT NULL,
+    PRIMARY KEY (user_id, memory_id)
+);
+CREATE INDEX IF NOT EXISTS idx_vector_metadata_user_type_ts
+    ON vector_metadata (user_id, type, ts);
+
+-- Người dùng đã có metadata được ghi trong SQLite (kể cả khi đã xóa hết memories)
+CREATE TABLE IF NOT EXISTS vector_metadata_users (
+    user_id TEXT PRIMARY KEY
+);
+"""
+
+
+# Số ID tối đa trong một mệnh đề IN (...), dưới giới hạn SQLITE_MAX_VARIABLE_NUMBER
+# của các bản SQLite cũ (999)
+_IN_CHUNK_SIZE = 500
+
+
+class SQLiteDatabase:
+    """
+    Kết nối SQLite dùng chung cho cả process
+
+    - Mỗi thread có connection riêng, database chạy ở chế độ WAL nên người
+      đọc không bị chặn bởi người ghi
+    - Các lệnh ghi bên trong transaction() được gom lại và commit một lần
+      khi khối lệnh kết thúc, nên không giữ khóa ghi trong lúc chờ LLM hay
+      embedding; lệnh đọc trong transaction chưa thấy các lệnh ghi đang chờ,
+      việc phụ thuộc vào chúng được hoãn bằng after_transaction()
+    """
+
+    def __init__(self, path: Path):
+        """
+        Khởi tạo database và schema
+
+        Args:
+            path: Đường dẫn file database
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connection của thread hiện tại"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        """
+        Thực thi câu lệnh đọc
+
+        Args:
+            sql: Câu lệnh SQL
+            params: Tham số
+
+        Returns:
+            Danh sách các dòng kết quả
+        """
+        return self._connection().execute(sql, params).fetchall()
+
+    def write(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """
+        Thực thi (hoặc xếp hàng nếu đang trong transaction) câu lệnh ghi
+
+        Args:
+            sql: Câu lệnh SQL
+            params: Tham số
+
+        Returns:
+            Số dòng bị ảnh hưởng (0 nếu lệnh được xếp hàng)
+        """
+        pending = getattr(self._local, "pending", None)
+        if pending is not None:
+            pending.append((sql, params))
+            return 0
+        return self._commit([(sql, params)])
+
+    @traced("sqlite.commit")
+    def _commit(self, statements: List[tuple]) -> int:
+        """Commit một nhóm câu lệnh ghi trong cùng một transaction"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rowcount = 0
+            for sql, params in statements:
+                rowcount += conn.execute(sql, params).rowcount
+            conn.execute("COMMIT")
+            return rowcount
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def after_transaction(self, callback: Callable[[], None]) -> None:
+        """
+        Gọi callback khi transaction của thread hiện tại kết thúc (commit hoặc
+        rollback), hoặc gọi ngay nếu không ở trong transaction
+
+        Args:
+            callback: Hàm không tham số
+        """
+        if getattr(self._local, "pending", None) is None:
+            callback()
+        else:
+            self._local.callbacks.append(callback)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Gom tất cả lệnh ghi trong khối thành một transaction nguyên tử
+        Lồng nhau được, chỉ khối ngoài cùng commit; lỗi thì bỏ toàn bộ
+        """
+        if getattr(self._local, "pending", None) is not None:
+            yield
+            return
+
+        self._local.pending, self._local.callbacks = [], []
+        try:
+            yield
+            statements = self._local.pending
+            self._local.pending = None
+            if statements:
+                self._commit(statements)
+        finally:
+            self._local.pending = None
+            callbacks, self._local.callbacks = self._local.callbacks, []
+            for callback in callbacks:
+                callback()
+
+
+_databases: Dict[Path, SQLiteDatabase] = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(path: Path = SQLITE_DB_PATH) -> SQLiteDatabase:
+    """
+    Lấy SQLiteDatabase dùng chung cho một đường dẫn
+
+    Args:
+        path: Đường dẫn file database
+
+    Returns:
+        SQLiteDatabase
+    """
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = SQLiteDatabase(path)
+        return _databases[path]
+
+
+class SQLiteChatMessageHistory(JSONChatMessageHistory):
+    """
+    Chat Message History lưu trong SQLite, thay thế trực tiếp JSONChatMessageHistory
+    Mỗi message là một dòng, thêm message là một lệnh INSERT
+    """
+
+    def __init__(
+        self,
+        user_id: str,
+        session_id: str = "default",
+        database: Optional[SQLiteDatabase] = None,
+    ):
+        """
+        Khởi tạo SQLiteChatMessageHistory
+
+        Args:
+            user_id: ID của người dùng
+            session_id: ID của phiên trò chuyện (mặc định là "default")
+            database: Database dùng chung (mặc định SQLITE_DB_PATH)
+        """
+        self.user_id = user_id
+        self.session_id = session_id
+        self.db = database or get_database()
+
+    def _row_to_message(self, row: tuple) -> BaseMessage:
+        """Chuyển một dòng (type, content, additional_kwargs) thành BaseMessage"""
+        message_type, content, additional_kwargs = row
+        return self._dict_to_message(
+            {
+                "type": message_type,
+                "content": content,
+                "additional_kwargs": json.loads(additional_kwargs),
+            }
+        )
+
+    def _select(self, archived: int, order: str = "ASC", limit: int = -1) -> List[tuple]:
+        """Lấy các dòng message của session theo thứ tự thời gian"""
+        return self.db.query(
+            "SELECT type, content, additional_kwargs FROM messages "
+            "WHERE user_id = ? AND session_id = ? AND archived = ? "
+            f"ORDER BY ts {order}, id {order} LIMIT ?",
+            (self.user_id, self.session_id, archived, limit),
+        )
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """Lấy tất cả messages"""
+        return [self._row_to_message(row) for row in self._select(archived=0)]
+
+    def add_message(self, message: BaseMessage) -> None:
+        """
+        Thêm một message mới
+
+        Args:
+            message: Message cần thêm
+        """
+        message_dict = self._message_to_dict(message)
+        self.db.write(
+            "INSERT INTO messages "
+            "(user_id, session_id, ts, type, content, additional_kwargs) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                self.user_id,
+                self.session_id,
+                time.time(),
+                message_dict["type"],
+                message_dict["content"],
+                json.dumps(message_dict["additional_kwargs"], ensure_ascii=False),
+            ),
+        )
+
+    def clear(self) -> None:
+        """Xóa tất cả messages (kể cả đã lưu trữ)"""
+        self.db.write(
+            "DELETE FROM messages WHERE user_id = ? AND session_id = ?",
+            (self.user_id, self.session_id),
+        )
+
+    def _count(self, archived: int) -> int:
+        """Đếm messages theo trạng thái lưu trữ"""
+        return self.db.query(
+            "SELECT COUNT(*) FROM messages "
+            "WHERE user_id = ? AND session_id = ? AND archived = ?",
+            (self.user_id, self.session_id, archived),
+        )[0][0]
+
+    def get_messages_count(self) -> int:
+        """Lấy số lượng messages chưa lưu trữ"""
+        return self._count(archived=0)
+
+    def get_archived_count(self) -> int:
+        """Lấy số lượng messages đã lưu trữ"""
+        return self._count(archived=1)
+
+    def archive_messages(self, count: int) -> int:
+        """
+        Đánh dấu các messages cũ nhất là đã lưu trữ
+
+        Args:
+            count: Số lượng messages cần lưu trữ
+
+        Returns:
+            Số lượng messages thực sự đã lưu trữ
+        """
+        return self.db.write(
+            "UPDATE messages SET archived = 1 WHERE id IN ("
+            "SELECT id FROM messages "
+            "WHERE user_id = ? AND session_id = ? AND archived = 0 "
+            "ORDER BY ts, id LIMIT ?)",
+            (self.user_id, self.session_id, count),
+        )
+
+    def iter_archived_messages(self) -> Iterator[BaseMessage]:
+        """Duyệt các messages đã lưu trữ theo thứ tự thời gian"""
+        for row in self._select(archived=1):
+            yield self._row_to_message(row)
+
+    def get_archived_messages(self) -> List[BaseMessage]:
+        """Lấy các messages đã lưu trữ"""
+        return list(self.iter_archived_messages())
+
+    def iter_message_dicts(self, archived: bool) -> Iterator[dict]:
+        """
+        Duyệt messages dạng dictionary theo thứ tự thời gian (dùng cho export)
+
+        Args:
+            archived: True để duyệt messages đã lưu trữ
+        """
+        cursor = self.db._connection().execute(
+            "SELECT type, content, additional_kwargs, ts FROM messages "
+            "WHERE user_id = ? AND session_id = ? AND archived = ? ORDER BY ts, id",
+            (self.user_id, self.session_id, int(archived)),
+        )
+        for message_type, content, additional_kwargs, ts in cursor:
+            yield {
+                "type": message_type,
+                "content": content,
+                "additional_kwargs": json.loads(additional_kwargs),
+                "timestamp": datetime.fromtimestamp(ts).isoformat(),
+            }
+
+    def import_message_dicts(self, message_dicts: List[dict], archived: bool) -> None:
+        """
+        Thêm một lô messages dạng dictionary trong một transaction (dùng cho import)
+
+        Args:
+            message_dicts: Các messages theo thứ tự thời gian
+            archived: True để đánh dấu là đã lưu trữ
+        """
+        # Messages cũ không có timestamp dùng thời điểm của message trước đó để giữ thứ tự
+        ts = 0.0
+        with self.db.transaction():
+            for message_dict in message_dicts:
+                if message_dict.get("timestamp"):
+                    ts = datetime.fromisoformat(message_dict["timestamp"]).timestamp()
+                self.db.write(
+                    "INSERT INTO messages "
+                    "(user_id, session_id, ts, type, content, additional_kwargs, archived) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        self.user_id,
+                        self.session_id,
+                        ts,
+                        message_dict["type"],
+                        message_dict["content"],
+                        json.dumps(message_dict.get("additional_kwargs", {}), ensure_ascii=False),
+                        int(archived),
+                    ),
+                )
+
+    def get_recent_messages(self, limit: int = 10) -> List[BaseMessage]:
+        """
+        Lấy các messages gần đây nhất
+
+        Args:
+            limit: Số lượng messages tối đa
+
+        Returns:
+            Danh sách các messages gần đây
+        """
+        rows = self._select(archived=0, order="DESC", limit=limit)
+        return [self._row_to_message(row) for row in reversed(rows)]
+
+    def get_conversation_summary(self) -> str:
+        """
+        Tạo tóm tắt cuộc trò chuyện
+
+        Returns:
+            Chuỗi tóm tắt cuộc trò chuyện
+        """
+        messages = self.get_recent_messages(10)
+        if not messages:
+            return "Chưa có cuộc trò chuyện nào."
+
+        summary_parts = []
+        for message in messages:
+            if isinstance(message, HumanMessage):
+                summary_parts.append(f"Người dùng: {message.content[:100]}...")
+            elif isinstance(message, AIMessage):
+                summary_parts.append(f"AI: {message.content[:100]}...")
+
+        return "\n".join(summary_parts)
+
+
+class SQLiteEntityStore(BaseEntityStore):
+    """
+    Entity Store lưu trong SQLite, thay thế trực tiếp JSONEntityStore
+    Mỗi fact là một dòng, (user_id, entity_key, fact) là duy nhất
+    """
+
+    # Khai báo fields cho Pydantic
+    user_id: str = Field(default="")
+    db: Optional[Any] = Field(default=None, exclude=True)
+
+    def __init__(self, user_id: str, database: Optional[SQLiteDatabase] = None, **data):
+        super().__init__(user_id=user_id, **data)
+        self.db = database or get_database()
+
+    def get(self, entity_key: str, default: Optional[str] = None) -> Optional[str]:
+        """
+        Lấy fact mới nhất của một entity
+
+        Args:
+            entity_key: Khóa của entity
+            default: Giá trị mặc định nếu không tìm thấy
+
+        Returns:
+            Thông tin của entity hoặc default
+        """
+        rows = self.db.query(
+            "SELECT fact FROM entities WHERE user_id = ? AND entity_key = ? "
+            "ORDER BY id DESC LIMIT 1",
+            (self.user_id, entity_key),
+        )
+        return rows[0][0] if rows else default
+
+    def set(self, entity_key: str, entity_value: str) -> None:
+        """
+        Đặt thông tin cho một entity
+
+        Args:
+            entity_key: Khóa của entity
+            entity_value: Giá trị của entity
+        """
+        self.add_fact(entity_key, entity_value)
+
+    def delete(self, entity_key: str) -> None:
+        """
+        Xóa một entity
+
+        Args:
+            entity_key: Khóa của entity cần xóa
+        """
+        self.db.write(
+            "DELETE FROM entities WHERE user_id = ? AND entity_key = ?",
+            (self.user_id, entity_key),
+        )
+
+    def exists(self, entity_key: str) -> bool:
+        """
+        Kiểm tra xem entity có tồn tại không
+
+        Args:
+            entity_key: Khóa của entity
+
+        Returns:
+            True nếu entity tồn tại
+        """
+        return bool(
+            self.db.query(
+                "SELECT 1 FROM entities WHERE user_id = ? AND entity_key = ? LIMIT 1",
+                (self.user_id, entity_key),
+            )
+        )
+
+    def clear(self) -> None:
+        """Xóa tất cả entities"""
+        self.db.write("DELETE FROM entities WHERE user_id = ?", (self.user_id,))
+
+    def get_all_entities(self) -> Dict[str, List[str]]:
+        """
+        Lấy tất cả entities
+
+        Returns:
+            Dictionary chứa tất cả entities
+        """
+        entities: Dict[str, List[str]] = {}
+        for entity_key, fact in self.db.query(
+            "SELECT entity_key, fact FROM entities WHERE user_id = ? ORDER BY id",
+            (self.user_id,),
+        ):
+            entities.setdefault(entity_key, []).append(fact)
+        return entities
+
+    def get_entity_facts(self, entity_key: str) -> List[str]:
+        """
+        Lấy tất cả facts của một entity
+
+        Args:
+            entity_key: Khóa của entity
+
+        Returns:
+            Danh sách các facts
+        """
+        return [
+            row[0]
+            for row in self.db.query(
+                "SELECT fact FROM entities WHERE user_id = ? AND entity_key = ? "
+                "ORDER BY id",
+                (self.user_id, entity_key),
+            )
+        ]
+
+    def add_fact(self, entity_key: str, fact: str) -> None:
+        """
+        Thêm một fact mới cho entity (bỏ qua nếu đã tồn tại)
+
+        Args:
+            entity_key: Khóa của entity
+            fact: Fact mới cần thêm
+        """
+        self.db.write(
+            "INSERT OR IGNORE INTO entities (user_id, entity_key, fact, ts) "
+            "VALUES (?, ?, ?, ?)",
+            (self.user_id, entity_key, fact, time.time()),
+        )
+
+    def remove_fact(self, entity_key: str, fact: str) -> None:
+        """
+        Xóa một fact khỏi entity
+
+        Args:
+            entity_key: Khóa của entity
+            fact: Fact cần xóa
+        """
+        self.db.write(
+            "DELETE FROM entities WHERE user_id = ? AND entity_key = ? AND fact = ?",
+            (self.user_id, entity_key, fact),
+        )
+
+
+class SQLiteVectorMetadataStore:
+    """
+    Metadata của các vector memories lưu trong SQLite
+    Khóa là ID của document trong FAISS docstore, cùng interface với
+    JSONVectorMetadataStore
+    """
+
+    def __init__(self, user_id: str, database: Optional[SQLiteDatabase] = None):
+        """
+        Khởi tạo SQLiteVectorMetadataStore
+
+        Args:
+            user_id: ID của người dùng
+            database: Database dùng chung (mặc định SQLITE_DB_PATH)
+        """
+        self.user_id = user_id
+        self.db = database or get_database()
+
+    def _mark_written(self) -> None:
+        """Ghi nhận người dùng đã có metadata trong SQLite (gọi trong transaction)"""
+        self.db.write(
+            "INSERT OR IGNORE INTO vector_metadata_users (user_id) VALUES (?)",
+            (self.user_id,),
+        )
+
+    def add(self, memory_id: str, metadata: Dict[str, Any]) -> None:
+        """
+        Thêm metadata của một memory
+
+        Args:
+            memory_id: ID của document trong vector store
+            metadata: Metadata của memory
+        """
+        self.add_many([(memory_id, metadata)])
+
+    def add_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Thêm metadata của nhiều memories trong một transaction
+
+        Args:
+            items: Các cặp (memory_id, metadata)
+        """
+        with self.db.transaction():
+            self._mark_written()
+            for memory_id, metadata in items:
+                self.db.write(
+                    "INSERT OR REPLACE INTO vector_metadata "
+                    "(user_id, memory_id, type, ts, metadata) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        self.user_id,
+                        memory_id,
+                        metadata.get("type"),
+                        time.time(),
+                        json.dumps(metadata, ensure_ascii=False),
+                    ),
+                )
+
+    def remove(self, memory_ids: Iterable[str]) -> None:
+        """
+        Xóa metadata của các memories
+
+        Args:
+            memory_ids: Danh sách ID cần xóa
+        """
+        with self.db.transaction():
+            self._mark_written()
+            for memory_id in memory_ids:
+                self.db.write(
+                    "DELETE FROM vector_metadata WHERE user_id = ? AND memory_id = ?",
+                    (self.user_id, memory_id),
+                )
+
+    def get(self, memory_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy metadata của một memory"""
+        rows = self.db.query(
+            "SELECT metadata FROM vector_metadata WHERE user_id = ? AND memory_id = ?",
+            (self.user_id, memory_id),
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def filter_existing(self, memory_ids: Iterable[str]) -> Set[str]:
+        """
+        Lọc các ID còn tồn tại (ID không có trong bảng là tombstone)
+
+        Args:
+            memory_ids: Danh sách ID cần kiểm tra
+
+        Returns:
+            Tập các ID còn tồn tại
+        """
+        memory_ids = list(memory_ids)
+        existing: Set[str] = set()
+        for start in range(0, len(memory_ids), _IN_CHUNK_SIZE):
+            chunk = memory_ids[start:start + _IN_CHUNK_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            existing.update(
+                row[0]
+                for row in self.db.query(
+                    "SELECT memory_id FROM vector_metadata "
+                    f"WHERE user_id = ? AND memory_id IN ({placeholders})",
+                    (self.user_id, *chunk),
+                )
+            )
+        return existing
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Duyệt (memory_id, metadata) của các memories còn tồn tại"""
+        rows = self.db.query(
+            "SELECT memory_id, metadata FROM vector_metadata WHERE user_id = ?",
+            (self.user_id,),
+        )
+        return ((memory_id, json.loads(metadata)) for memory_id, metadata in rows)
+
+    def find(self, **filters: Any) -> List[str]:
+        """
+        Tìm ID các memories có metadata khớp với tất cả bộ lọc
+        Lọc theo type dùng index (user_id, type, ts)
+
+        Args:
+            **filters: Các cặp khóa = giá trị của metadata (ví dụ type="ai_message")
+
+        Returns:
+            Danh sách ID
+        """
+        if set(filters) == {"type"}:
+            return [
+                row[0]
+                for row in self.db.query(
+                    "SELECT memory_id FROM vector_metadata "
+                    "WHERE user_id = ? AND type = ?",
+                    (self.user_id, filters["type"]),
+                )
+            ]
+        return [
+            memory_id
+            for memory_id, metadata in self.items()
+            if all(metadata.get(key) == value for key, value in filters.items())
+        ]
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        """Lấy metadata của tất cả memories"""
+        return dict(self.items())
+
+    def count(self) -> int:
+        """Số lượng memories"""
+        return self.db.query(
+            "SELECT COUNT(*) FROM vector_metadata WHERE user_id = ?", (self.user_id,)
+        )[0][0]
+
+    def needs_migration(self) -> bool:
+        """
+        Metadata cần được dựng lại từ FAISS docstore: người dùng chưa từng có
+        metadata trong SQLite (database tạo trước bảng vector_metadata_users
+        thì người dùng còn metadata được coi là đã có)
+        """
+        marked = self.db.query(
+            "SELECT 1 FROM vector_metadata_users WHERE user_id = ?", (self.user_id,)
+        )
+        return not marked and self.count() == 0
+
+    def garbage_ratio(self) -> float:
+        """SQLite tự quản lý vùng trống nên không cần compact"""
+        return 0.0
+
+    def compact(self) -> None:
+        """Không cần compact với SQLite"""
+
+    def clear(self) -> None:
+        """Xóa metadata của tất cả memories"""
+        with self.db.transaction():
+            self._mark_written()
+            self.db.write("DELETE FROM vector_metadata WHERE user_id = ?", (self.user_id,))
@@ -0,0 +1,211 @@
+"""
+Các tiện ích lưu trữ an toàn khi nhiều thread/process cùng ghi một thư mục dữ liệu
+
+- Ghi nguyên tử: ghi ra file tạm rồi os.replace, người đọc chỉ thấy bản cũ
+  hoặc bản mới hoàn chỉnh, không bao giờ thấy file ghi dở
+- Khóa advisory (fcntl.flock) cho mỗi file để tuần tự hóa read-modify-write
+- Thư mục (FAISS index) được ghi thành một thế hệ mới rồi đổi symlink
+"""
+
+import json
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows không có fcntl, khóa trở thành no-op
+    fcntl = None
+
+from config import STORAGE_FSYNC
+
+
+def _lock_path(path: Path) -> Path:
+    """Đường dẫn file khóa đi kèm một file/thư mục dữ liệu"""
+    return path.parent / f".{path.name}.lock"
+
+
+@contextmanager
+def file_lock(path: Path, shared: bool = False) -> Iterator[None]:
+    """
+    Khóa advisory giữa các process (và giữa các thread) cho một file dữ liệu
+
+    Args:
+        path: File hoặc thư mục dữ liệu cần khóa
+        shared: True để lấy khóa đọc dùng chung thay vì khóa ghi độc quyền
+    """
+    if fcntl is None:
+        yield
+        return
+
+    lock_file = _lock_path(path)
+    lock_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_file, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """
+    Ghi text vào file một cách nguyên tử (file tạm + os.replace)
+
+    Args:
+        path: File đích
+        text: Nội dung cần ghi
+    """
+    tmp_path = path.parent / f".{path.name}.{uuid.uuid4().hex[:8]}.tmp"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+            if STORAGE_FSYNC:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def atomic_write_json(path: Path, data: Any, indent: Optional[int] = 2) -> None:
+    """
+    Ghi dữ liệu JSON một cách nguyên tử
+
+    Args:
+        path: File đích
+        data: Dữ liệu cần ghi
+        indent: Indent của JSON (None để ghi gọn)
+    """
+    separators = None if indent is not None else (",", ":")
+    atomic_write_text(
+        path, json.dumps(data, ensure_ascii=False, indent=indent, separators=separators)
+    )
+
+
+def read_json(path: Path, default: Any) -> Any:
+    """
+    Đọc file JSON không cần khóa (snapshot của lần ghi nguyên tử gần nhất)
+
+    File hỏng không bị coi là rỗng một cách âm thầm: nó được sao lưu sang
+    `<file>.corrupt-<timestamp>` trước khi trả về default, để lần ghi tiếp
+    theo không xóa mất dữ liệu có thể khôi phục.
+
+    Args:
+        path: File cần đọc
+        default: Giá trị trả về khi file không tồn tại hoặc hỏng
+
+    Returns:
+        Dữ liệu đã đọc hoặc default
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except json.JSONDecodeError as e:
+        backup = path.with_name(f"{path.name}.corrupt-{int(time.time())}")
+        try:
+            shutil.copy2(path, backup)
+        except OSError:
+            pass
+        print(f"File JSON bị hỏng {path}, đã sao lưu sang {backup}: {e}")
+        return default
+
+
+# File trong mỗi thế hệ ghi tên thế hệ trước nó (để dọn ở lần ghi sau)
+_PREVIOUS_GENERATION_FILE = ".previous_generation"
+
+
+def dir_generation(path: Path) -> Optional[str]:
+    """
+    Lấy thế hệ hiện tại của một thư mục được ghi bằng atomic_save_dir
+
+    Returns:
+        Tên thư mục thế hệ (đích của symlink), None nếu là thư mục thường
+        hoặc chưa tồn tại
+    """
+    try:
+        return os.readlink(path)
+    except OSError:
+        return None
+
+
+def atomic_save_dir(path: Path, writer: Callable[[Path], None]) -> Optional[str]:
+    """
+    Ghi một thư mục (ví dụ FAISS index) thành thế hệ mới rồi đổi symlink nguyên tử
+
+    `path` là symlink trỏ tới thư mục thế hệ `.<name>.<id>` nằm cùng thư mục cha.
+    Thư mục thường (định dạng cũ) được chuyển thành thế hệ ở lần ghi đầu tiên.
+    Cần gọi khi đang giữ file_lock(path).
+
+    Thế hệ ngay trước được giữ lại tới lần ghi kế tiếp: người đọc đã mở thế
+    hệ cũ trước khi đổi symlink vẫn đọc xong được; người đọc chậm hơn hai lần
+    ghi có thể gặp FileNotFoundError và cần đọc lại (load_with_retry).
+
+    Args:
+        path: Đường dẫn thư mục mà người đọc sử dụng
+        writer: Hàm ghi nội dung vào thư mục thế hệ mới
+
+    Returns:
+        Tên thế hệ mới (None nếu hệ thống không hỗ trợ symlink)
+    """
+    generation = path.parent / f".{path.name}.{uuid.uuid4().hex[:12]}"
+    writer(generation)
+
+    previous = None
+    if path.is_symlink():
+        previous = path.parent / os.readlink(path)
+    elif path.exists():
+        previous = path.parent / f".{path.name}.legacy-{uuid.uuid4().hex[:8]}"
+        os.rename(path, previous)
+    if previous is not None:
+        (generation / _PREVIOUS_GENERATION_FILE).write_text(previous.name)
+
+    tmp_link = path.parent / f".{path.name}.link-{uuid.uuid4().hex[:8]}"
+    try:
+        os.symlink(generation.name, tmp_link)
+    except (OSError, NotImplementedError):
+        # Không có symlink: thay thư mục trực tiếp (không nguyên tử)
+        if previous is not None:
+            shutil.rmtree(previous, ignore_errors=True)
+        os.rename(generation, path)
+        return None
+
+    os.replace(tmp_link, path)
+    if previous is not None:
+        # Chỉ xóa thế hệ trước thế hệ cũ (được ghi lại trong thế hệ cũ)
+        try:
+            older = (previous / _PREVIOUS_GENERATION_FILE).read_text().strip()
+        except OSError:
+            older = ""
+        if older:
+            shutil.rmtree(path.parent / older, ignore_errors=True)
+    return generation.name
+
+
+def load_with_retry(loader: Callable[[], Any], attempts: int = 3) -> Any:
+    """
+    Gọi loader, thử lại nếu thế hệ đang đọc bị thay thế giữa chừng
+
+    Args:
+        loader: Hàm tải dữ liệu từ thư mục
+        attempts: Số lần thử tối đa
+
+    Returns:
+        Kết quả của loader
+    """
+    for attempt in range(attempts):
+        try:
+            return loader()
+        except (FileNotFoundError, RuntimeError):
+            # faiss.read_index báo lỗi file không tồn tại bằng RuntimeError
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.01 * (attempt + 1))
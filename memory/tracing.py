@@ -0,0 +1,372 @@
+"""
+Đo thời gian theo span cho từng lượt trò chuyện, xuất ra logging/Prometheus/OpenTelemetry
+
+Dùng `span("faiss.search")` (context manager) hoặc `@traced("llm.invoke")`
+(decorator) quanh các thao tác cần đo, và `turn("chat_turn")` quanh một lượt
+trò chuyện để gom các span con thành một bảng phân rã thời gian. Khi tracing
+tắt, span() trả về một context manager no-op dùng chung nên chi phí chỉ là
+một lần kiểm tra cờ.
+"""
+
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from config import TRACING_ENABLED, TRACING_EXPORTERS
+
+logger = logging.getLogger("memory.tracing")
+
+
+class SpanRecord:
+    """Một span đã kết thúc"""
+
+    __slots__ = ("name", "start_ns", "end_ns", "parent", "attributes")
+
+    def __init__(
+        self,
+        name: str,
+        start_ns: int,
+        end_ns: int,
+        parent: Optional[str],
+        attributes: Dict[str, Any],
+    ):
+        self.name = name
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+        self.parent = parent
+        self.attributes = attributes
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+class TurnTrace:
+    """Tất cả span của một lượt trò chuyện"""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.spans: List[SpanRecord] = []
+        self.start_ns = time.time_ns()
+        self.end_ns = self.start_ns
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def breakdown(self) -> Dict[str, Dict[str, float]]:
+        """Tổng thời gian (ms, gồm cả span con) và số lần gọi theo tên span"""
+        result: Dict[str, Dict[str, float]] = {}
+        for record in self.spans:
+            entry = result.setdefault(record.name, {"ms": 0.0, "count": 0})
+            entry["ms"] += record.duration_ms
+            entry["count"] += 1
+        for entry in result.values():
+            entry["ms"] = round(entry["ms"], 3)
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Dạng dict để hiển thị (get_memory_summary, debug panel)"""
+        return {
+            "name": self.name,
+            "total_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "breakdown": self.breakdown(),
+        }
+
+
+class _NoopSpan:
+    """Context manager không làm gì (tracing tắt)"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    """Span đang chạy"""
+
+    __slots__ = ("tracer", "name", "attributes", "start_ns", "token", "parent")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.parent = self.tracer._current_span.get()
+        self.token = self.tracer._current_span.set(self.name)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.time_ns()
+        self.tracer._current_span.reset(self.token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.tracer._finish(
+            SpanRecord(self.name, self.start_ns, end_ns, self.parent, self.attributes)
+        )
+        return False
+
+
+class _Turn:
+    """Context manager của một lượt trò chuyện"""
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.trace = TurnTrace(name, attributes)
+
+    def __enter__(self) -> TurnTrace:
+        self.token = self.tracer._current_turn.set(self.trace)
+        self.trace.start_ns = time.time_ns()
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.end_ns = time.time_ns()
+        self.tracer._current_turn.reset(self.token)
+        if exc_type is not None:
+            self.trace.attributes["error"] = exc_type.__name__
+        self.tracer._export(self.trace)
+        return False
+
+
+class Tracer:
+    """
+    Thu thập span và xuất theo từng lượt trò chuyện
+
+    Span nằm ngoài một lượt (ví dụ thread tóm tắt nền) vẫn được đưa tới
+    exporter qua on_span nhưng không thuộc bảng phân rã của lượt nào.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.exporters: List[Any] = []
+        self._current_turn: ContextVar[Optional[TurnTrace]] = ContextVar(
+            "current_turn", default=None
+        )
+        self._current_span: ContextVar[Optional[str]] = ContextVar(
+            "current_span", default=None
+        )
+
+    def span(self, name: str, **attributes: Any):
+        """Đo một khối lệnh (no-op khi tracing tắt)"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name, attributes)
+
+    def turn(self, name: str = "chat_turn", **attributes: Any):
+        """Gom các span của một lượt trò chuyện (no-op khi tracing tắt)"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Turn(self, name, attributes)
+
+    def _finish(self, record: SpanRecord) -> None:
+        current = self._current_turn.get()
+        if current is not None:
+            current.spans.append(record)
+        for exporter in self.exporters:
+            try:
+                exporter.on_span(record)
+            except Exception as e:
+                logger.warning("Exporter %s lỗi: %s", type(exporter).__name__, e)
+
+    def _export(self, trace: TurnTrace) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.on_turn(trace)
+            except Exception as e:
+                logger.warning("Exporter %s lỗi: %s", type(exporter).__name__, e)
+
+    def add_exporter(self, exporter: Any) -> None:
+        """Thêm exporter (có các method on_span và on_turn)"""
+        self.exporters.append(exporter)
+
+    def get_exporter(self, exporter_type: type) -> Optional[Any]:
+        """Lấy exporter đầu tiên thuộc loại exporter_type"""
+        for exporter in self.exporters:
+            if isinstance(exporter, exporter_type):
+                return exporter
+        return None
+
+
+class LoggingExporter:
+    """Ghi bảng phân rã thời gian của mỗi lượt vào logging"""
+
+    def __init__(self, level: int = logging.INFO):
+        self.level = level
+
+    def on_span(self, record: SpanRecord) -> None:
+        pass
+
+    def on_turn(self, trace: TurnTrace) -> None:
+        parts = sorted(
+            trace.breakdown().items(), key=lambda item: item[1]["ms"], reverse=True
+        )
+        logger.log(
+            self.level,
+            "%s %.1fms %s | %s",
+            trace.name,
+            trace.duration_ms,
+            " ".join(f"{k}={v}" for k, v in trace.attributes.items()),
+            ", ".join(f"{name}={entry['ms']:.1f}ms×{entry['count']}" for name, entry in parts),
+        )
+
+
+class PrometheusExporter:
+    """
+    Histogram thời gian theo tên span, xuất ở Prometheus text format
+
+    render() trả về nội dung cho endpoint /metrics.
+    """
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, prefix: str = "memory"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counts: Dict[str, List[int]] = defaultdict(
+            lambda: [0] * (len(self.BUCKETS) + 1)
+        )
+        self._sums: Dict[str, float] = defaultdict(float)
+
+    def _observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._counts[name][bisect_left(self.BUCKETS, seconds)] += 1
+            self._sums[name] += seconds
+
+    def on_span(self, record: SpanRecord) -> None:
+        self._observe(record.name, record.duration_ms / 1000)
+
+    def on_turn(self, trace: TurnTrace) -> None:
+        self._observe(trace.name, trace.duration_ms / 1000)
+
+    def render(self) -> str:
+        """Nội dung Prometheus text exposition format"""
+        metric = f"{self.prefix}_span_duration_seconds"
+        lines = [
+            f"# HELP {metric} Thời gian của các span trong một lượt trò chuyện",
+            f"# TYPE {metric} histogram",
+        ]
+        with self._lock:
+            for name in sorted(self._counts):
+                cumulative = 0
+                for bound, count in zip(self.BUCKETS + (float("inf"),), self._counts[name]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{metric}_bucket{{span="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{span="{name}"}} {self._sums[name]:.6f}')
+                lines.append(f'{metric}_count{{span="{name}"}} {cumulative}')
+        return "\n".join(lines) + "\n"
+
+
+class OpenTelemetryExporter:
+    """
+    Chuyển span sang OpenTelemetry (cần cài opentelemetry-api/sdk)
+
+    Span được tạo lại với thời gian bắt đầu/kết thúc đã đo, lồng dưới span
+    của lượt trò chuyện khi có.
+    """
+
+    def __init__(self, tracer_name: str = "agent-memory"):
+        from opentelemetry import trace
+
+        self._trace = trace
+        self._tracer = trace.get_tracer(tracer_name)
+
+    def on_span(self, record: SpanRecord) -> None:
+        pass
+
+    def on_turn(self, trace: TurnTrace) -> None:
+        root = self._tracer.start_span(
+            trace.name, start_time=trace.start_ns, attributes=_otel_attributes(trace.attributes)
+        )
+        context = self._trace.set_span_in_context(root)
+        for record in trace.spans:
+            span = self._tracer.start_span(
+                record.name,
+                context=context,
+                start_time=record.start_ns,
+                attributes=_otel_attributes(record.attributes),
+            )
+            span.end(end_time=record.end_ns)
+        root.end(end_time=trace.end_ns)
+
+
+def _otel_attributes(attributes: Dict[str, Any]) -> Dict[str, Any]:
+    """OpenTelemetry chỉ nhận giá trị kiểu cơ bản"""
+    return {
+        key: value if isinstance(value, (str, bool, int, float)) else str(value)
+        for key, value in attributes.items()
+    }
+
+
+_EXPORTERS = {
+    "logging": LoggingExporter,
+    "prometheus": PrometheusExporter,
+    "otel": OpenTelemetryExporter,
+}
+
+
+def _create_tracer() -> Tracer:
+    """Tạo tracer toàn cục theo cấu hình"""
+    tracer = Tracer(enabled=TRACING_ENABLED)
+    for name in TRACING_EXPORTERS:
+        exporter_class = _EXPORTERS.get(name)
+        if exporter_class is None:
+            logger.warning("Exporter không hợp lệ: %s", name)
+            continue
+        try:
+            tracer.add_exporter(exporter_class())
+        except ImportError as e:
+            logger.warning("Không tạo được exporter %s: %s", name, e)
+    return tracer
+
+
+tracer = _create_tracer()
+
+
+def span(name: str, **attributes: Any):
+    """Đo một khối lệnh bằng tracer toàn cục"""
+    if not tracer.enabled:
+        return _NOOP_SPAN
+    return _Span(tracer, name, attributes)
+
+
+def turn(name: str = "chat_turn", **attributes: Any):
+    """Gom các span của một lượt trò chuyện bằng tracer toàn cục"""
+    return tracer.turn(name, **attributes)
+
+
+def traced(name: str) -> Callable:
+    """
+    Decorator đo thời gian của một hàm
+
+    Args:
+        name: Tên span
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with _Span(tracer, name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
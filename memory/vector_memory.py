@@ -3,19 +3,81 @@ Vector Store Memory để lưu trữ và truy xuất thông tin dựa trên sema
 """
 
 import asyncio
-import json
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 import numpy as np
 from langchain.docstore.document import Document
 from langchain.schema import BaseMemory
-from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.faiss import dependable_faiss_import
 from pydantic import Field
 
-from config import GOOGLE_API_KEY, MAX_RETRIEVED_MEMORIES, VECTOR_STORE_DIR
+from config import (
+    COLD_TIER_AFTER_DAYS,
+    MAX_RETRIEVED_MEMORIES,
+    MEMORY_TTL_DAYS,
+    QUERY_CACHE_SIZE,
+    QUERY_CACHE_TTL_SECONDS,
+    RETRIEVAL_CALIBRATION_MIN_MEMORIES,
+    RETRIEVAL_DISTANCE_RATIO,
+    RETRIEVAL_DISTANCE_THRESHOLDS,
+    RETRIEVAL_SCORE_GAP,
+    VECTOR_COMPACTION_THRESHOLD,
+    VECTOR_DEDUP_ENABLED,
+    VECTOR_DEDUP_THRESHOLD,
+    VECTOR_DIMENSION,
+    VECTOR_HOT_DOCS,
+    VECTOR_MAINTENANCE_INTERVAL_SECONDS,
+    VECTOR_STORE_DIR,
+)
 
-from .safe_embeddings import SafeGoogleGenerativeAIEmbeddings
+from .cache import TTLCache, normalize_query
+from .cold_storage import SegmentLog, TieredDocstore
+from .pending_writes import PendingWriteQueue
+from .providers import create_embeddings
+from .quantized_faiss import QuantizedFAISS, create_index
+from .safe_embeddings import EmbeddingsUnavailableError, get_embedder_id
+from .storage import (
+    atomic_save_dir,
+    atomic_write_json,
+    dir_generation,
+    file_lock,
+    load_with_retry,
+    read_json,
+)
+from .tracing import span, traced
+from .vector_metadata import JSONVectorMetadataStore
+
+# File ghi ID và số chiều của embeddings đã tạo index, nằm cạnh index.faiss
+EMBEDDER_INFO_FILE = "embedder.json"
+
+# Memory version lấy từ bộ đếm chung của process nên hai instance của cùng
+# một user (ví dụ hai session ngoài pool) không bao giờ trùng version
+_MEMORY_VERSIONS = itertools.count(1)
+
+# Số láng giềng gần nhất được xét khi chống trùng lặp (bỏ qua tombstone)
+_DEDUP_CANDIDATES = 8
+
+# Số vector được lấy mẫu để đo khoảng cách trung vị giữa các cặp memories
+_CALIBRATION_SAMPLE = 256
+
+# Khoảng cách trung vị đã đo theo embedder, dùng cho các index còn quá ít
+# memories để tự hiệu chỉnh
+_DISTANCE_SCALES: Dict[str, float] = {}
 
 
 def ensure_event_loop():
@@ -31,6 +93,81 @@ def ensure_event_loop():
     return loop
 
 
+def format_memories(memories: List[Document]) -> str:
+    """
+    Định dạng danh sách memories thành chuỗi tóm tắt đánh số
+
+    Args:
+        memories: Các documents, liên quan nhất trước
+
+    Returns:
+        Chuỗi tóm tắt các memories liên quan
+    """
+    if not memories:
+        return "Không tìm thấy thông tin liên quan trong bộ nhớ."
+
+    summary_parts = []
+    for i, memory in enumerate(memories, 1):
+        memory_type = memory.metadata.get("type", "unknown")
+        content_preview = (
+            memory.page_content[:200] + "..."
+            if len(memory.page_content) > 200
+            else memory.page_content
+        )
+
+        summary_parts.append(f"{i}. [{memory_type}] {content_preview}")
+
+    return "\n".join(summary_parts)
+
+
+def merge_results(
+    batches: Iterable[List[Tuple[Document, float]]], k: int
+) -> List[Document]:
+    """
+    Gộp kết quả của nhiều query: mỗi document giữ khoảng cách nhỏ nhất, lấy k gần nhất
+
+    Args:
+        batches: Các danh sách tuple (document, khoảng cách)
+        k: Số lượng documents tối đa
+
+    Returns:
+        Danh sách documents, gần nhất trước
+    """
+    best: Dict[str, Tuple[Document, float]] = {}
+    for results in batches:
+        for doc, score in results:
+            current = best.get(doc.page_content)
+            if current is None or score < current[1]:
+                best[doc.page_content] = (doc, score)
+    return [doc for doc, _ in sorted(best.values(), key=lambda item: item[1])[:k]]
+
+
+def cut_results(
+    results: List[Tuple[Document, float]],
+    threshold: Optional[float] = None,
+    max_gap: Optional[float] = None,
+) -> List[Tuple[Document, float]]:
+    """
+    Cắt danh sách kết quả (gần nhất trước) theo khoảng cách
+
+    Args:
+        results: Các tuple (document, khoảng cách) tăng dần theo khoảng cách
+        threshold: Khoảng cách tối đa được giữ (None = không giới hạn)
+        max_gap: Dừng ở kết quả xa hơn kết quả trước đó quá khoảng này (None = không cắt)
+
+    Returns:
+        Phần đầu của results thỏa cả hai điều kiện
+    """
+    kept: List[Tuple[Document, float]] = []
+    for doc, score in results:
+        if threshold is not None and score > threshold:
+            break
+        if kept and max_gap is not None and score - kept[-1][1] > max_gap:
+            break
+        kept.append((doc, score))
+    return kept
+
+
 class VectorStoreMemory(BaseMemory):
     """
     Memory sử dụng FAISS vector store để lưu trữ và truy xuất thông tin
@@ -41,77 +178,367 @@ class VectorStoreMemory(BaseMemory):
     user_id: str = Field(default="")
     embeddings: Optional[Any] = Field(default=None, exclude=True)
     vector_store_path: Optional[Path] = Field(default=None, exclude=True)
-    metadata_path: Optional[Path] = Field(default=None, exclude=True)
+    cold_docs: Optional[Any] = Field(default=None, exclude=True)
+    metadata_store: Optional[Any] = Field(default=None, exclude=True)
     vector_store: Optional[Any] = Field(default=None, exclude=True)
+    loaded_generation: Optional[str] = Field(default=None, exclude=True)
+    index_embedder_id: Optional[str] = Field(default=None, exclude=True)
+    pending_writes: Optional[Any] = Field(default=None, exclude=True)
+    index_lock: Any = Field(default_factory=threading.RLock, exclude=True)
+    last_maintenance: float = Field(default=0.0, exclude=True)
+    maintenance_thread: Optional[Any] = Field(default=None, exclude=True)
+    memory_version: int = Field(default=0, exclude=True)
+    # Memories đã vào index nhưng metadata còn chờ commit trong transaction SQLite
+    uncommitted_ids: Set[str] = Field(default_factory=set, exclude=True)
+    query_embedding_cache: Optional[Any] = Field(default=None, exclude=True)
+    retrieval_cache: Optional[Any] = Field(default=None, exclude=True)
+    distance_scale: Optional[float] = Field(default=None, exclude=True)
+    calibrated_ntotal: int = Field(default=0, exclude=True)
 
-    def __init__(self, user_id: str, **data):
+    def __init__(
+        self,
+        user_id: str,
+        embeddings: Optional[Any] = None,
+        metadata_store: Optional[Any] = None,
+        **data,
+    ):
         """
         Khởi tạo VectorStoreMemory
 
         Args:
             user_id: ID của người dùng
+            embeddings: Embeddings dùng chung (mặc định tạo mới theo EMBEDDING_PROVIDER)
+            metadata_store: Nơi lưu metadata (mặc định file JSON của user)
         """
         # Đảm bảo có event loop
         ensure_event_loop()
 
         super().__init__(user_id=user_id, **data)
-        self.embeddings = SafeGoogleGenerativeAIEmbeddings(
-            model="models/embedding-001", google_api_key=GOOGLE_API_KEY
-        )
+        self.embeddings = embeddings or create_embeddings()
         self.vector_store_path = VECTOR_STORE_DIR / f"{user_id}_vectorstore"
-        self.metadata_path = VECTOR_STORE_DIR / f"{user_id}_metadata.json"
+        # Nội dung các documents cũ (cold tier), nằm ngoài các generation của index
+        self.cold_docs = SegmentLog(VECTOR_STORE_DIR / f"{user_id}_cold_docs")
+        self.metadata_store = metadata_store or JSONVectorMetadataStore(user_id)
+        self.pending_writes = PendingWriteQueue(user_id)
+        # Embeddings của câu hỏi (không phụ thuộc memory) và kết quả tìm kiếm
+        # (gắn với memory_version nên tự mất hiệu lực khi memory thay đổi)
+        self.query_embedding_cache = TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL_SECONDS)
+        self.retrieval_cache = TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL_SECONDS)
+        self._bump_version()
 
         # Khởi tạo hoặc tải vector store
         self._initialize_vector_store()
+        self._sync_metadata_with_docstore()
 
     def _initialize_vector_store(self) -> None:
-        """Khởi tạo hoặc tải vector store từ file"""
+        """
+        Tải vector store từ file, hoặc tạo index rỗng trong RAM cho user mới
+        (chỉ được ghi xuống đĩa khi có memory đầu tiên)
+        """
         try:
             if self.vector_store_path.exists():
                 # Tải vector store hiện có
-                self.vector_store = FAISS.load_local(
-                    str(self.vector_store_path),
-                    self.embeddings,
-                    allow_dangerous_deserialization=True,
-                )
+                self._load_vector_store()
             else:
-                # Tạo vector store mới với document dummy
-                dummy_doc = Document(
-                    page_content="Khởi tạo vector store",
-                    metadata={"user_id": self.user_id, "type": "init"},
-                )
-                self.vector_store = FAISS.from_documents([dummy_doc], self.embeddings)
-                self._save_vector_store()
+                self._reset_vector_store()
         except Exception as e:
             print(f"Lỗi khi khởi tạo vector store: {e}")
-            dummy_doc = Document(
-                page_content="Khởi tạo vector store",
-                metadata={"user_id": self.user_id, "type": "init"},
+            with file_lock(self.vector_store_path):
+                self._reset_vector_store()
+                self._save_vector_store()
+
+    def _sync_metadata_with_docstore(self) -> None:
+        """
+        Dựng lại metadata từ FAISS docstore khi metadata store chưa từng được
+        ghi (chuyển đổi từ file metadata cũ có ID không khớp với docstore)
+
+        Không dựa vào số memories còn tồn tại: xóa hết memories rồi tải lại
+        trước khi compaction thì docstore vẫn còn các documents đã xóa.
+        """
+        if not self.metadata_store.needs_migration() or self.metadata_store.count() > 0:
+            return
+
+        docstore = self.vector_store.docstore
+        items = []
+        for doc_id in self.vector_store.index_to_docstore_id.values():
+            doc = docstore.search(doc_id)
+            # Bỏ qua document dummy "init" của các vector store tạo bởi phiên bản cũ
+            if isinstance(doc, Document) and doc.metadata.get("type") != "init":
+                items.append((doc_id, doc.metadata))
+
+        if items:
+            self.metadata_store.add_many(items)
+        legacy_path = getattr(self.metadata_store, "legacy_path", None)
+        if legacy_path is not None:
+            legacy_path.unlink(missing_ok=True)
+
+    def _bump_version(self) -> None:
+        """
+        Đánh dấu memory đã thay đổi (mọi kết quả tìm kiếm đã cache hết hiệu lực)
+
+        Trong transaction SQLite, version chỉ đổi khi transaction kết thúc: nếu
+        đổi sớm, kết quả đọc từ metadata chưa commit sẽ được cache dưới version
+        mới và không bao giờ thấy memory vừa ghi.
+        """
+        database = getattr(self.metadata_store, "db", None)
+        if database is None:
+            self.memory_version = next(_MEMORY_VERSIONS)
+        else:
+            database.after_transaction(self._set_new_version)
+
+    def _set_new_version(self) -> None:
+        self.memory_version = next(_MEMORY_VERSIONS)
+
+    def _hold_until_commit(self, memory_ids: List[str]) -> None:
+        """
+        Không coi các memories vừa thêm là tombstone (compaction ở thread khác)
+        trong lúc metadata của chúng còn chờ commit
+        """
+        database = getattr(self.metadata_store, "db", None)
+        if database is None:
+            return
+        self.uncommitted_ids.update(memory_ids)
+
+        def release() -> None:
+            with self.index_lock:
+                self.uncommitted_ids.difference_update(memory_ids)
+
+        database.after_transaction(release)
+
+    def _embedding_dimension(self) -> int:
+        """Số chiều vector của embeddings (không gọi embeddings)"""
+        return getattr(self.embeddings, "dimension", None) or VECTOR_DIMENSION
+
+    def _create_vector_store(self, dimension: Optional[int] = None) -> QuantizedFAISS:
+        """
+        Tạo vector store rỗng (không gọi embeddings)
+
+        Args:
+            dimension: Số chiều của index (mặc định theo embeddings)
+        """
+        return self._attach_cold_docs(
+            QuantizedFAISS(
+                embedding_function=self.embeddings,
+                index=create_index(dimension or self._embedding_dimension()),
+                docstore=TieredDocstore(),
+                index_to_docstore_id={},
             )
-            self.vector_store = FAISS.from_documents([dummy_doc], self.embeddings)
-            self._save_vector_store()
+        )
+
+    def _attach_cold_docs(self, vector_store: QuantizedFAISS) -> QuantizedFAISS:
+        """Dùng TieredDocstore (index cũ dùng InMemoryDocstore) gắn với cold tier của user"""
+        if not isinstance(vector_store.docstore, TieredDocstore):
+            vector_store.docstore = TieredDocstore(vector_store.docstore._dict)
+        vector_store.docstore.attach(self.cold_docs)
+        return vector_store
+
+    def _reset_vector_store(self, dimension: Optional[int] = None) -> None:
+        """Thay vector store bằng index rỗng của embeddings hiện tại"""
+        self.vector_store = self._create_vector_store(dimension)
+        self.index_embedder_id = get_embedder_id(self.embeddings)
+
+    def _load_vector_store(self) -> None:
+        """Tải snapshot mới nhất của vector store (không cần khóa)"""
+
+        def load():
+            generation = dir_generation(self.vector_store_path)
+            vector_store = QuantizedFAISS.load_local(
+                str(self.vector_store_path),
+                self.embeddings,
+                allow_dangerous_deserialization=True,
+            )
+            # Index của phiên bản cũ không có file này (embeddings chưa rõ)
+            info = read_json(self.vector_store_path / EMBEDDER_INFO_FILE, {})
+            return generation, self._attach_cold_docs(vector_store), info.get("embedder_id")
+
+        (
+            self.loaded_generation,
+            self.vector_store,
+            self.index_embedder_id,
+        ) = load_with_retry(load)
+
+    def embeddings_compatible(self) -> bool:
+        """
+        Index hiện tại có cùng không gian vector với embeddings hay không
 
+        Index rỗng luôn tương thích (được tạo lại theo embeddings khi ghi).
+        Index cũ chưa ghi ID embeddings được so sánh theo số chiều.
+        """
+        index = self.vector_store.index
+        if index.ntotal == 0:
+            return True
+        if self.index_embedder_id is not None:
+            return self.index_embedder_id == get_embedder_id(self.embeddings)
+        dimension = getattr(self.embeddings, "dimension", None)
+        return dimension is None or dimension == index.d
+
+    def _refresh_if_stale(self) -> None:
+        """Tải lại vector store nếu process khác đã ghi thế hệ mới"""
+        generation = dir_generation(self.vector_store_path)
+        if generation is not None and generation != self.loaded_generation:
+            try:
+                self._load_vector_store()
+                self._bump_version()
+            except Exception as e:
+                print(f"Lỗi khi tải lại vector store: {e}")
+
+    @traced("faiss.save")
     def _save_vector_store(self) -> None:
-        """Lưu vector store vào file"""
+        """Lưu vector store kèm ID embeddings (nguyên tử, cần giữ file_lock)"""
+        if self.index_embedder_id is None:
+            self.index_embedder_id = get_embedder_id(self.embeddings)
+
+        def write(folder: Path) -> None:
+            self.vector_store.save_local(str(folder))
+            atomic_write_json(
+                folder / EMBEDDER_INFO_FILE,
+                {
+                    "embedder_id": self.index_embedder_id,
+                    "dimension": self.vector_store.index.d,
+                    "index_type": self.vector_store.index_type,
+                },
+            )
+
         try:
-            self.vector_store.save_local(str(self.vector_store_path))
+            self.loaded_generation = atomic_save_dir(self.vector_store_path, write)
         except Exception as e:
             print(f"Lỗi khi lưu vector store: {e}")
 
-    def _load_metadata(self) -> Dict[str, Any]:
-        """Tải metadata từ file"""
-        if self.metadata_path.exists():
-            try:
-                with open(self.metadata_path, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
-                return {}
-        return {}
+    def _insert(
+        self,
+        contents: List[str],
+        vectors: List[List[float]],
+        metadatas: List[Dict[str, Any]],
+    ) -> List[str]:
+        """
+        Thêm các vector đã embed vào index, lưu index rồi ghi metadata
+
+        Returns:
+            ID của các documents mới
+        """
+        with file_lock(self.vector_store_path), self.index_lock:
+            # Ghi lên thế hệ mới nhất để không làm mất ghi của process khác
+            self._refresh_if_stale()
+
+            index = self.vector_store.index
+            if index.ntotal == 0:
+                # Index còn rỗng thì tạo lại theo embeddings và số chiều thực tế
+                if index.d != len(vectors[0]) or not self.embeddings_compatible():
+                    self._reset_vector_store(len(vectors[0]))
+            elif not self.embeddings_compatible():
+                raise EmbeddingsUnavailableError(
+                    f"Index được tạo bởi {self.index_embedder_id}, cần reindex"
+                )
+
+            duplicates: Dict[int, str] = {}
+            if VECTOR_DEDUP_ENABLED and self.vector_store.index.ntotal:
+                duplicates = self._find_duplicates(vectors, metadatas)
+                if duplicates:
+                    self._record_hits(duplicates, metadatas)
+            keep = [i for i in range(len(contents)) if i not in duplicates]
+            if not keep:
+                return [duplicates[i] for i in range(len(contents))]
+
+            new_ids = iter(
+                self.vector_store.add_embeddings(
+                    [(contents[i], vectors[i]) for i in keep],
+                    metadatas=[metadatas[i] for i in keep],
+                )
+            )
+            self._save_vector_store()
 
-    def _save_metadata(self, metadata: Dict[str, Any]) -> None:
-        """Lưu metadata vào file"""
-        with open(self.metadata_path, "w", encoding="utf-8") as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
+            memory_ids = [
+                duplicates[i] if i in duplicates else next(new_ids)
+                for i in range(len(contents))
+            ]
+            # Cập nhật metadata tracking theo ID của document
+            with span("vector_metadata.write"):
+                self.metadata_store.add_many(
+                    (memory_ids[i], metadatas[i]) for i in keep
+                )
+            self._hold_until_commit([memory_ids[i] for i in keep])
+            self._bump_version()
+        return memory_ids
+
+    def _find_duplicates(
+        self, vectors: List[List[float]], metadatas: List[Dict[str, Any]]
+    ) -> Dict[int, str]:
+        """
+        Tìm memory đã có gần như trùng với từng vector mới (cần giữ index_lock)
+
+        Vector đã được embed nên chỉ tốn một lần search: láng giềng gần nhất
+        còn tồn tại, cùng type và có cosine similarity >= VECTOR_DEDUP_THRESHOLD
+        được coi là trùng.
+
+        Returns:
+            {vị trí trong lô: ID của memory đã có}
+        """
+        vector_store = self.vector_store
+        index = vector_store.index
+        tombstones = max(index.ntotal - self.metadata_store.count(), 0)
+        fetch_k = min(index.ntotal, 1 + tombstones, _DEDUP_CANDIDATES)
+        queries = np.array(vectors, dtype=np.float32)
+        if vector_store._normalize_L2:
+            dependable_faiss_import().normalize_L2(queries)
+        _, positions = vector_store.search_vectors(queries, fetch_k)
+
+        candidates = [
+            [(int(p), vector_store.index_to_docstore_id[p]) for p in row if p != -1]
+            for row in positions
+        ]
+        live_ids = self.metadata_store.filter_existing(
+            doc_id for row in candidates for _, doc_id in row
+        )
+
+        duplicates = {}
+        for i, (query, row) in enumerate(zip(queries, candidates)):
+            nearest = next(((p, d) for p, d in row if d in live_ids), None)
+            if nearest is None:
+                continue
+            position, doc_id = nearest
+            existing = index.reconstruct(position)
+            norms = float(np.linalg.norm(query) * np.linalg.norm(existing))
+            similarity = float(np.dot(query, existing)) / norms if norms else 0.0
+            if similarity < VECTOR_DEDUP_THRESHOLD:
+                continue
+            metadata = self.metadata_store.get(doc_id) or {}
+            if metadata.get("type") == metadatas[i].get("type"):
+                duplicates[i] = doc_id
+        return duplicates
+
+    def _record_hits(
+        self, duplicates: Dict[int, str], metadatas: List[Dict[str, Any]]
+    ) -> None:
+        """Tăng số lần gặp và thời điểm gặp gần nhất của các memory bị trùng"""
+        updates: Dict[str, Dict[str, Any]] = {}
+        for i, doc_id in duplicates.items():
+            metadata = updates.get(doc_id) or dict(self.metadata_store.get(doc_id) or {})
+            metadata["hits"] = metadata.get("hits", 1) + 1
+            metadata["last_seen"] = metadatas[i].get("timestamp")
+            updates[doc_id] = metadata
+        with span("vector_metadata.write"):
+            self.metadata_store.add_many(updates.items())
+
+    def flush_pending_writes(self) -> int:
+        """
+        Embed và ghi các memories đang chờ khi embeddings dùng được trở lại
+
+        Returns:
+            Số memories đã ghi
+        """
+        if not self.pending_writes.count() or not self.embeddings_compatible():
+            return 0
+
+        def insert(items: List[Dict[str, Any]]) -> None:
+            contents = [item["content"] for item in items]
+            vectors = self.embeddings.embed_documents(contents)
+            self._insert(contents, vectors, [item["metadata"] for item in items])
+
+        try:
+            return self.pending_writes.drain(insert)
+        except Exception as e:
+            print(f"Lỗi khi ghi các memories đang chờ: {e}")
+            return 0
 
     def add_memory(
         self,
@@ -131,24 +558,159 @@ class VectorStoreMemory(BaseMemory):
         if additional_metadata:
             metadata.update(additional_metadata)
 
-        document = Document(page_content=content, metadata=metadata)
-
         try:
-            # Thêm document vào vector store
-            self.vector_store.add_documents([document])
-            self._save_vector_store()
-
-            # Cập nhật metadata tracking
-            all_metadata = self._load_metadata()
-            memory_id = f"{self.user_id}_{len(all_metadata)}"
-            all_metadata[memory_id] = metadata
-            self._save_metadata(all_metadata)
-
+            if not self.embeddings_compatible():
+                raise EmbeddingsUnavailableError(
+                    f"Index được tạo bởi {self.index_embedder_id}, cần reindex"
+                )
+            # Embed ngoài khóa để không chặn các process khác khi gọi API
+            with span("embedding.embed_documents"):
+                embedding = self.embeddings.embed_documents([content])[0]
+            self._insert([content], [embedding], [metadata])
+        except EmbeddingsUnavailableError as e:
+            # Không embed bằng model khác: xếp hàng chờ embeddings phục hồi
+            print(f"Memory được xếp hàng chờ embed: {e}")
+            self.pending_writes.append(content, metadata)
+            return
         except Exception as e:
             print(f"Lỗi khi thêm memory: {e}")
+            return
+
+        self.flush_pending_writes()
+        self._schedule_maintenance()
+
+    def _search_by_vector(
+        self, embedding: List[float], k: int
+    ) -> List[Tuple[Document, float]]:
+        """
+        Tìm k memories gần nhất còn tồn tại cho một vector query
+
+        Args:
+            embedding: Vector của query
+            k: Số lượng kết quả tối đa
+
+        Returns:
+            Danh sách tuple (document, khoảng cách L2)
+        """
+        return self._search_by_vectors([embedding], k)[0]
+
+    @traced("faiss.search")
+    def _search_by_vectors(
+        self, embeddings: List[List[float]], k: int
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Tìm k memories gần nhất còn tồn tại cho nhiều query trong một lần search
+
+        Document có trong index nhưng không còn trong metadata store là
+        tombstone (đã xóa hoặc hết hạn, chờ compaction). Số ứng viên lấy
+        thêm đúng bằng số tombstone nên luôn đủ k kết quả thật nếu có.
+
+        Args:
+            embeddings: Các vector query (n vector cùng số chiều)
+            k: Số lượng kết quả tối đa của mỗi query
+
+        Returns:
+            Danh sách kết quả theo thứ tự query, mỗi kết quả là danh sách
+            tuple (document, khoảng cách L2)
+        """
+        with self.index_lock:
+            self._refresh_if_stale()
+            vector_store = self.vector_store
+            ntotal = vector_store.index.ntotal
+            if ntotal == 0 or k <= 0 or not embeddings:
+                return [[] for _ in embeddings]
+
+            tombstones = max(ntotal - self.metadata_store.count(), 0)
+            fetch_k = min(ntotal, k + tombstones)
+            queries = np.array(embeddings, dtype=np.float32)
+            if vector_store._normalize_L2:
+                dependable_faiss_import().normalize_L2(queries)
+            scores, positions = vector_store.search_vectors(queries, fetch_k)
+
+            candidates = [
+                [
+                    (vector_store.index_to_docstore_id[position], float(score))
+                    for position, score in zip(row_positions, row_scores)
+                    if position != -1
+                ]
+                for row_positions, row_scores in zip(positions, scores)
+            ]
+            live_ids = self.metadata_store.filter_existing(
+                doc_id for row in candidates for doc_id, _ in row
+            )
+
+            batches = []
+            for row in candidates:
+                results = []
+                for doc_id, score in row:
+                    if doc_id not in live_ids:
+                        continue
+                    doc = vector_store.docstore.search(doc_id)
+                    if isinstance(doc, Document):
+                        results.append((doc, score))
+                        if len(results) == k:
+                            break
+                batches.append(results)
+            return batches
+
+    def _calibrate_distance_scale(self) -> Optional[float]:
+        """
+        Khoảng cách trung vị giữa các cặp memories ngẫu nhiên trong index
+        (thang đo khoảng cách của embeddings, cần giữ index_lock)
+
+        Được đo lại khi số vector tăng gấp đôi; index còn ít memories dùng
+        giá trị đã đo của cùng embedder (nếu có).
+        """
+        index = self.vector_store.index
+        embedder_id = self.index_embedder_id or get_embedder_id(self.embeddings)
+        if index.ntotal < max(RETRIEVAL_CALIBRATION_MIN_MEMORIES, 2):
+            return _DISTANCE_SCALES.get(embedder_id)
+        if self.distance_scale is not None and index.ntotal < 2 * self.calibrated_ntotal:
+            return self.distance_scale
+
+        rng = np.random.default_rng(0)
+        positions = np.sort(
+            rng.choice(index.ntotal, min(index.ntotal, _CALIBRATION_SAMPLE), replace=False)
+        )
+        if self.vector_store.rerank_vectors is not None:
+            sample = np.asarray(self.vector_store.rerank_vectors[positions], dtype=np.float32)
+        else:
+            sample = np.array([index.reconstruct(int(p)) for p in positions], dtype=np.float32)
+        norms = (sample ** 2).sum(axis=1)
+        distances = norms[:, None] + norms[None, :] - 2 * sample @ sample.T
+        scale = float(np.median(distances[np.triu_indices(len(sample), 1)]))
+
+        self.distance_scale = _DISTANCE_SCALES[embedder_id] = scale
+        self.calibrated_ntotal = index.ntotal
+        return scale
+
+    def cutoff_params(self) -> Tuple[Optional[float], Optional[float]]:
+        """
+        Ngưỡng khoảng cách và bước nhảy tối đa dùng để cắt kết quả truy xuất
+
+        Ngưỡng lấy từ RETRIEVAL_DISTANCE_THRESHOLDS của embedder nếu có, nếu
+        không thì bằng RETRIEVAL_DISTANCE_RATIO × khoảng cách trung vị giữa
+        các cặp memories (thang đo L2 khác nhau giữa các embeddings).
+
+        Returns:
+            (threshold, max_gap), None là không cắt theo tiêu chí đó
+        """
+        embedder_id = self.index_embedder_id or get_embedder_id(self.embeddings)
+        with self.index_lock:
+            scale = self._calibrate_distance_scale()
+        threshold = RETRIEVAL_DISTANCE_THRESHOLDS.get(embedder_id)
+        if threshold is None and scale is not None and RETRIEVAL_DISTANCE_RATIO > 0:
+            threshold = RETRIEVAL_DISTANCE_RATIO * scale
+        max_gap = None
+        if RETRIEVAL_SCORE_GAP > 0:
+            # Không có thang đo thì tính bước nhảy theo ngưỡng cố định
+            reference = scale if scale is not None else threshold
+            if reference is not None:
+                max_gap = RETRIEVAL_SCORE_GAP * reference
+        return threshold, max_gap
 
     def retrieve_memories(
-        self, query: str, k: int = MAX_RETRIEVED_MEMORIES
+        self, query: str, k: int = MAX_RETRIEVED_MEMORIES, cutoff: bool = True
     ) -> List[Document]:
         """
         Truy xuất memories liên quan dựa trên query
@@ -156,34 +718,77 @@ class VectorStoreMemory(BaseMemory):
         Args:
             query: Câu hỏi hoặc nội dung cần tìm
             k: Số lượng memories tối đa cần truy xuất
+            cutoff: Bỏ các memories quá xa query (xem cutoff_params)
 
         Returns:
             Danh sách các documents liên quan
         """
-        # Đảm bảo có event loop
-        ensure_event_loop()
+        return [
+            doc for doc, _ in self.retrieve_memories_with_scores(query, k=k, cutoff=cutoff)
+        ]
 
-        try:
-            # Tìm kiếm similarity
-            docs = self.vector_store.similarity_search(query, k=k)
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embedding của câu hỏi, cache theo (embedder, câu hỏi đã chuẩn hóa)
 
-            # Lọc bỏ document dummy init
-            filtered_docs = [doc for doc in docs if doc.metadata.get("type") != "init"]
+        Args:
+            query: Câu hỏi hoặc nội dung cần tìm
+        """
+        embedding_key = (get_embedder_id(self.embeddings), normalize_query(query))
+        embedding = self.query_embedding_cache.get(embedding_key)
+        if embedding is None:
+            with span("embedding.embed_query"):
+                embedding = self.embeddings.embed_query(query)
+            self.query_embedding_cache.set(embedding_key, embedding)
+        return embedding
 
-            return filtered_docs
-        except Exception as e:
-            print(f"Lỗi khi truy xuất memories: {e}")
-            return []
+    def embed_queries(self, queries: Sequence[str]) -> List[List[float]]:
+        """
+        Embedding của nhiều câu hỏi, các câu chưa có trong cache được embed
+        trong một request
+
+        Args:
+            queries: Các câu hỏi
+
+        Returns:
+            Danh sách vector theo thứ tự câu hỏi
+        """
+        embedder_id = get_embedder_id(self.embeddings)
+        keys = [(embedder_id, normalize_query(query)) for query in queries]
+        vectors = [self.query_embedding_cache.get(key) for key in keys]
+
+        # Mỗi câu hỏi (đã chuẩn hóa) chỉ embed một lần dù xuất hiện nhiều lần
+        missing: Dict[Tuple[str, str], str] = {}
+        for key, query, vector in zip(keys, queries, vectors):
+            if vector is None:
+                missing.setdefault(key, query)
+        if missing:
+            texts = list(missing.values())
+            embed_queries = getattr(self.embeddings, "embed_queries", None)
+            with span("embedding.embed_queries"):
+                if embed_queries is not None:
+                    embedded = embed_queries(texts)
+                else:
+                    embedded = [self.embeddings.embed_query(text) for text in texts]
+            fresh = dict(zip(missing, embedded))
+            for key, vector in fresh.items():
+                self.query_embedding_cache.set(key, vector)
+            vectors = [fresh.get(key, vector) for key, vector in zip(keys, vectors)]
+        return vectors
 
     def retrieve_memories_with_scores(
-        self, query: str, k: int = MAX_RETRIEVED_MEMORIES
+        self, query: str, k: int = MAX_RETRIEVED_MEMORIES, cutoff: bool = True
     ) -> List[tuple]:
         """
         Truy xuất memories với điểm số similarity
 
+        Kết quả được cache theo (câu hỏi đã chuẩn hóa, k, memory_version) nên
+        câu hỏi lặp lại khi memory chưa đổi không phải embed và tìm kiếm lại.
+
         Args:
             query: Câu hỏi hoặc nội dung cần tìm
             k: Số lượng memories tối đa cần truy xuất
+            cutoff: Bỏ các memories quá xa query, trả về từ 0 đến k kết quả
 
         Returns:
             Danh sách tuple (document, score)
@@ -192,63 +797,279 @@ class VectorStoreMemory(BaseMemory):
         ensure_event_loop()
 
         try:
-            docs_with_scores = self.vector_store.similarity_search_with_score(
-                query, k=k
-            )
+            # User chưa có memory nào hoặc index thuộc không gian vector khác
+            if self.metadata_store.count() == 0 or not self.embeddings_compatible():
+                return []
 
-            # Lọc bỏ document dummy init
-            filtered_docs = [
-                (doc, score)
-                for doc, score in docs_with_scores
-                if doc.metadata.get("type") != "init"
-            ]
+            with self.index_lock:
+                # Thế hệ mới từ process khác cũng làm đổi memory_version
+                self._refresh_if_stale()
+                version = self.memory_version
+            normalized = normalize_query(query)
+            cache_key = (normalized, k, cutoff, version)
+            results = self.retrieval_cache.get(cache_key)
+            if results is not None:
+                return list(results)
 
-            return filtered_docs
+            results = self._search_by_vector(self.embed_query(query), k)
+            if cutoff:
+                results = cut_results(results, *self.cutoff_params())
+            self.retrieval_cache.set(cache_key, results)
+            return list(results)
         except Exception as e:
             print(f"Lỗi khi truy xuất memories với scores: {e}")
             return []
 
-    def get_memory_summary(self, query: str) -> str:
+    def retrieve_memories_batch(
+        self, queries: Sequence[str], k: int = MAX_RETRIEVED_MEMORIES, cutoff: bool = True
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Truy xuất memories cho nhiều query cùng lúc
+
+        Các query chưa có trong cache được embed trong một request và tìm
+        kiếm bằng một lần index.search trên ma trận (n, d), thay vì mỗi query
+        một lần embed và một lần search.
+
+        Args:
+            queries: Các câu hỏi hoặc nội dung cần tìm
+            k: Số lượng memories tối đa của mỗi query
+            cutoff: Bỏ các memories quá xa query (xem cutoff_params)
+
+        Returns:
+            Danh sách kết quả theo thứ tự query, mỗi kết quả là danh sách
+            tuple (document, score) như retrieve_memories_with_scores
+        """
+        ensure_event_loop()
+
+        try:
+            if self.metadata_store.count() == 0 or not self.embeddings_compatible():
+                return [[] for _ in queries]
+
+            with self.index_lock:
+                self._refresh_if_stale()
+                version = self.memory_version
+            cache_keys = [(normalize_query(query), k, cutoff, version) for query in queries]
+            batches = [self.retrieval_cache.get(key) for key in cache_keys]
+
+            pending = [i for i, results in enumerate(batches) if results is None]
+            if pending:
+                vectors = self.embed_queries([queries[i] for i in pending])
+                params = self.cutoff_params() if cutoff else (None, None)
+                for i, results in zip(pending, self._search_by_vectors(vectors, k)):
+                    results = cut_results(results, *params)
+                    batches[i] = results
+                    self.retrieval_cache.set(cache_keys[i], results)
+            return [list(results) for results in batches]
+        except Exception as e:
+            print(f"Lỗi khi truy xuất memories theo lô: {e}")
+            return [[] for _ in queries]
+
+    def get_memory_summary(
+        self,
+        query: str,
+        extra_queries: Sequence[str] = (),
+        k: int = MAX_RETRIEVED_MEMORIES,
+    ) -> str:
         """
         Tạo tóm tắt memories liên quan đến query
 
         Args:
             query: Câu hỏi hoặc chủ đề
+            extra_queries: Các query bổ sung (ví dụ câu trả lời gần nhất của AI),
+                được truy xuất cùng lô và gộp theo khoảng cách
+            k: Số lượng memories tối đa
 
         Returns:
             Chuỗi tóm tắt các memories liên quan
         """
-        memories = self.retrieve_memories(query)
+        if not extra_queries:
+            return format_memories(self.retrieve_memories(query, k=k))
+        batches = self.retrieve_memories_batch([query, *extra_queries], k=k)
+        return format_memories(merge_results(batches, k))
 
-        if not memories:
-            return "Không tìm thấy thông tin liên quan trong bộ nhớ."
+    def delete_memories(self, memory_ids: Iterable[str]) -> None:
+        """
+        Xóa các memories theo ID (ghi tombstone, index được dọn khi compaction)
 
-        summary_parts = []
-        for i, memory in enumerate(memories, 1):
-            memory_type = memory.metadata.get("type", "unknown")
-            content_preview = (
-                memory.page_content[:200] + "..."
-                if len(memory.page_content) > 200
-                else memory.page_content
-            )
+        Args:
+            memory_ids: Danh sách ID của document trong vector store
+        """
+        self.metadata_store.remove(list(memory_ids))
+        self._bump_version()
+        self._schedule_maintenance()
+
+    def delete_memories_where(self, **filters: Any) -> int:
+        """
+        Xóa các memories có metadata khớp với bộ lọc
+
+        Args:
+            **filters: Các cặp khóa = giá trị của metadata (ví dụ type="ai_message")
+
+        Returns:
+            Số memories đã xóa
+        """
+        memory_ids = self.metadata_store.find(**filters)
+        self.delete_memories(memory_ids)
+        return len(memory_ids)
 
-            summary_parts.append(f"{i}. [{memory_type}] {content_preview}")
+    def expire_memories(self, now: Optional[datetime] = None) -> int:
+        """
+        Xóa các memories đã quá hạn theo MEMORY_TTL_DAYS của từng type
 
-        return "\n".join(summary_parts)
+        Args:
+            now: Thời điểm hiện tại (mặc định datetime.now())
+
+        Returns:
+            Số memories đã hết hạn
+        """
+        if not MEMORY_TTL_DAYS:
+            return 0
+        now = now or datetime.now()
+        expired = []
+        for memory_id, metadata in self.metadata_store.items():
+            ttl_days = MEMORY_TTL_DAYS.get(metadata.get("type"))
+            if not ttl_days:
+                continue
+            try:
+                # Memory được nhắc lại (chống trùng lặp) tính từ lần gặp gần nhất
+                created_at = datetime.fromisoformat(
+                    metadata.get("last_seen") or metadata["timestamp"]
+                )
+            except (KeyError, TypeError, ValueError):
+                continue
+            if now - created_at > timedelta(days=ttl_days):
+                expired.append(memory_id)
+
+        if expired:
+            self.metadata_store.remove(expired)
+            self._bump_version()
+        return len(expired)
+
+    def tombstone_ratio(self) -> float:
+        """Tỷ lệ vector trong index đã bị xóa nhưng chưa được compaction"""
+        with self.index_lock:
+            ntotal = self.vector_store.index.ntotal
+            if not ntotal:
+                return 0.0
+            live = self.metadata_store.count() + len(self.uncommitted_ids)
+            return max(ntotal - live, 0) / ntotal
+
+    def compact(self) -> int:
+        """
+        Xóa hẳn các tombstone khỏi FAISS index và ghi lại log metadata
+
+        Dùng remove_ids của index hiện có nên không phải embed lại memory nào.
+
+        Returns:
+            Số vector đã xóa khỏi index
+        """
+        with file_lock(self.vector_store_path), self.index_lock:
+            self._refresh_if_stale()
+            index_ids = list(self.vector_store.index_to_docstore_id.values())
+            live_ids = self.metadata_store.filter_existing(index_ids)
+            live_ids |= self.uncommitted_ids
+            dead_ids = [doc_id for doc_id in index_ids if doc_id not in live_ids]
+            if dead_ids:
+                self.vector_store.delete(dead_ids)
+                self._save_vector_store()
+
+        if self.metadata_store.garbage_ratio() > VECTOR_COMPACTION_THRESHOLD:
+            self.metadata_store.compact()
+        return len(dead_ids)
+
+    def tier_documents(self, now: Optional[datetime] = None) -> int:
+        """
+        Chuyển nội dung các documents cũ sang cold tier theo VECTOR_HOT_DOCS
+        và COLD_TIER_AFTER_DAYS (vector vẫn nằm trong index nên vẫn tìm được)
+
+        Args:
+            now: Thời điểm hiện tại (mặc định datetime.now())
+
+        Returns:
+            Số documents đã chuyển
+        """
+        if VECTOR_HOT_DOCS <= 0 and COLD_TIER_AFTER_DAYS <= 0:
+            return 0
+        cutoff = ((now or datetime.now()) - timedelta(days=COLD_TIER_AFTER_DAYS)).isoformat()
+        with file_lock(self.vector_store_path), self.index_lock:
+            self._refresh_if_stale()
+            docstore = self.vector_store.docstore
+            # index_to_docstore_id theo thứ tự thêm vào: cũ nhất trước
+            hot_ids = [
+                doc_id
+                for doc_id in self.vector_store.index_to_docstore_id.values()
+                if docstore.is_hot(doc_id)
+            ]
+            evicted = set()
+            if VECTOR_HOT_DOCS > 0:
+                evicted.update(hot_ids[: max(len(hot_ids) - VECTOR_HOT_DOCS, 0)])
+            if COLD_TIER_AFTER_DAYS > 0:
+                for doc_id in hot_ids:
+                    metadata = docstore.search(doc_id).metadata
+                    last_seen = metadata.get("last_seen") or metadata.get("timestamp")
+                    if last_seen and last_seen < cutoff:
+                        evicted.add(doc_id)
+
+            moved = docstore.evict([doc_id for doc_id in hot_ids if doc_id in evicted])
+            if moved:
+                self._save_vector_store()
+        return moved
+
+    def run_maintenance(self) -> Dict[str, int]:
+        """
+        Dọn dẹp định kỳ: xóa memories hết hạn, compaction nếu cần rồi chuyển
+        documents cũ sang cold tier
+
+        Returns:
+            Số memories hết hạn, số vector đã xóa khỏi index và số documents
+            đã chuyển sang cold tier
+        """
+        self.last_maintenance = time.time()
+        self.flush_pending_writes()
+        expired = self.expire_memories()
+        compacted = 0
+        if self.tombstone_ratio() > VECTOR_COMPACTION_THRESHOLD:
+            compacted = self.compact()
+        tiered = self.tier_documents()
+        return {"expired": expired, "compacted": compacted, "tiered": tiered}
+
+    def _schedule_maintenance(self) -> None:
+        """Chạy dọn dẹp ở thread nền, tối đa một lần mỗi chu kỳ"""
+        if time.time() - self.last_maintenance < VECTOR_MAINTENANCE_INTERVAL_SECONDS:
+            if self.tombstone_ratio() <= VECTOR_COMPACTION_THRESHOLD:
+                return
+        if self.maintenance_thread is not None and self.maintenance_thread.is_alive():
+            return
+
+        def run():
+            try:
+                self.run_maintenance()
+            except Exception as e:
+                print(f"Lỗi khi dọn dẹp vector store: {e}")
+
+        self.last_maintenance = time.time()
+        self.maintenance_thread = threading.Thread(target=run, daemon=True)
+        self.maintenance_thread.start()
+
+    def wait_for_maintenance(self) -> None:
+        """Chờ job dọn dẹp nền (nếu có) chạy xong"""
+        if self.maintenance_thread is not None:
+            self.maintenance_thread.join()
 
     def clear_memories(self) -> None:
         """Xóa tất cả memories"""
+        self.wait_for_maintenance()
         try:
-            # Tạo lại vector store với document dummy
-            dummy_doc = Document(
-                page_content="Khởi tạo vector store",
-                metadata={"user_id": self.user_id, "type": "init"},
-            )
-            self.vector_store = FAISS.from_documents([dummy_doc], self.embeddings)
-            self._save_vector_store()
+            with file_lock(self.vector_store_path), self.index_lock:
+                # Tạo lại vector store rỗng
+                self._reset_vector_store()
+                self._save_vector_store()
+                self.cold_docs.clear()
 
-            # Xóa metadata
-            self._save_metadata({})
+                # Xóa metadata và hàng đợi ghi
+                self.metadata_store.clear()
+                self.pending_writes.clear()
+                self._bump_version()
 
         except Exception as e:
             print(f"Lỗi khi xóa memories: {e}")
@@ -257,12 +1078,131 @@ class VectorStoreMemory(BaseMemory):
         """Xóa tất cả memories (required by BaseMemory)"""
         self.clear_memories()
 
+    def flush(self) -> None:
+        """Ghi vector store xuống đĩa"""
+        self.wait_for_maintenance()
+        with file_lock(self.vector_store_path), self.index_lock:
+            self._save_vector_store()
+
+    def iter_embedded_memories(
+        self, batch_size: int = 1000
+    ) -> Iterator[Tuple[np.ndarray, List[Dict[str, Any]]]]:
+        """
+        Duyệt các memories còn tồn tại kèm vector theo lô (dùng cho export)
+
+        Giữ index_lock trong suốt quá trình duyệt để vị trí trong index không
+        bị compaction thay đổi; mỗi lần chỉ một lô vector được đọc ra RAM.
+
+        Args:
+            batch_size: Số vị trí trong index mỗi lô
+
+        Yields:
+            (ma trận float32 (n, d), danh sách {"id", "content", "metadata"})
+        """
+        with self.index_lock:
+            self._refresh_if_stale()
+            vector_store = self.vector_store
+            index = vector_store.index
+            for start in range(0, index.ntotal, batch_size):
+                end = min(start + batch_size, index.ntotal)
+                doc_ids = [vector_store.index_to_docstore_id[p] for p in range(start, end)]
+                live_ids = self.metadata_store.filter_existing(doc_ids)
+                if not live_ids:
+                    continue
+                # Index int8: lấy bản fp16 thay vì giải mã từ int8
+                if vector_store.rerank_vectors is not None:
+                    vectors = np.asarray(vector_store.rerank_vectors[start:end], dtype=np.float32)
+                else:
+                    vectors = index.reconstruct_n(start, end - start)
+
+                rows, records = [], []
+                for row, doc_id in enumerate(doc_ids):
+                    doc = vector_store.docstore.search(doc_id) if doc_id in live_ids else None
+                    if not isinstance(doc, Document):
+                        continue
+                    rows.append(row)
+                    records.append(
+                        {
+                            "id": doc_id,
+                            "content": doc.page_content,
+                            "metadata": self.metadata_store.get(doc_id) or doc.metadata,
+                        }
+                    )
+                if rows:
+                    yield vectors[rows], records
+
+    def import_embedded_memories(
+        self,
+        batches: Iterable[Tuple[np.ndarray, List[Dict[str, Any]]]],
+        embedder_id: Optional[str],
+    ) -> int:
+        """
+        Thêm các memories đã embed sẵn (từ import) mà không embed lại
+
+        Vector của embeddings khác không dùng chung được không gian vector nên
+        các memories đó được đưa vào hàng đợi ghi để embed lại sau. Index chỉ
+        được lưu một lần ở cuối.
+
+        Args:
+            batches: Các lô (ma trận float32 (n, d), danh sách {"id", "content", "metadata"})
+            embedder_id: ID embeddings đã tạo các vector
+
+        Returns:
+            Số memories đã thêm vào index (không tính memories vào hàng đợi)
+        """
+        if embedder_id != get_embedder_id(self.embeddings):
+            queued = 0
+            for _, records in batches:
+                for record in records:
+                    self.pending_writes.append(record["content"], record["metadata"])
+                    queued += 1
+            if queued:
+                print(
+                    f"Vector được tạo bởi {embedder_id}, {queued} memories "
+                    "được xếp hàng để embed lại"
+                )
+            return 0
+
+        added = 0
+        with file_lock(self.vector_store_path), self.index_lock:
+            self._refresh_if_stale()
+            for vectors, records in batches:
+                if self.vector_store.index.ntotal == 0 and (
+                    self.vector_store.index.d != vectors.shape[1]
+                    or not self.embeddings_compatible()
+                ):
+                    self._reset_vector_store(vectors.shape[1])
+                self.vector_store.add_embeddings(
+                    [(r["content"], v) for r, v in zip(records, vectors.tolist())],
+                    metadatas=[r["metadata"] for r in records],
+                    ids=[r["id"] for r in records],
+                )
+                with span("vector_metadata.write"):
+                    self.metadata_store.add_many((r["id"], r["metadata"]) for r in records)
+                added += len(records)
+            if added:
+                self._save_vector_store()
+                self._bump_version()
+        return added
+
+    def estimate_memory_bytes(self) -> int:
+        """
+        Ước lượng dung lượng RAM của index đang được tải
+
+        Returns:
+            Số bytes ước lượng (vector theo loại index cộng chi phí docstore trung bình,
+            documents ở cold tier chỉ còn ID trong RAM)
+        """
+        vector_store = self.vector_store
+        if vector_store is None:
+            return 0
+        docs = vector_store.docstore.stats()
+        return vector_store.memory_bytes() + docs["hot"] * 512 + docs["cold"] * 64
+
     def get_memories_count(self) -> int:
-        """Lấy số lượng memories (không tính document init)"""
+        """Lấy số lượng memories"""
         try:
-            # Đếm documents trong vector store
-            all_docs = self.vector_store.similarity_search("", k=1000)  # Lấy tất cả
-            return len([doc for doc in all_docs if doc.metadata.get("type") != "init"])
+            return self.metadata_store.count()
         except Exception:
             return 0
 
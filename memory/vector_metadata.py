@@ -0,0 +1,211 @@
+"""
+Metadata của các vector memories lưu trong file log JSON lines (chỉ append)
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from config import VECTOR_STORE_DIR
+
+from .storage import atomic_write_text, file_lock
+
+
+class JSONVectorMetadataStore:
+    """
+    Metadata của các vector memories, mỗi user_id có một file log riêng
+
+    Mỗi dòng của `{user_id}_metadata.jsonl` là một thao tác:
+    {"op": "add", "id": ..., "metadata": {...}} hoặc {"op": "del", "id": ...}.
+    Khóa là ID của document trong FAISS docstore nên log là nguồn dữ liệu
+    chuẩn cho việc đếm, lọc và xóa memories. Thêm hoặc xóa chỉ append một
+    dòng; trạng thái trong RAM được cập nhật bằng cách đọc phần log mới
+    (kể cả do process khác ghi).
+    """
+
+    def __init__(self, user_id: str):
+        """
+        Khởi tạo JSONVectorMetadataStore
+
+        Args:
+            user_id: ID của người dùng
+        """
+        self.user_id = user_id
+        self.file_path = VECTOR_STORE_DIR / f"{user_id}_metadata.jsonl"
+        # File metadata định dạng cũ (ghi lại toàn bộ mỗi lần thêm)
+        self.legacy_path = VECTOR_STORE_DIR / f"{user_id}_metadata.json"
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._log_lines = 0
+        self._lock = threading.RLock()
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        """Áp dụng một thao tác của log vào trạng thái trong RAM"""
+        if record["op"] == "add":
+            self._entries[record["id"]] = record["metadata"]
+        elif record["op"] == "del":
+            self._entries.pop(record["id"], None)
+        self._log_lines += 1
+
+    def _reset(self) -> None:
+        """Bỏ trạng thái trong RAM để đọc lại log từ đầu"""
+        self._entries, self._inode, self._offset, self._log_lines = {}, None, 0, 0
+
+    def _refresh(self) -> None:
+        """Đọc phần log mới kể từ lần đọc trước"""
+        with self._lock:
+            try:
+                stat = os.stat(self.file_path)
+            except OSError:
+                self._reset()
+                return
+            if stat.st_ino != self._inode:
+                # Log đã được ghi lại (clear/compact) hoặc mới được tạo
+                self._reset()
+                self._inode = stat.st_ino
+            if stat.st_size == self._offset:
+                return
+
+            with open(self.file_path, "rb") as f:
+                f.seek(self._offset)
+                for line in f:
+                    # Bỏ qua dòng cuối chưa ghi xong
+                    if not line.endswith(b"\n"):
+                        break
+                    self._offset += len(line)
+                    if line.strip():
+                        self._apply(json.loads(line))
+
+    def _append(self, records: List[Dict[str, Any]]) -> None:
+        """Append các thao tác vào log"""
+        if not records:
+            return
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        with file_lock(self.file_path):
+            self._refresh()
+            with open(self.file_path, "a", encoding="utf-8") as f:
+                f.write(data)
+            self._refresh()
+
+    def add(self, memory_id: str, metadata: Dict[str, Any]) -> None:
+        """
+        Thêm metadata của một memory
+
+        Args:
+            memory_id: ID của document trong vector store
+            metadata: Metadata của memory
+        """
+        self.add_many([(memory_id, metadata)])
+
+    def add_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Thêm metadata của nhiều memories trong một lần ghi
+
+        Args:
+            items: Các cặp (memory_id, metadata)
+        """
+        self._append(
+            [{"op": "add", "id": memory_id, "metadata": m} for memory_id, m in items]
+        )
+
+    def remove(self, memory_ids: Iterable[str]) -> None:
+        """
+        Xóa metadata của các memories
+
+        Args:
+            memory_ids: Danh sách ID cần xóa
+        """
+        self._append([{"op": "del", "id": memory_id} for memory_id in memory_ids])
+
+    def get(self, memory_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy metadata của một memory"""
+        self._refresh()
+        return self._entries.get(memory_id)
+
+    def filter_existing(self, memory_ids: Iterable[str]) -> Set[str]:
+        """
+        Lọc các ID còn tồn tại (ID không có trong log là tombstone)
+
+        Args:
+            memory_ids: Danh sách ID cần kiểm tra
+
+        Returns:
+            Tập các ID còn tồn tại
+        """
+        with self._lock:
+            self._refresh()
+            return {memory_id for memory_id in memory_ids if memory_id in self._entries}
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Duyệt (memory_id, metadata) của các memories còn tồn tại"""
+        with self._lock:
+            self._refresh()
+            return iter(list(self._entries.items()))
+
+    def find(self, **filters: Any) -> List[str]:
+        """
+        Tìm ID các memories có metadata khớp với tất cả bộ lọc
+
+        Args:
+            **filters: Các cặp khóa = giá trị của metadata (ví dụ type="ai_message")
+
+        Returns:
+            Danh sách ID
+        """
+        return [
+            memory_id
+            for memory_id, metadata in self.items()
+            if all(metadata.get(key) == value for key, value in filters.items())
+        ]
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        """Lấy metadata của tất cả memories"""
+        with self._lock:
+            self._refresh()
+            return dict(self._entries)
+
+    def count(self) -> int:
+        """Số lượng memories"""
+        self._refresh()
+        return len(self._entries)
+
+    def needs_migration(self) -> bool:
+        """
+        Metadata cần được dựng lại từ FAISS docstore: còn file metadata định
+        dạng cũ hoặc log chưa từng được ghi (log rỗng vì đã xóa hết memories
+        thì không cần)
+        """
+        return self.legacy_path.exists() or not self.file_path.exists()
+
+    def garbage_ratio(self) -> float:
+        """Tỷ lệ dòng log không còn hiệu lực (dùng để quyết định compact)"""
+        self._refresh()
+        if not self._log_lines:
+            return 0.0
+        return 1 - len(self._entries) / self._log_lines
+
+    def compact(self) -> None:
+        """Ghi lại log chỉ với các memories còn tồn tại"""
+        with file_lock(self.file_path), self._lock:
+            self._refresh()
+            atomic_write_text(
+                self.file_path,
+                "".join(
+                    json.dumps(
+                        {"op": "add", "id": memory_id, "metadata": metadata},
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                    for memory_id, metadata in self._entries.items()
+                ),
+            )
+            self._refresh()
+
+    def clear(self) -> None:
+        """Xóa metadata của tất cả memories"""
+        with file_lock(self.file_path):
+            atomic_write_text(self.file_path, "")
+            self._refresh()
+            self.legacy_path.unlink(missing_ok=True)
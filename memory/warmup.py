@@ -0,0 +1,172 @@
+"""
+Làm nóng (warm-up) model và index trước khi nhận traffic
+
+Khởi tạo embeddings dùng chung, chạy một lần encode giả để model được tải
+(và tải về nếu cần) và cấp phát bộ nhớ, rồi tùy chọn nạp sẵn FAISS index của
+những người dùng hoạt động gần nhất (theo mtime của index) vào pool. Kết quả
+là một báo cáo readiness để server chỉ nhận request khi đã sẵn sàng.
+
+Ví dụ:
+    python -m memory.warmup --top-users 50
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    CHAT_HISTORY_DIR,
+    STORAGE_BACKEND,
+    VECTOR_STORE_DIR,
+    WARMUP_TOP_USERS,
+)
+
+from .manager_pool import MemoryManagerPool
+from .safe_embeddings import get_embedder_id
+
+WARMUP_TEXT = "Xin chào, đây là câu làm nóng model embeddings."
+
+
+def most_active_users(limit: int) -> List[str]:
+    """
+    Người dùng có vector index được ghi gần nhất
+
+    Args:
+        limit: Số người dùng tối đa
+
+    Returns:
+        Danh sách user_id, mới nhất trước
+    """
+    if limit <= 0:
+        return []
+    suffix = "_vectorstore"
+    ranked = []
+    for path in VECTOR_STORE_DIR.glob(f"*{suffix}"):
+        if path.name.startswith("."):
+            continue
+        try:
+            # lstat: symlink được thay ở mỗi lần lưu nên mtime của nó là lần ghi cuối
+            mtime = path.lstat().st_mtime
+        except OSError:
+            continue
+        ranked.append((mtime, path.name[: -len(suffix)]))
+    ranked.sort(reverse=True)
+    return [user_id for _, user_id in ranked[:limit]]
+
+
+def latest_session(user_id: str) -> str:
+    """
+    Phiên trò chuyện gần nhất của người dùng ("default" nếu không tìm thấy)
+
+    Args:
+        user_id: ID của người dùng
+    """
+    if STORAGE_BACKEND == "sqlite":
+        from .sqlite_store import get_database
+
+        rows = get_database().query(
+            "SELECT session_id FROM messages WHERE user_id = ? ORDER BY id DESC LIMIT 1",
+            (user_id,),
+        )
+        return rows[0][0] if rows else "default"
+
+    prefix, suffix = f"{user_id}_", "_history.json"
+    sessions: List[Tuple[float, str]] = []
+    for path in CHAT_HISTORY_DIR.glob(f"{prefix}*{suffix}"):
+        try:
+            sessions.append((path.stat().st_mtime, path.name[len(prefix) : -len(suffix)]))
+        except OSError:
+            continue
+    return max(sessions)[1] if sessions else "default"
+
+
+def _step(report: Dict[str, Any], name: str, func) -> Any:
+    """Chạy một bước warm-up, ghi thời gian và lỗi vào báo cáo"""
+    started = time.perf_counter()
+    entry: Dict[str, Any] = {"ok": True}
+    result = None
+    try:
+        result = func(entry)
+    except Exception as e:
+        entry["ok"] = False
+        entry["error"] = f"{type(e).__name__}: {e}"
+    entry["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    report["steps"][name] = entry
+    return result
+
+
+def warm_up(
+    pool: Optional[MemoryManagerPool] = None,
+    top_users: int = WARMUP_TOP_USERS,
+    users: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Làm nóng embeddings, LLM và index của các người dùng hoạt động nhiều nhất
+
+    Args:
+        pool: Pool cần làm nóng (mặc định tạo pool mới)
+        top_users: Số người dùng được nạp sẵn index (0 = không nạp)
+        users: Danh sách người dùng cần nạp, thay cho top_users (ví dụ các
+            người dùng được định tuyến tới một worker)
+
+    Returns:
+        Báo cáo readiness: {"ready", "seconds", "steps", "pool"}; "ready" chỉ
+        False khi embeddings không dùng được, lỗi nạp index từng người dùng
+        được ghi lại nhưng không chặn readiness
+    """
+    started = time.perf_counter()
+    report: Dict[str, Any] = {"steps": {}}
+    if pool is None:
+        pool = MemoryManagerPool()
+
+    def embeddings_step(entry: Dict[str, Any]) -> None:
+        vector = pool.embeddings.embed_query(WARMUP_TEXT)
+        entry["embedder_id"] = get_embedder_id(pool.embeddings)
+        entry["dimension"] = len(vector)
+
+    def llm_step(entry: Dict[str, Any]) -> None:
+        # Chỉ khởi tạo client (pool.llm đã được tạo), không tốn một lời gọi LLM
+        entry["llm"] = type(pool.llm).__name__ if pool.llm is not None else None
+
+    def indexes_step(entry: Dict[str, Any]) -> None:
+        loaded, failed = [], {}
+        for user_id in users if users is not None else most_active_users(top_users):
+            try:
+                pool.get(user_id, latest_session(user_id))
+                loaded.append(user_id)
+            except Exception as e:
+                failed[user_id] = f"{type(e).__name__}: {e}"
+        entry["loaded"] = loaded
+        if failed:
+            entry["failed"] = failed
+
+    _step(report, "embeddings", embeddings_step)
+    _step(report, "llm", llm_step)
+    _step(report, "indexes", indexes_step)
+
+    report["ready"] = report["steps"]["embeddings"]["ok"]
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    report["pool"] = {
+        "managers": len(pool),
+        "memory_mb": round(pool.memory_usage_bytes() / 1024 / 1024, 1),
+    }
+    return report
+
+
+def main():
+    """Entry point của CLI (thoát với mã 1 nếu chưa sẵn sàng)"""
+    parser = argparse.ArgumentParser(description="Làm nóng model và index")
+    parser.add_argument(
+        "--top-users", type=int, default=WARMUP_TOP_USERS, help="Số người dùng nạp sẵn index"
+    )
+    args = parser.parse_args()
+
+    report = warm_up(top_users=args.top_users)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    sys.exit(0 if report["ready"] else 1)
+
+
+if __name__ == "__main__":
+    main()
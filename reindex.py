@@ -0,0 +1,428 @@
+"""
+Công cụ offline: embed lại vector memories của tất cả người dùng
+
+Dùng khi đổi embedding model (ví dụ Google embedding-001 768 chiều và
+MiniLM 384 chiều không dùng chung được một index). Công cụ duyệt
+VECTOR_STORE_DIR, CHAT_HISTORY_DIR và ENTITIES_DIR để tìm người dùng, chia
+thành từng nhóm cho một process pool. Mỗi worker embed documents của cả nhóm
+theo các batch lớn, ghi index mới thành thế hệ mới bên cạnh index cũ rồi đổi
+symlink nguyên tử (người đọc luôn thấy index cũ hoặc index mới hoàn chỉnh).
+Tiến độ được ghi vào checkpoint sau mỗi nhóm nên có thể chạy tiếp khi bị ngắt.
+Khi chạy cho tất cả người dùng, các shard tri thức dùng chung (SHARED_MEMORY_DIR)
+cũng được embed lại; shard của embeddings cũ bị bỏ qua khi tìm kiếm.
+
+Ví dụ:
+    python reindex.py --embedder google --workers 8
+    python reindex.py --embedder sentence-transformers --from-history --users alice bob
+    VECTOR_INDEX_TYPE=int8 python reindex.py --embedder google   # Đổi sang index lượng tử hóa
+"""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import (
+    CHAT_HISTORY_DIR,
+    ENTITIES_DIR,
+    SHARED_MEMORY_DIR,
+    STORAGE_BACKEND,
+    VECTOR_STORE_DIR,
+)
+from memory import providers
+from memory.safe_embeddings import get_embedder_id
+from memory.storage import atomic_write_json, file_lock, read_json
+
+CHECKPOINT_PATH = VECTOR_STORE_DIR / ".reindex_checkpoint.json"
+
+# Embeddings của worker hiện tại (mỗi process tạo một lần)
+_worker_embeddings = None
+
+
+def create_embeddings(name: str):
+    """
+    Tạo embeddings cho việc reindex
+
+    Báo lỗi thay vì dùng sentence-transformers khi không khởi tạo được
+    Google embeddings, để không lẫn hai không gian vector trong một index.
+
+    Args:
+        name: Provider ("google", "sentence-transformers" hoặc "hashing")
+    """
+    embeddings = providers.create_embeddings(name)
+    if name == "google" and not embeddings.embedder_id.startswith("google:"):
+        raise RuntimeError("Không khởi tạo được Google embeddings")
+    if name == "sentence-transformers" and embeddings._get_model() is None:
+        raise RuntimeError("Không tải được model sentence-transformers")
+    return embeddings
+
+
+def _init_worker(embedder: str) -> None:
+    """Khởi tạo embeddings một lần cho mỗi worker process"""
+    global _worker_embeddings
+    _worker_embeddings = create_embeddings(embedder)
+
+
+def discover_users() -> List[str]:
+    """
+    Tìm tất cả người dùng có dữ liệu trong các thư mục lưu trữ
+
+    Returns:
+        Danh sách user_id đã sắp xếp
+    """
+    users = set()
+    for path in VECTOR_STORE_DIR.glob("*_vectorstore"):
+        users.add(path.name[: -len("_vectorstore")])
+    for path in VECTOR_STORE_DIR.glob("*_metadata.json*"):
+        users.add(path.name.rsplit("_metadata.json", 1)[0])
+    for path in ENTITIES_DIR.glob("*_entities.json"):
+        users.add(path.name[: -len("_entities.json")])
+
+    # Tên file history là {user_id}_{session_id}_history.json nên chỉ dùng
+    # phần trước dấu "_" đầu tiên khi không khớp người dùng nào đã biết
+    known = sorted(users, key=len, reverse=True)
+    for path in CHAT_HISTORY_DIR.glob("*_history.json"):
+        if not any(path.name.startswith(f"{user_id}_") for user_id in known):
+            users.add(path.name.split("_", 1)[0])
+    # Bỏ qua file khóa, file tạm và thư mục thế hệ (bắt đầu bằng ".")
+    return sorted(user_id for user_id in users if user_id and not user_id.startswith("."))
+
+
+def _metadata_store(user_id: str):
+    """Metadata store của người dùng theo STORAGE_BACKEND"""
+    if STORAGE_BACKEND == "sqlite":
+        from memory.sqlite_store import SQLiteVectorMetadataStore
+
+        return SQLiteVectorMetadataStore(user_id)
+
+    from memory.vector_metadata import JSONVectorMetadataStore
+
+    return JSONVectorMetadataStore(user_id)
+
+
+def _history_sessions(user_id: str) -> List[Any]:
+    """Các chat history của người dùng (tất cả sessions)"""
+    if STORAGE_BACKEND == "sqlite":
+        from memory.sqlite_store import SQLiteChatMessageHistory, get_database
+
+        database = get_database()
+        rows = database.query(
+            "SELECT DISTINCT session_id FROM messages WHERE user_id = ?", (user_id,)
+        )
+        return [SQLiteChatMessageHistory(user_id, row[0], database) for row in rows]
+
+    from memory.json_chat_history import JSONChatMessageHistory
+
+    prefix, suffix = f"{user_id}_", "_history.json"
+    return [
+        JSONChatMessageHistory(user_id, path.name[len(prefix) : -len(suffix)])
+        for path in sorted(CHAT_HISTORY_DIR.glob(f"{prefix}*{suffix}"))
+    ]
+
+
+def _history_documents(user_id: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Dựng lại documents từ chat history và entities (giống MemoryManager)
+
+    Returns:
+        Danh sách (nội dung, metadata)
+    """
+    from langchain.schema.messages import AIMessage
+
+    timestamp = datetime.now().isoformat(timespec="seconds")
+    documents = []
+    for history in _history_sessions(user_id):
+        for message in history.get_archived_messages() + history.messages:
+            if isinstance(message, AIMessage):
+                content, memory_type = f"AI trả lời: {message.content}", "ai_message"
+            else:
+                content, memory_type = (
+                    f"Người dùng nói: {message.content}",
+                    "user_message",
+                )
+            documents.append(
+                (
+                    content,
+                    {"user_id": user_id, "type": memory_type, "timestamp": timestamp},
+                )
+            )
+
+    if STORAGE_BACKEND == "sqlite":
+        from memory.sqlite_store import SQLiteEntityStore
+
+        entities = SQLiteEntityStore(user_id).get_all_entities()
+    else:
+        entities = read_json(ENTITIES_DIR / f"{user_id}_entities.json", {})
+    for entity, facts in entities.items():
+        for fact in facts:
+            documents.append(
+                (
+                    f"Thông tin về {entity}: {fact}",
+                    {
+                        "user_id": user_id,
+                        "type": "entity_fact",
+                        "timestamp": timestamp,
+                        "entity": entity,
+                    },
+                )
+            )
+    return documents
+
+
+def _embed(texts: List[str], batch_size: int) -> List[List[float]]:
+    """Embed texts theo các batch lớn"""
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start : start + batch_size]
+        vectors.extend(_worker_embeddings.embed_documents(batch))
+    return vectors
+
+
+def reindex_users(
+    user_ids: List[str], from_history: bool = False, batch_size: int = 256
+) -> Dict[str, int]:
+    """
+    Embed lại vector memories của một nhóm người dùng (chạy trong worker)
+
+    Documents của cả nhóm được embed chung theo batch. Mặc định nguồn là
+    các documents còn tồn tại trong index hiện tại (giữ nguyên ID nên
+    metadata không đổi, tombstone bị loại bỏ luôn); với from_history,
+    documents được dựng lại từ chat history và entities.
+
+    Args:
+        user_ids: Các người dùng cần reindex
+        from_history: Dựng lại từ chat history thay vì index hiện tại
+        batch_size: Số texts mỗi lần gọi embeddings
+
+    Returns:
+        Số documents đã reindex của mỗi người dùng
+    """
+    from memory.vector_memory import VectorStoreMemory
+
+    plans = []
+    for user_id in user_ids:
+        vector_memory = VectorStoreMemory(
+            user_id,
+            embeddings=_worker_embeddings,
+            metadata_store=_metadata_store(user_id),
+        )
+        if from_history:
+            documents = [
+                (None, content, metadata)
+                for content, metadata in _history_documents(user_id)
+            ]
+        else:
+            store = vector_memory.vector_store
+            live_ids = vector_memory.metadata_store.filter_existing(
+                store.index_to_docstore_id.values()
+            )
+            documents = []
+            for doc_id in store.index_to_docstore_id.values():
+                doc = store.docstore.search(doc_id)
+                if doc_id in live_ids and not isinstance(doc, str):
+                    documents.append((doc_id, doc.page_content, doc.metadata))
+        plans.append((vector_memory, documents))
+
+    texts = [content for _, documents in plans for _, content, _ in documents]
+    vectors = iter(_embed(texts, batch_size))
+
+    results = {}
+    for vector_memory, documents in plans:
+        user_vectors = [next(vectors) for _ in documents]
+        _swap_index(vector_memory, documents, user_vectors, from_history, batch_size)
+        results[vector_memory.user_id] = len(documents)
+    return results
+
+
+def _swap_index(
+    vector_memory: Any,
+    documents: List[Tuple[Optional[str], str, Dict[str, Any]]],
+    vectors: List[List[float]],
+    from_history: bool,
+    batch_size: int,
+) -> None:
+    """
+    Ghi index mới thành thế hệ mới rồi đổi symlink nguyên tử
+
+    Memories được thêm bởi process khác trong lúc đang embed (có trong index
+    hiện tại nhưng không có trong snapshot) được embed bổ sung khi giữ khóa
+    nên không bị mất.
+    """
+    dimension = len(vectors[0]) if vectors else None
+    new_store = vector_memory._create_vector_store(dimension)
+    if documents:
+        new_store.add_embeddings(
+            [(content, vector) for (_, content, _), vector in zip(documents, vectors)],
+            metadatas=[metadata for _, _, metadata in documents],
+            ids=[doc_id for doc_id, _, _ in documents] if not from_history else None,
+        )
+
+    with file_lock(vector_memory.vector_store_path), vector_memory.index_lock:
+        vector_memory._refresh_if_stale()
+        if not from_history:
+            current = vector_memory.vector_store
+            snapshot_ids = {doc_id for doc_id, _, _ in documents}
+            late_ids = [
+                doc_id
+                for doc_id in vector_memory.metadata_store.filter_existing(
+                    current.index_to_docstore_id.values()
+                )
+                if doc_id not in snapshot_ids
+            ]
+            late_docs = [current.docstore.search(doc_id) for doc_id in late_ids]
+            if late_docs:
+                late_vectors = _embed([doc.page_content for doc in late_docs], batch_size)
+                new_store.add_embeddings(
+                    [(doc.page_content, v) for doc, v in zip(late_docs, late_vectors)],
+                    metadatas=[doc.metadata for doc in late_docs],
+                    ids=late_ids,
+                )
+
+        vector_memory.vector_store = new_store
+        vector_memory.index_embedder_id = get_embedder_id(_worker_embeddings)
+        vector_memory._save_vector_store()
+
+        if from_history:
+            vector_memory.metadata_store.clear()
+            vector_memory.metadata_store.add_many(
+                (doc_id, metadata)
+                for doc_id, (_, _, metadata) in zip(
+                    new_store.index_to_docstore_id.values(), documents
+                )
+            )
+            # Chat history đã chứa các memories đang chờ
+            vector_memory.pending_writes.clear()
+
+    # Memories xếp hàng trong lúc index cũ không dùng được
+    vector_memory.flush_pending_writes()
+
+
+def _load_checkpoint(embedder: str) -> List[str]:
+    """Danh sách người dùng đã reindex xong với embedder này"""
+    checkpoint = read_json(CHECKPOINT_PATH, {})
+    if checkpoint.get("embedder") != embedder:
+        return []
+    return checkpoint.get("done", [])
+
+
+def _save_checkpoint(embedder: str, done: Iterable[str]) -> None:
+    """Ghi checkpoint (nguyên tử)"""
+    atomic_write_json(
+        CHECKPOINT_PATH, {"embedder": embedder, "done": sorted(done)}, indent=None
+    )
+
+
+def run(
+    embedder: str,
+    users: Optional[List[str]] = None,
+    workers: int = 4,
+    group_size: int = 50,
+    batch_size: int = 256,
+    from_history: bool = False,
+    restart: bool = False,
+) -> Dict[str, Any]:
+    """
+    Reindex tất cả (hoặc một số) người dùng bằng process pool
+
+    Args:
+        embedder: Provider của embeddings mới
+        users: Danh sách user_id (mặc định tất cả người dùng tìm thấy, kèm
+            tri thức dùng chung)
+        workers: Số worker process
+        group_size: Số người dùng mỗi task của worker
+        batch_size: Số texts mỗi lần gọi embeddings
+        from_history: Dựng lại từ chat history và entities
+        restart: Bỏ qua checkpoint và làm lại từ đầu
+
+    Returns:
+        Thống kê: số người dùng, số documents, người dùng lỗi, thời gian
+    """
+    started = time.time()
+    shared = not users and SHARED_MEMORY_DIR.exists()
+    users = users or discover_users()
+    done = set() if restart else set(_load_checkpoint(embedder))
+    pending = [user_id for user_id in users if user_id not in done]
+    groups = [pending[i : i + group_size] for i in range(0, len(pending), group_size)]
+
+    documents, failed = 0, []
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(embedder,)
+    ) as executor:
+        futures = {
+            executor.submit(reindex_users, group, from_history, batch_size): group
+            for group in groups
+        }
+        for future in as_completed(futures):
+            group = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                print(f"Lỗi khi reindex nhóm {group[0]}..{group[-1]}: {e}")
+                failed.extend(group)
+                continue
+            documents += sum(results.values())
+            done.update(results)
+            _save_checkpoint(embedder, done)
+            print(f"Đã reindex {len(done)}/{len(users)} người dùng")
+
+    shared_documents = 0
+    if shared:
+        from memory.shared_memory import SharedKnowledgeIndex
+
+        index = SharedKnowledgeIndex(create_embeddings(embedder), SHARED_MEMORY_DIR)
+        shared_documents = index.reindex(batch_size)
+
+    if not failed:
+        CHECKPOINT_PATH.unlink(missing_ok=True)
+    return {
+        "users": len(pending) - len(failed),
+        "skipped": len(users) - len(pending),
+        "documents": documents,
+        "shared_documents": shared_documents,
+        "failed": failed,
+        "seconds": round(time.time() - started, 2),
+    }
+
+
+def main():
+    """Entry point của CLI"""
+    parser = argparse.ArgumentParser(description="Embed lại vector memories")
+    parser.add_argument(
+        "--embedder", choices=["google", "sentence-transformers", "hashing"], required=True
+    )
+    parser.add_argument("--users", nargs="*", help="Chỉ reindex các user_id này")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--group-size", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument(
+        "--from-history",
+        action="store_true",
+        help="Dựng lại từ chat history và entities thay vì index hiện tại",
+    )
+    parser.add_argument(
+        "--restart", action="store_true", help="Bỏ qua checkpoint của lần chạy trước"
+    )
+    args = parser.parse_args()
+
+    stats = run(
+        embedder=args.embedder,
+        users=args.users,
+        workers=args.workers,
+        group_size=args.group_size,
+        batch_size=args.batch_size,
+        from_history=args.from_history,
+        restart=args.restart,
+    )
+    print(
+        f"✅ Reindex {stats['users']} người dùng ({stats['documents']} documents) "
+        f"trong {stats['seconds']}s, bỏ qua {stats['skipped']}"
+    )
+    if stats["shared_documents"]:
+        print(f"✅ Reindex {stats['shared_documents']} documents tri thức dùng chung")
+    if stats["failed"]:
+        print(f"❌ Lỗi: {', '.join(stats['failed'])} (chạy lại để tiếp tục)")
+
+
+if __name__ == "__main__":
+    main()
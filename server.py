@@ -0,0 +1,555 @@
+"""
+ASGI service cho Memory Chatbot
+
+Endpoints:
+    POST /chat            {"user_id", "session_id"?, "message"} -> {"response"}
+    POST /chat/stream     Như /chat, trả phản hồi theo từng phần (Server-Sent Events)
+    GET  /memory/search   ?user_id=&q=&k= -> {"results": [{"content", "metadata", "score"}]}
+    GET  /memory/summary  ?user_id=&session_id= -> tóm tắt memory của người dùng
+    GET  /healthz         Readiness của các worker (503 cho tới khi warm-up xong)
+
+Mỗi người dùng luôn được định tuyến tới cùng một worker process (hash của
+user_id) để FAISS index của họ chỉ được tải và giữ nóng ở một nơi. Trước khi
+tới worker, request phải qua hai giới hạn: số request chạy đồng thời của một
+người dùng (phần vượt được xếp hàng, hàng đợi đầy trả 429) và số request đang
+chờ/chạy ở worker (đầy trả 503), cả hai kèm Retry-After.
+
+Service chỉ chạy trong một process ASGI (không dùng --workers của uvicorn), số
+worker xử lý đặt bằng SERVER_WORKERS.
+
+Chạy:
+    uvicorn server:app --port 8000
+    LLM_PROVIDER=stub EMBEDDING_PROVIDER=hashing uvicorn server:app  # offline
+    python -m benchmarks.load --users 20 --requests 10
+"""
+
+import asyncio
+import itertools
+import json
+import multiprocessing
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from config import (
+    MAX_RETRIEVED_MEMORIES,
+    SERVER_REQUEST_TIMEOUT_SECONDS,
+    SERVER_USER_CONCURRENCY,
+    SERVER_USER_QUEUE,
+    SERVER_WORKER_QUEUE,
+    SERVER_WORKER_THREADS,
+    SERVER_WORKERS,
+    WARMUP_TOP_USERS,
+)
+
+
+def worker_for(user_id: str, workers: int) -> int:
+    """
+    Worker phụ trách một người dùng (ổn định giữa các lần khởi động)
+
+    Args:
+        user_id: ID của người dùng
+        workers: Tổng số worker
+    """
+    # Không dùng hash() vì giá trị thay đổi theo PYTHONHASHSEED của từng process
+    return zlib.crc32(user_id.encode("utf-8")) % workers
+
+
+# ---------------------------------------------------------------------------
+# Phía worker process
+# ---------------------------------------------------------------------------
+
+
+def _run_job(pool: Any, outbox: Any, job_id: int, op: str, payload: Dict[str, Any]) -> None:
+    """Xử lý một request trong worker, gửi kết quả (và các phần stream) về outbox"""
+    from chatbot import MemoryChatbot
+
+    try:
+        user_id = payload["user_id"]
+        session_id = payload.get("session_id") or "default"
+        manager = pool.get(user_id, session_id)
+
+        if op in ("chat", "chat_stream"):
+            chatbot = MemoryChatbot(
+                user_id, session_id, llm=pool.llm, memory_manager=manager
+            )
+            if op == "chat":
+                result = {"response": chatbot.chat(payload["message"])}
+            else:
+                parts = []
+                for chunk in chatbot.chat_stream(payload["message"]):
+                    parts.append(chunk)
+                    outbox.put(("chunk", job_id, chunk))
+                result = {"response": "".join(parts)}
+        elif op == "search":
+            matches = manager.vector_memory.retrieve_memories_with_scores(
+                payload["query"], payload.get("k") or MAX_RETRIEVED_MEMORIES
+            )
+            result = {
+                "results": [
+                    {"content": doc.page_content, "metadata": doc.metadata, "score": float(score)}
+                    for doc, score in matches
+                ]
+            }
+        elif op == "summary":
+            result = manager.get_memory_summary()
+        else:
+            raise ValueError(f"Thao tác không hợp lệ: {op}")
+
+        outbox.put(("result", job_id, result))
+    except Exception as e:
+        print(f"Lỗi khi xử lý {op}: {e}")
+        outbox.put(("error", job_id, f"{type(e).__name__}: {e}"))
+
+
+def _worker_main(index: int, inbox: Any, outbox: Any, warm_users: List[str]) -> None:
+    """Vòng lặp của một worker process: một MemoryManagerPool dùng chung cho các thread"""
+    from memory.manager_pool import MemoryManagerPool
+    from memory.providers import create_llm
+    from memory.warmup import warm_up
+
+    pool = MemoryManagerPool(llm=create_llm())
+    outbox.put(("ready", index, warm_up(pool, users=warm_users)))
+
+    executor = ThreadPoolExecutor(SERVER_WORKER_THREADS, thread_name_prefix=f"worker-{index}")
+    while True:
+        job = inbox.get()
+        if job is None:
+            break
+        executor.submit(_run_job, pool, outbox, *job)
+    executor.shutdown(wait=True)
+    pool.flush_all()
+
+
+# ---------------------------------------------------------------------------
+# Phía ASGI process
+# ---------------------------------------------------------------------------
+
+
+class Overloaded(Exception):
+    """Request bị từ chối do quá tải (429 hoặc 503)"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class WorkerError(Exception):
+    """Worker báo lỗi khi xử lý request"""
+
+
+class _UserSlot:
+    """Giới hạn đồng thời của một người dùng"""
+
+    __slots__ = ("semaphore", "pending")
+
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.pending = 0  # Đang chạy + đang xếp hàng
+
+
+class _Lease:
+    """Lượt xử lý đã giành được ở một worker"""
+
+    __slots__ = ("worker", "job")
+
+    def __init__(self, worker: int):
+        self.worker = worker
+        self.job: Optional[int] = None  # Job đã gửi tới worker nhưng chưa xong
+
+
+class WorkerPool:
+    """
+    Các worker process với định tuyến theo người dùng và backpressure
+
+    Request được gửi tới worker qua một multiprocessing.Queue riêng; kết quả
+    của mọi worker về chung một queue, được một thread đọc và chuyển vào
+    event loop theo job id.
+    """
+
+    def __init__(
+        self,
+        workers: int = SERVER_WORKERS,
+        user_concurrency: int = SERVER_USER_CONCURRENCY,
+        user_queue: int = SERVER_USER_QUEUE,
+        worker_queue: int = SERVER_WORKER_QUEUE,
+        timeout: float = SERVER_REQUEST_TIMEOUT_SECONDS,
+    ):
+        """
+        Khởi tạo WorkerPool
+
+        Args:
+            workers: Số worker process
+            user_concurrency: Số request chạy đồng thời của một người dùng
+            user_queue: Số request xếp hàng tối đa của một người dùng
+            worker_queue: Số request tối đa đang chờ/chạy ở một worker
+            timeout: Thời gian chờ kết quả tối đa của một request (giây)
+        """
+        self.workers = max(workers, 1)
+        self.user_concurrency = max(user_concurrency, 1)
+        self.user_queue = user_queue
+        self.worker_queue = worker_queue
+        self.timeout = timeout
+
+        self.ready: Dict[int, Dict[str, Any]] = {}
+        self._processes: List[Any] = []
+        self._inboxes: List[Any] = []
+        self._outbox = None
+        self._reader: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._jobs: Dict[int, Tuple[asyncio.Queue, _Lease]] = {}
+        # Job mà caller đã bỏ (timeout, client ngắt kết nối): lượt xử lý chỉ được
+        # trả lại khi worker báo xong job đó
+        self._abandoned: Dict[int, Callable[[], None]] = {}
+        self._job_ids = itertools.count()
+        self._users: Dict[str, _UserSlot] = {}
+        self._inflight = [0] * self.workers
+        self.stats = {"requests": 0, "rejected_user": 0, "rejected_worker": 0, "timeouts": 0}
+
+    def start(self) -> None:
+        """Khởi động các worker process (gọi trong event loop của server)"""
+        from memory.warmup import most_active_users
+
+        self._loop = asyncio.get_running_loop()
+        # spawn: không fork một process đang có thread (FAISS, tracing, executor)
+        context = multiprocessing.get_context("spawn")
+        self._outbox = context.Queue()
+        active = most_active_users(WARMUP_TOP_USERS)
+        for index in range(self.workers):
+            inbox = context.Queue()
+            warm_users = [u for u in active if worker_for(u, self.workers) == index]
+            process = context.Process(
+                target=_worker_main,
+                args=(index, inbox, self._outbox, warm_users),
+                name=f"memory-worker-{index}",
+                daemon=True,
+            )
+            process.start()
+            self._inboxes.append(inbox)
+            self._processes.append(process)
+
+        self._reader = threading.Thread(target=self._read_outbox, name="worker-outbox", daemon=True)
+        self._reader.start()
+
+    def stop(self, timeout: float = 30) -> None:
+        """Dừng các worker sau khi chúng xử lý xong request đang chạy và flush memory"""
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        if self._outbox is not None:
+            self._outbox.put(None)
+        if self._reader is not None:
+            self._reader.join(timeout)
+        self._processes, self._inboxes = [], []
+
+    def _read_outbox(self) -> None:
+        """Thread chuyển kết quả từ các worker vào event loop"""
+        while True:
+            message = self._outbox.get()
+            if message is None:
+                return
+            if message[0] == "ready":
+                self.ready[message[1]] = message[2]
+                continue
+            self._loop.call_soon_threadsafe(self._dispatch, message)
+
+    def _dispatch(self, message: Tuple[str, int, Any]) -> None:
+        kind, job_id = message[0], message[1]
+        job = self._jobs.get(job_id)
+        if job is not None:  # Request đã timeout thì bỏ qua
+            queue, lease = job
+            queue.put_nowait(message)
+            if kind != "chunk":
+                lease.job = None  # Worker đã xong, caller có thể trả lượt ngay
+        if kind != "chunk":
+            release = self._abandoned.pop(job_id, None)
+            if release is not None:
+                release()
+
+    def health(self) -> Dict[str, Any]:
+        """Trạng thái readiness và tải của các worker"""
+        workers = []
+        for index, process in enumerate(self._processes):
+            report = self.ready.get(index)
+            workers.append(
+                {
+                    "index": index,
+                    "alive": process.is_alive(),
+                    "ready": bool(report and report["ready"]),
+                    "inflight": self._inflight[index],
+                    "warmup": report,
+                }
+            )
+        return {
+            "ready": bool(workers) and all(w["alive"] and w["ready"] for w in workers),
+            "workers": workers,
+            "active_users": len(self._users),
+            "stats": self.stats,
+        }
+
+    @asynccontextmanager
+    async def slot(self, user_id: str) -> AsyncIterator[_Lease]:
+        """
+        Giành một lượt xử lý cho người dùng, chờ nếu người dùng đang có request chạy
+
+        Nếu caller thoát khi job vẫn đang xếp hàng/chạy ở worker, lượt xử lý
+        (semaphore của người dùng và chỗ trong hàng đợi của worker) được giữ
+        tới khi worker báo kết quả hoặc lỗi của job đó.
+
+        Raises:
+            Overloaded: Hàng đợi của người dùng hoặc của worker đã đầy
+
+        Yields:
+            Lượt xử lý, chứa index của worker phụ trách người dùng
+        """
+        worker = worker_for(user_id, self.workers)
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = _UserSlot(self.user_concurrency)
+        if user.pending >= self.user_concurrency + self.user_queue:
+            self.stats["rejected_user"] += 1
+            raise Overloaded(429, "Quá nhiều request đồng thời của người dùng này")
+        if self._inflight[worker] >= self.worker_queue:
+            self.stats["rejected_worker"] += 1
+            raise Overloaded(503, "Server đang quá tải, vui lòng thử lại sau")
+
+        self.stats["requests"] += 1
+        user.pending += 1
+        self._inflight[worker] += 1
+
+        def release(acquired: bool = True) -> None:
+            if acquired:
+                user.semaphore.release()
+            self._inflight[worker] -= 1
+            user.pending -= 1
+            if user.pending == 0:
+                self._users.pop(user_id, None)
+
+        try:
+            await user.semaphore.acquire()
+        except BaseException:
+            release(acquired=False)
+            raise
+        lease = _Lease(worker)
+        try:
+            yield lease
+        finally:
+            if lease.job is None:
+                release()
+            else:
+                self._abandoned[lease.job] = release
+
+    async def run(
+        self, lease: _Lease, op: str, payload: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Gửi request tới worker và nhận lần lượt các message ("chunk" hoặc "result")
+
+        Raises:
+            WorkerError: Worker báo lỗi
+            asyncio.TimeoutError: Không nhận được message trong thời gian timeout
+        """
+        job_id = next(self._job_ids)
+        queue: asyncio.Queue = asyncio.Queue()
+        self._jobs[job_id] = (queue, lease)
+        try:
+            self._inboxes[lease.worker].put((job_id, op, payload))
+            lease.job = job_id
+            while True:
+                try:
+                    kind, _, value = await asyncio.wait_for(queue.get(), self.timeout)
+                except asyncio.TimeoutError:
+                    self.stats["timeouts"] += 1
+                    raise
+                if kind == "error":
+                    raise WorkerError(value)
+                yield kind, value
+                if kind == "result":
+                    return
+        finally:
+            self._jobs.pop(job_id, None)
+
+    async def call(self, user_id: str, op: str, payload: Dict[str, Any]) -> Any:
+        """Xử lý một request không stream và trả về kết quả"""
+        async with self.slot(user_id) as lease:
+            async for kind, value in self.run(lease, op, payload):
+                if kind == "result":
+                    return value
+
+
+class BadRequest(Exception):
+    """Request không hợp lệ (400)"""
+
+
+def _json_bytes(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
+
+
+def _require(data: Dict[str, Any], name: str) -> str:
+    value = data.get(name)
+    if not isinstance(value, str) or not value.strip():
+        raise BadRequest(f"Thiếu tham số '{name}'")
+    return value
+
+
+class ChatService:
+    """Ứng dụng ASGI (không phụ thuộc framework) đặt trước WorkerPool"""
+
+    def __init__(self, pool: Optional[WorkerPool] = None):
+        self.pool = pool or WorkerPool()
+        self.routes = {
+            ("POST", "/chat"): self._chat,
+            ("POST", "/chat/stream"): self._chat_stream,
+            ("GET", "/memory/search"): self._search,
+            ("GET", "/memory/summary"): self._summary,
+            ("GET", "/healthz"): self._healthz,
+        }
+
+    async def startup(self) -> None:
+        self.pool.start()
+
+    async def shutdown(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.pool.stop)
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        handler = self.routes.get((scope["method"], scope["path"]))
+        if handler is None:
+            known = any(path == scope["path"] for _, path in self.routes)
+            await self._respond(send, 405 if known else 404, {"error": "Not found"})
+            return
+
+        try:
+            if scope["method"] == "POST":
+                try:
+                    params = json.loads(await _read_body(receive) or b"{}")
+                except json.JSONDecodeError:
+                    raise BadRequest("Body không phải JSON hợp lệ")
+                if not isinstance(params, dict):
+                    raise BadRequest("Body phải là một JSON object")
+            else:
+                query = parse_qs(scope.get("query_string", b"").decode("utf-8"))
+                params = {key: values[-1] for key, values in query.items()}
+            await handler(params, send)
+        except BadRequest as e:
+            await self._respond(send, 400, {"error": str(e)})
+        except Overloaded as e:
+            await self._respond(send, e.status, {"error": str(e)}, retry_after=1)
+        except asyncio.TimeoutError:
+            await self._respond(send, 504, {"error": "Hết thời gian chờ xử lý"})
+        except WorkerError as e:
+            await self._respond(send, 500, {"error": str(e)})
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _respond(
+        self, send, status: int, data: Any, retry_after: Optional[int] = None
+    ) -> None:
+        body = _json_bytes(data)
+        headers = [
+            (b"content-type", b"application/json; charset=utf-8"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        if retry_after is not None:
+            headers.append((b"retry-after", str(retry_after).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    def _chat_payload(params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "user_id": _require(params, "user_id"),
+            "session_id": params.get("session_id") or "default",
+            "message": _require(params, "message"),
+        }
+
+    async def _chat(self, params: Dict[str, Any], send) -> None:
+        payload = self._chat_payload(params)
+        result = await self.pool.call(payload["user_id"], "chat", payload)
+        await self._respond(send, 200, result)
+
+    async def _chat_stream(self, params: Dict[str, Any], send) -> None:
+        payload = self._chat_payload(params)
+        # Từ chối (429/503) trước khi gửi header; sau đó lỗi được báo bằng event "error"
+        async with self.pool.slot(payload["user_id"]) as lease:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [
+                        (b"content-type", b"text/event-stream; charset=utf-8"),
+                        (b"cache-control", b"no-cache"),
+                    ],
+                }
+            )
+            try:
+                async for kind, value in self.pool.run(lease, "chat_stream", payload):
+                    if kind == "chunk":
+                        event = b"data: " + _json_bytes({"delta": value}) + b"\n\n"
+                    else:
+                        event = b"event: done\ndata: " + _json_bytes(value) + b"\n\n"
+                    await send({"type": "http.response.body", "body": event, "more_body": True})
+            except (WorkerError, asyncio.TimeoutError) as e:
+                event = b"event: error\ndata: " + _json_bytes({"error": str(e) or type(e).__name__})
+                await send(
+                    {"type": "http.response.body", "body": event + b"\n\n", "more_body": True}
+                )
+            await send({"type": "http.response.body", "body": b""})
+
+    async def _search(self, params: Dict[str, Any], send) -> None:
+        try:
+            k = int(params.get("k") or MAX_RETRIEVED_MEMORIES)
+        except ValueError:
+            raise BadRequest("Tham số 'k' phải là số nguyên")
+        payload = {"user_id": _require(params, "user_id"), "query": _require(params, "q"), "k": k}
+        result = await self.pool.call(payload["user_id"], "search", payload)
+        await self._respond(send, 200, result)
+
+    async def _summary(self, params: Dict[str, Any], send) -> None:
+        payload = {
+            "user_id": _require(params, "user_id"),
+            "session_id": params.get("session_id") or "default",
+        }
+        result = await self.pool.call(payload["user_id"], "summary", payload)
+        await self._respond(send, 200, result)
+
+    async def _healthz(self, params: Dict[str, Any], send) -> None:
+        health = self.pool.health()
+        await self._respond(send, 200 if health["ready"] else 503, health)
+
+
+app = ChatService()
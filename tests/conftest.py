@@ -0,0 +1,56 @@
+"""
+Cấu hình chung cho tests: dữ liệu ghi vào thư mục tạm, embeddings hashing offline
+"""
+
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+# config.py đọc biến môi trường lúc import nên phải đặt trước khi import memory
+_DATA_DIR = Path(tempfile.mkdtemp(prefix="agent-memory-tests-"))
+os.environ.update(
+    DATA_DIR=str(_DATA_DIR),
+    ENTITIES_DIR=str(_DATA_DIR / "entities"),
+    CHAT_HISTORY_DIR=str(_DATA_DIR / "chat_history"),
+    VECTOR_STORE_DIR=str(_DATA_DIR / "vector_store"),
+    SQLITE_DB_PATH=str(_DATA_DIR / "memory.db"),
+    EMBEDDING_PROVIDER="hashing",
+    HASHING_EMBEDDING_DIMENSION="64",
+    GOOGLE_API_KEY=os.environ.get("GOOGLE_API_KEY", "test"),
+)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from memory.providers import HashingEmbeddings  # noqa: E402
+
+
+@pytest.fixture
+def user_id() -> str:
+    """ID người dùng riêng cho mỗi test (dữ liệu không lẫn giữa các test)"""
+    return f"test_{uuid.uuid4().hex[:12]}"
+
+
+@pytest.fixture(scope="session")
+def embeddings() -> HashingEmbeddings:
+    """Embeddings hashing: offline, xác định"""
+    return HashingEmbeddings(64)
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def backend(request, monkeypatch) -> str:
+    """Chạy test với cả hai storage backend"""
+    monkeypatch.setattr("memory.memory_manager.STORAGE_BACKEND", request.param)
+    return request.param
+
+
+@pytest.fixture
+def manager(backend, user_id, embeddings):
+    """MemoryManager của một người dùng mới trên backend đang test"""
+    from memory.memory_manager import MemoryManager
+
+    manager = MemoryManager(user_id, embeddings=embeddings)
+    yield manager
+    manager.wait_for_summaries()
@@ -0,0 +1,83 @@
+"""
+Tests cho cắt kết quả truy xuất theo khoảng cách (adaptive k)
+"""
+
+import random
+
+import pytest
+from langchain.docstore.document import Document
+
+from memory.vector_memory import cut_results
+
+WORDS = (
+    "phở cơm bún trà cà phê bóng đá sách nhạc du lịch Hà Nội Sài Gòn mèo chó "
+    "công việc lập trình python"
+).split()
+
+
+@pytest.fixture(autouse=True)
+def fresh_calibration(monkeypatch):
+    """Không dùng khoảng cách trung vị đã đo ở test khác"""
+    monkeypatch.setattr("memory.vector_memory._DISTANCE_SCALES", {})
+
+
+@pytest.fixture
+def vector_memory(manager):
+    rng = random.Random(1)
+    vector_memory = manager.vector_memory
+    for i in range(80):
+        vector_memory.add_memory(" ".join(rng.sample(WORDS, 5)) + f" số {i}")
+    vector_memory.add_memory("Tôi tên là An, tôi sống ở Đà Nẵng")
+    return vector_memory
+
+
+def _docs(*scores):
+    return [(Document(page_content=str(score)), score) for score in scores]
+
+
+def test_cut_results_threshold_and_gap():
+    results = _docs(0.2, 0.3, 0.9, 1.0, 1.8)
+    assert [s for _, s in cut_results(results)] == [0.2, 0.3, 0.9, 1.0, 1.8]
+    assert [s for _, s in cut_results(results, threshold=0.95)] == [0.2, 0.3, 0.9]
+    assert [s for _, s in cut_results(results, max_gap=0.5)] == [0.2, 0.3]
+    assert cut_results(results, threshold=0.1) == []
+
+
+def test_irrelevant_query_returns_nothing(vector_memory):
+    assert vector_memory.retrieve_memories("xyzzy quux blorp frobnicate") == []
+    assert len(vector_memory.retrieve_memories("xyzzy quux blorp frobnicate", cutoff=False)) == 5
+
+
+def test_relevant_query_keeps_close_matches(vector_memory):
+    results = vector_memory.retrieve_memories_with_scores("Tôi tên là An")
+    assert [doc.page_content for doc, _ in results] == ["Tôi tên là An, tôi sống ở Đà Nẵng"]
+
+    threshold, _ = vector_memory.cutoff_params()
+    broad = vector_memory.retrieve_memories_with_scores("phở cà phê")
+    assert broad and all(score <= threshold for _, score in broad)
+
+
+def test_batch_applies_same_cutoff(vector_memory):
+    queries = ["Tôi tên là An", "xyzzy quux blorp frobnicate", "phở cà phê"]
+    batches = vector_memory.retrieve_memories_batch(queries)
+    assert [[d.page_content for d, _ in b] for b in batches] == [
+        [d.page_content for d in vector_memory.retrieve_memories(q)] for q in queries
+    ]
+
+
+def test_explicit_threshold_overrides_calibration(vector_memory, monkeypatch):
+    embedder_id = vector_memory.index_embedder_id
+    monkeypatch.setattr(
+        "memory.vector_memory.RETRIEVAL_DISTANCE_THRESHOLDS", {embedder_id: 100.0}
+    )
+    monkeypatch.setattr("memory.vector_memory.RETRIEVAL_SCORE_GAP", 0.0)
+    assert vector_memory.cutoff_params() == (100.0, None)
+    assert len(vector_memory.retrieve_memories("xyzzy quux blorp frobnicate")) == 5
+
+
+def test_small_index_without_scale_is_not_cut(manager):
+    vector_memory = manager.vector_memory
+    vector_memory.add_memory("mèo tên Mun")
+    vector_memory.add_memory("chó tên Vàng")
+    assert vector_memory.cutoff_params() == (None, None)
+    assert len(vector_memory.retrieve_memories("xyzzy")) == 2
@@ -0,0 +1,102 @@
+"""
+Tests cho cache kết quả truy xuất và cache phản hồi
+"""
+
+from typing import Any, List, Optional
+
+from chatbot import MemoryChatbot
+from memory.cache import TTLCache, normalize_query
+from memory.memory_manager import MemoryManager
+from memory.providers import StubChatModel
+
+
+class _CountingLLM(StubChatModel):
+    calls: int = 0
+
+    def _generate(self, messages: List[Any], stop: Optional[List[str]] = None, **kwargs: Any):
+        self.calls += 1
+        return super()._generate(messages, stop, **kwargs)
+
+
+def test_lru_evicts_least_recently_used():
+    cache = TTLCache(2, 0)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert len(cache) == 2
+
+    disabled = TTLCache(0, 0)
+    disabled.set("a", 1)
+    assert disabled.get("a") is None
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("memory.cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(10, 5)
+    cache.set("a", 1)
+    now[0] += 4.9
+    assert cache.get("a") == 1
+    now[0] += 0.2
+    assert cache.get("a") is None
+    assert cache.info()["entries"] == 0
+
+
+def test_normalized_queries_share_a_key():
+    assert normalize_query("Bạn nhớ  tên TÔI không?") == normalize_query("bạn nhớ tên tôi không")
+
+
+def test_retrieval_cache_invalidated_by_write(manager):
+    vector_memory = manager.vector_memory
+    vector_memory.add_memory("Tôi thích ăn phở bò")
+    first = vector_memory.retrieve_memories("phở bò", k=5, cutoff=False)
+    hits = vector_memory.retrieval_cache.stats["hits"]
+    assert vector_memory.retrieve_memories("Phở bò?", k=5, cutoff=False) == first
+    assert vector_memory.retrieval_cache.stats["hits"] == hits + 1
+
+    vector_memory.add_memory("Tôi thích ăn phở gà")
+    results = vector_memory.retrieve_memories("phở bò", k=5, cutoff=False)
+    assert "Tôi thích ăn phở gà" in [doc.page_content for doc in results]
+    assert vector_memory.retrieval_cache.stats["hits"] == hits + 1
+    vector_memory.wait_for_maintenance()
+
+
+def test_response_cache_hits_until_memory_changes(manager):
+    llm = _CountingLLM()
+    chatbot = MemoryChatbot(
+        manager.user_id, llm=llm, memory_manager=manager, response_cache=TTLCache(10, 0)
+    )
+
+    answer = chatbot.chat("Thủ đô của Pháp là gì?")
+    assert answer.startswith("Cảm ơn")
+    assert chatbot.chat("thủ đô của pháp là gì") == answer
+    assert llm.calls == 1
+    # Lượt trả lời từ cache vẫn được ghi vào chat history
+    assert manager.chat_history.get_recent_messages(2)[-1].content == answer
+
+    manager.add_entity_fact("sở thích", "Tôi thích du lịch Paris")
+    chatbot.chat("Thủ đô của Pháp là gì?")
+    assert llm.calls == 2
+    manager.vector_memory.wait_for_maintenance()
+
+
+def test_response_cache_is_per_user(backend, embeddings, user_id):
+    cache = TTLCache(10, 0)
+    llm = _CountingLLM()
+    chatbots = [
+        MemoryChatbot(
+            uid,
+            llm=llm,
+            memory_manager=MemoryManager(uid, embeddings=embeddings),
+            response_cache=cache,
+        )
+        for uid in (user_id, f"{user_id}_other")
+    ]
+    for chatbot in chatbots:
+        chatbot.chat("Tên tôi là gì?")
+    assert llm.calls == 2
+    for chatbot in chatbots:
+        chatbot.memory_manager.vector_memory.wait_for_maintenance()
@@ -0,0 +1,75 @@
+"""
+Tests cho chống trùng lặp khi ghi vector memory
+"""
+
+import math
+
+import pytest
+
+from memory.vector_memory import VectorStoreMemory
+
+
+@pytest.fixture
+def dedup(monkeypatch):
+    monkeypatch.setattr("memory.vector_memory.VECTOR_DEDUP_ENABLED", True)
+    monkeypatch.setattr("memory.vector_memory.VECTOR_DEDUP_THRESHOLD", 0.9)
+
+
+@pytest.fixture
+def memory(user_id, embeddings):
+    memory = VectorStoreMemory(user_id, embeddings=embeddings)
+    yield memory
+    memory.wait_for_maintenance()
+
+
+def _at_similarity(similarity, dimension=64):
+    """Vector có cosine similarity cho trước với vector đơn vị đầu tiên"""
+    vector = [0.0] * dimension
+    vector[0], vector[1] = similarity, math.sqrt(1 - similarity**2)
+    return vector
+
+
+def _metadata(memory_type="conversation"):
+    return {"type": memory_type, "timestamp": "2026-01-01T00:00:00"}
+
+
+def test_near_duplicate_skipped_and_counted(dedup, memory):
+    memory.add_memory("Tôi thích ăn phở bò", additional_metadata={"timestamp": "2026-01-01"})
+    memory.add_memory("tôi thích ăn phở bò!", additional_metadata={"timestamp": "2026-02-01"})
+
+    assert memory.metadata_store.count() == 1
+    assert memory.vector_store.index.ntotal == 1
+    (metadata,) = memory.metadata_store.load_all().values()
+    assert metadata["hits"] == 2
+    assert metadata["last_seen"] == "2026-02-01"
+
+
+def test_threshold_boundary(dedup, memory):
+    (first,) = memory._insert(["gốc"], [_at_similarity(1.0)], [_metadata()])
+
+    above, below = memory._insert(
+        ["gần", "xa"],
+        [_at_similarity(0.901), _at_similarity(0.899)],
+        [_metadata(), _metadata()],
+    )
+    assert above == first
+    assert below != first
+    assert memory.metadata_store.count() == 2
+
+    # Khác type thì không coi là trùng
+    (other,) = memory._insert(["gần"], [_at_similarity(0.99)], [_metadata("entity_fact")])
+    assert other not in (first, below)
+
+
+def test_deleted_memory_not_used_as_duplicate(dedup, memory):
+    (first,) = memory._insert(["gốc"], [_at_similarity(1.0)], [_metadata()])
+    memory.delete_memories([first])
+    (again,) = memory._insert(["gốc"], [_at_similarity(1.0)], [_metadata()])
+    assert again != first
+    assert memory.metadata_store.count() == 1
+
+
+def test_disabled_by_default(memory):
+    memory.add_memory("Tôi thích ăn phở bò")
+    memory.add_memory("Tôi thích ăn phở bò")
+    assert memory.metadata_store.count() == 2
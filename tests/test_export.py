@@ -0,0 +1,127 @@
+"""
+Tests cho export/import memory của một người dùng
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from memory.export import FORMAT_NAME, export_memory, import_memory
+from memory.memory_manager import MemoryManager
+
+
+def _snapshot(manager):
+    vector_memory = manager.vector_memory
+    memories = {}
+    for vectors, records in vector_memory.iter_embedded_memories(2):
+        for vector, record in zip(vectors, records):
+            metadata = {k: v for k, v in record["metadata"].items() if k != "user_id"}
+            memories[record["content"]] = (np.asarray(vector), metadata)
+    return {
+        "hot": [m.content for m in manager.chat_history.messages],
+        "archived": [m.content for m in manager.chat_history.get_archived_messages()],
+        "entities": manager.get_all_entities(),
+        "pending": [item["content"] for item in vector_memory.pending_writes.items()],
+        "memories": memories,
+    }
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_export_import_roundtrip(manager, embeddings, user_id, tmp_path, compress):
+    manager.add_user_message("Tôi tên là An")
+    manager.add_ai_message("Chào An")
+    manager.add_user_message("Tôi sống ở Đà Nẵng")
+    manager.chat_history.archive_messages(2)
+    manager.add_entity_fact("tên", "An")
+    manager.add_entity_fact("nơi ở", "Đà Nẵng")
+    manager.vector_memory.pending_writes.append("memory chờ embed", {"type": "conversation"})
+
+    path = tmp_path / "user.agentmem"
+    counts = export_memory(manager, str(path), compress=compress)
+    # Memories đang chờ được embed trước khi export khi embeddings dùng được
+    assert counts["messages"] == 3 and counts["pending"] == 0
+    before = _snapshot(manager)
+    assert "memory chờ embed" in before["memories"]
+    with open(path, "rb") as f:
+        head = f.read(4)
+    assert (head == b"\x28\xb5\x2f\xfd") == compress
+
+    target = MemoryManager(f"{user_id}_copy", embeddings=embeddings)
+    target.add_user_message("dữ liệu cũ sẽ bị thay thế")
+    assert import_memory(target, str(path)) == counts
+    after = _snapshot(target)
+
+    assert after["hot"] == before["hot"]
+    assert after["archived"] == before["archived"]
+    assert after["entities"] == before["entities"]
+    assert after["pending"] == before["pending"]
+    assert after["memories"].keys() == before["memories"].keys()
+    for content, (vector, metadata) in before["memories"].items():
+        np.testing.assert_allclose(after["memories"][content][0], vector, rtol=1e-6)
+        assert after["memories"][content][1] == metadata
+    assert all(
+        md["user_id"] == target.user_id for _, md in target.vector_memory.metadata_store.items()
+    )
+    found = target.vector_memory.retrieve_memories("Tôi sống ở Đà Nẵng", cutoff=False)
+    assert found[0].page_content == "Người dùng nói: Tôi sống ở Đà Nẵng"
+
+
+def test_import_rejects_foreign_file(manager, tmp_path):
+    path = tmp_path / "other.jsonl"
+    path.write_text(json.dumps({"format": "khác"}) + "\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        import_memory(manager, str(path))
+
+    path.write_text(json.dumps({"format": FORMAT_NAME, "version": 99}) + "\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        import_memory(manager, str(path))
+
+
+def test_import_with_other_embedder_queues_memories(manager, user_id, tmp_path):
+    from memory.providers import HashingEmbeddings
+
+    manager.vector_memory.add_memory("tôi nuôi mèo tên Mun")
+    path = tmp_path / "user.agentmem"
+    export_memory(manager, str(path))
+
+    target = MemoryManager(f"{user_id}_copy", embeddings=HashingEmbeddings(32))
+    import_memory(target, str(path))
+    # Vector của embeddings khác không được nạp, memories chờ embed lại
+    pending = [item["content"] for item in target.vector_memory.pending_writes.items()]
+    assert pending == ["tôi nuôi mèo tên Mun"]
+    assert target.vector_memory.vector_store.index.ntotal == 0
+
+    assert target.vector_memory.flush_pending_writes() == 1
+    assert target.vector_memory.retrieve_memories("mèo tên Mun")[0].page_content == pending[0]
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_invalid_archive_leaves_memory_untouched(manager, user_id, embeddings, tmp_path, compress):
+    manager.add_user_message("Tôi tên là An")
+    manager.add_entity_fact("tên", "An")
+    path = tmp_path / "user.agentmem"
+    export_memory(manager, str(path), compress=compress)
+    data = path.read_bytes()
+
+    target = MemoryManager(f"{user_id}_target", embeddings=embeddings)
+    target.add_user_message("dữ liệu cần giữ")
+    target.add_entity_fact("nơi ở", "Huế")
+
+    truncated = tmp_path / "truncated.agentmem"
+    truncated.write_bytes(data[: len(data) * 2 // 3])
+    with pytest.raises(ValueError):
+        import_memory(target, str(truncated))
+
+    if not compress:
+        body, end_line = data.rstrip(b"\n").rsplit(b"\n", 1)
+        end = json.loads(end_line)
+        end["counts"]["messages"] += 1
+        mismatched = tmp_path / "mismatched.agentmem"
+        mismatched.write_bytes(body + b"\n" + json.dumps(end).encode("utf-8") + b"\n")
+        with pytest.raises(ValueError):
+            import_memory(target, str(mismatched))
+
+    assert [m.content for m in target.chat_history.messages] == ["dữ liệu cần giữ"]
+    assert target.get_all_entities() == {"nơi ở": ["Huế"]}
+    assert target.vector_memory.get_memories_count() == 2
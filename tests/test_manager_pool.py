@@ -0,0 +1,51 @@
+"""
+Tests cho MemoryManagerPool
+"""
+
+import threading
+
+from memory.manager_pool import MemoryManagerPool
+
+
+def test_eviction_flush_does_not_block_other_users(embeddings, user_id):
+    pool = MemoryManagerPool(embeddings=embeddings, max_entries=1)
+    first = pool.get(f"{user_id}_a")
+    flushing, release = threading.Event(), threading.Event()
+
+    def slow_flush():
+        flushing.set()
+        release.wait(5)
+
+    first.flush = slow_flush
+    evicting = threading.Thread(target=pool.get, args=(f"{user_id}_b",))
+    evicting.start()
+    assert flushing.wait(5)
+
+    # Người dùng khác vẫn lấy được manager trong lúc flush đang chạy
+    other = threading.Thread(target=pool.get, args=(f"{user_id}_c",))
+    other.start()
+    other.join(2)
+    finished = not other.is_alive()
+    release.set()
+    other.join(5)
+    assert finished
+    evicting.join(5)
+    assert pool.stats["evictions"] == 2
+
+
+def test_reload_waits_for_evicted_flush(embeddings, user_id):
+    pool = MemoryManagerPool(embeddings=embeddings, max_entries=1)
+    first = pool.get(user_id)
+    first.vector_memory.add_memory("tôi nuôi một con mèo tên Mun")
+    flushed = []
+    original_flush = first.flush
+
+    def recorded_flush():
+        original_flush()
+        flushed.append(True)
+
+    first.flush = recorded_flush
+    pool.invalidate(user_id)
+    again = pool.get(user_id)
+    assert flushed and again is not first
+    assert again.vector_memory.get_memories_count() == 1
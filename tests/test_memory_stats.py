@@ -0,0 +1,53 @@
+"""
+Tests cho thống kê tổng quan được materialize (get_memory_summary)
+"""
+
+
+def test_summary_recent_lines_follow_turn_inside_transaction(manager):
+    manager.get_memory_summary()  # dựng thống kê lần đầu
+    for i in range(2):
+        with manager.transaction():
+            manager.add_user_message(f"câu hỏi {i}")
+            manager.save_conversation_context({"input": f"hỏi {i}"}, {"output": f"đáp {i}"})
+
+    summary = manager.get_memory_summary()
+    assert summary["total_messages"] == 6
+    assert summary["conversation_summary"].splitlines()[-2:] == [
+        "Người dùng: hỏi 1...",
+        "AI: đáp 1...",
+    ]
+
+
+def test_pending_count_tracks_append_and_drain(manager):
+    queue = manager.vector_memory.pending_writes
+    assert queue.count() == 0
+    for i in range(3):
+        queue.append(f"memory {i}", {"type": "conversation"})
+    assert queue.count() == 3
+    assert manager.get_memory_summary()["pending_vector_memories"] == 3
+
+    # Process khác ghi thêm vào file: số đếm được làm mới
+    with open(queue.file_path, "a", encoding="utf-8") as f:
+        f.write('{"content": "khác", "metadata": {}}\n')
+    assert queue.count() == 4
+
+    assert queue.drain(lambda items: None) == 4
+    assert queue.count() == 0
+    queue.append("memory mới", {"type": "conversation"})
+    assert queue.count() == 1
+
+
+def test_user_and_session_files_do_not_collide(user_id):
+    from memory.memory_stats import MemoryStatsStore
+
+    # Trước đây cả hai cùng ghi vào "{user_id}_s.json"
+    other_user = MemoryStatsStore(f"{user_id}_s")
+    session = MemoryStatsStore(user_id, "s")
+    other_user.replace(user_state={**MemoryStatsStore.empty_user_state(), "total_entities": 7})
+    session.replace(session_state={**MemoryStatsStore.empty_session_state(), "total_messages": 3})
+
+    assert other_user.user_path != session.session_path
+    session.replace(user_state=MemoryStatsStore.empty_user_state())
+    other_user.replace(session_state=MemoryStatsStore.empty_session_state())
+    assert other_user.load()[0]["total_entities"] == 7
+    assert session.load()[1]["total_messages"] == 3
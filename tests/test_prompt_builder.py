@@ -0,0 +1,67 @@
+"""
+Tests cho việc lắp ráp prompt trong ngân sách token
+"""
+
+from memory.prompt_builder import (
+    PromptBuilder,
+    PromptSection,
+    estimate_tokens,
+    truncate_to_tokens,
+)
+
+SYSTEM = "Bạn là trợ lý thân thiện."
+QUESTION = "Người dùng: Tôi nên ăn gì tối nay?"
+
+
+def _section(name, count, keep="head"):
+    return PromptSection(name, f"{name}:", [f"- {name} dòng {i}" for i in range(count)], keep)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("Xin chào, bạn!") == 5
+    # Từ dài được tính theo số ký tự
+    assert estimate_tokens("internationalization") == 5
+
+
+def test_truncate_to_tokens_fits_budget():
+    text = "một hai ba bốn năm sáu bảy tám"
+    assert truncate_to_tokens(text, 100) == text
+    shortened = truncate_to_tokens(text, 5)
+    assert shortened == "một hai..."
+    assert estimate_tokens(shortened) <= 5
+    assert truncate_to_tokens(text, 3) == ""
+
+
+def test_sections_fit_budget_by_priority():
+    builder = PromptBuilder(100, section_priorities={"entities": 0, "memories": 1, "recent": 2})
+    sections = [_section("recent", 10), _section("entities", 10), _section("memories", 10)]
+    result = builder.build(SYSTEM, sections, QUESTION)
+
+    assert result.total_tokens <= 100
+    # Section ưu tiên cao được giữ nguyên, section kế tiếp bị cắt, section cuối bị bỏ
+    assert result.section_tokens["entities"] == estimate_tokens(
+        " ".join([sections[1].header] + sections[1].lines)
+    )
+    assert result.truncated_sections == ["memories"]
+    assert result.dropped_sections == ["recent"]
+    # Thứ tự hiển thị giữ nguyên theo danh sách sections
+    assert result.text.index("entities:") < result.text.index("memories:")
+
+
+def test_quota_and_tail_sections():
+    builder = PromptBuilder(500, section_quotas={"recent": 12})
+    result = builder.build(SYSTEM, [_section("recent", 10, keep="tail")], QUESTION)
+
+    assert result.truncated_sections == ["recent"]
+    assert result.section_tokens["recent"] <= 12
+    assert "recent dòng 9" in result.text and "recent dòng 0" not in result.text
+
+
+def test_system_prompt_and_question_always_kept():
+    builder = PromptBuilder(5)
+    result = builder.build(SYSTEM, [_section("memories", 3)], QUESTION, footer="Trả lời:")
+
+    assert result.text == "\n".join([SYSTEM, QUESTION, "Trả lời:"])
+    assert result.dropped_sections == ["memories"]
+    assert result.total_tokens > result.token_budget
@@ -0,0 +1,122 @@
+"""
+Tests cho circuit breaker và hàng đợi ghi khi embeddings không dùng được
+"""
+
+import pytest
+
+from memory.circuit_breaker import CircuitBreaker
+from memory.providers import HashingEmbeddings
+from memory.safe_embeddings import (
+    EmbeddingsUnavailableError,
+    SafeGoogleGenerativeAIEmbeddings,
+)
+from memory.vector_memory import VectorStoreMemory
+
+
+class _FlakyEmbeddings(HashingEmbeddings):
+    """Embeddings hashing có thể tạm "mất kết nối" """
+
+    def __init__(self, dimension: int = 64):
+        super().__init__(dimension)
+        self.down = False
+
+    def embed_documents(self, texts):
+        if self.down:
+            raise EmbeddingsUnavailableError("mất kết nối")
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("memory.circuit_breaker.time.monotonic", lambda: now[0])
+    return now
+
+
+def test_breaker_opens_half_opens_and_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock[0] += 10
+    assert breaker.state == "half_open"
+    # Chỉ một lời gọi thử; lỗi thì mở lại ngay dù chưa đủ ngưỡng
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock[0] += 10
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_open_breaker_skips_remote_calls(clock):
+    calls = []
+
+    class _Remote:
+        def embed_documents(self, texts):
+            calls.append(texts)
+            raise RuntimeError("503")
+
+    embeddings = SafeGoogleGenerativeAIEmbeddings("models/embedding-001", "key")
+    embeddings._embeddings = _Remote()
+    embeddings._run_in_thread = lambda func, *args: func(*args)
+    embeddings.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    for _ in range(4):
+        with pytest.raises(EmbeddingsUnavailableError):
+            embeddings.embed_documents(["xin chào"])
+    assert len(calls) == 2
+
+    clock[0] += 30
+    with pytest.raises(EmbeddingsUnavailableError):
+        embeddings.embed_documents(["xin chào"])
+    assert len(calls) == 3
+
+
+def test_writes_queued_while_embeddings_down_then_flushed(user_id):
+    embeddings = _FlakyEmbeddings()
+    memory = VectorStoreMemory(user_id, embeddings=embeddings)
+    memory.add_memory("Tôi nuôi một con mèo tên Mướp")
+    # Job dọn dẹp nền cũng xử lý hàng đợi
+    memory.wait_for_maintenance()
+
+    embeddings.down = True
+    memory.add_memory("Tôi thích ăn bún chả")
+    assert memory.pending_writes.count() == 1
+    assert memory.flush_pending_writes() == 0
+    assert memory.pending_writes.count() == 1
+
+    embeddings.down = False
+    assert memory.flush_pending_writes() == 1
+    assert memory.pending_writes.count() == 0
+    results = memory.retrieve_memories("bún chả", k=1, cutoff=False)
+    assert [doc.page_content for doc in results] == ["Tôi thích ăn bún chả"]
+    memory.wait_for_maintenance()
+
+
+def test_writes_queued_when_index_from_other_embedder(user_id, embeddings):
+    memory = VectorStoreMemory(user_id, embeddings=embeddings)
+    memory.add_memory("Tôi sống ở Đà Nẵng")
+    memory.wait_for_maintenance()
+
+    other = VectorStoreMemory(user_id, embeddings=HashingEmbeddings(32))
+    assert not other.embeddings_compatible()
+    other.add_memory("Tôi làm kỹ sư phần mềm")
+    assert other.pending_writes.count() == 1
+    assert other.retrieve_memories("kỹ sư", k=1, cutoff=False) == []
+    # Không ghi vào index khi vẫn chưa reindex
+    assert other.flush_pending_writes() == 0
+    assert other.vector_store.index.ntotal == 1
+
+    # Embeddings khớp index: memories đang chờ được ghi ở lần ghi kế tiếp
+    same = VectorStoreMemory(user_id, embeddings=embeddings)
+    same.add_memory("Tôi có hai con")
+    assert same.pending_writes.count() == 0
+    assert same.vector_store.index.ntotal == 3
+    same.wait_for_maintenance()
@@ -0,0 +1,55 @@
+"""
+Tests cho xóa memories bằng tombstone và compaction
+"""
+
+from memory.vector_memory import VectorStoreMemory
+
+
+def _reload(manager) -> VectorStoreMemory:
+    """Tải lại vector memory từ đĩa như một process mới"""
+    vector_memory = manager.vector_memory
+    vector_memory.flush()
+    return VectorStoreMemory(
+        manager.user_id,
+        embeddings=vector_memory.embeddings,
+        metadata_store=type(vector_memory.metadata_store)(
+            manager.user_id, *([manager.database] if manager.database else [])
+        ),
+    )
+
+
+def test_deleted_memories_hidden_until_compacted(manager):
+    vector_memory = manager.vector_memory
+    for i in range(3):
+        vector_memory.add_memory(f"người dùng thích bóng đá {i}", "user_message")
+        vector_memory.add_memory(f"AI trả lời về bóng đá {i}", "ai_message")
+    vector_memory.wait_for_maintenance()
+
+    assert vector_memory.delete_memories_where(type="ai_message") == 3
+    vector_memory.wait_for_maintenance()
+    contents = [
+        doc.page_content
+        for doc, _ in vector_memory.retrieve_memories_with_scores("bóng đá", k=6, cutoff=False)
+    ]
+    assert sorted(contents) == [f"người dùng thích bóng đá {i}" for i in range(3)]
+
+    vector_memory.compact()
+    assert vector_memory.vector_store.index.ntotal == 3
+    assert vector_memory.tombstone_ratio() == 0.0
+    assert vector_memory.get_memories_count() == 3
+
+
+def test_delete_all_survives_reload_before_compaction(manager, monkeypatch):
+    monkeypatch.setattr("memory.vector_memory.VECTOR_COMPACTION_THRESHOLD", 1.0)
+    vector_memory = manager.vector_memory
+    for text in ["mèo tên Mun", "chó tên Vàng", "nhà ở Hà Nội"]:
+        vector_memory.add_memory(text)
+    vector_memory.wait_for_maintenance()
+
+    assert vector_memory.delete_memories_where(type="conversation") == 3
+    vector_memory.wait_for_maintenance()
+    assert vector_memory.vector_store.index.ntotal == 3  # tombstone, chưa compaction
+
+    reloaded = _reload(manager)
+    assert reloaded.get_memories_count() == 0
+    assert reloaded.retrieve_memories("mèo tên Mun", cutoff=False) == []
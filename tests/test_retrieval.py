@@ -0,0 +1,51 @@
+"""
+Tests cho truy xuất memories: batch query và giới hạn số kết quả
+"""
+
+import re
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def no_cutoff(monkeypatch):
+    """Tắt cắt kết quả theo khoảng cách để đếm đúng k"""
+    monkeypatch.setattr("memory.vector_memory.RETRIEVAL_DISTANCE_RATIO", 0.0)
+    monkeypatch.setattr("memory.vector_memory.RETRIEVAL_SCORE_GAP", 0.0)
+
+
+def _numbered_lines(summary: str) -> list:
+    return [line for line in summary.splitlines() if re.match(r"\d+\. ", line)]
+
+
+def test_search_relevant_memories_respects_limit(manager):
+    for i in range(8):
+        manager.vector_memory.add_memory(f"tôi thích ăn phở bò số {i}")
+
+    assert len(_numbered_lines(manager.search_relevant_memories("phở bò", limit=2))) == 2
+    assert len(_numbered_lines(manager.search_relevant_memories("phở bò", limit=6))) == 6
+
+
+def test_batch_matches_single_query(manager):
+    vector_memory = manager.vector_memory
+    for text in ["mèo tên Mun", "chó tên Vàng", "nhà ở Hà Nội", "làm kỹ sư phần mềm"]:
+        vector_memory.add_memory(text)
+    queries = ["con mèo", "Hà Nội", "kỹ sư"]
+
+    batches = vector_memory.retrieve_memories_batch(queries, k=2)
+    singles = [vector_memory.retrieve_memories_with_scores(q, k=2) for q in queries]
+    assert [[d.page_content for d, _ in b] for b in batches] == [
+        [d.page_content for d, _ in s] for s in singles
+    ]
+
+
+def test_comprehensive_context_uses_previous_ai_reply(manager):
+    vector_memory = manager.vector_memory
+    vector_memory.add_memory("quán phở Thìn ở Lò Đúc mở cửa từ sáu giờ sáng")
+    for i in range(6):
+        vector_memory.add_memory(f"kể thêm về thời tiết hôm {i}")
+    manager.chat_history.add_ai_message("quán phở Thìn ở Lò Đúc")
+    manager.chat_history.add_user_message("kể thêm đi")
+
+    context = manager.get_comprehensive_context("kể thêm đi", context_limit=2)
+    assert "phở Thìn" in context["relevant_memories"]
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from server import WorkerPool
+
+
+class _Inbox:
+    def __init__(self):
+        self.jobs = []
+
+    def put(self, job):
+        self.jobs.append(job)
+
+
+def _pool(**kwargs) -> WorkerPool:
+    pool = WorkerPool(workers=1, **kwargs)
+    pool._inboxes = [_Inbox()]
+    return pool
+
+
+def test_timed_out_job_keeps_slot_until_worker_finishes():
+    async def scenario():
+        pool = _pool(user_concurrency=1, user_queue=1, timeout=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.call("a", "chat", {})
+        job_id = pool._inboxes[0].jobs[0][0]
+        assert pool._inflight == [1]
+        assert "a" in pool._users
+
+        # Request kế tiếp của cùng người dùng phải chờ job cũ xong ở worker
+        waiting = asyncio.ensure_future(pool.call("a", "chat", {}))
+        await asyncio.sleep(0.01)
+        assert len(pool._inboxes[0].jobs) == 1
+
+        pool._dispatch(("result", job_id, "cũ"))
+        await asyncio.sleep(0.01)
+        assert len(pool._inboxes[0].jobs) == 2
+        pool._dispatch(("result", pool._inboxes[0].jobs[1][0], "mới"))
+        assert await waiting == "mới"
+        assert pool._inflight == [0]
+        assert pool._users == {}
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_stream_released_by_worker_error():
+    async def scenario():
+        pool = _pool(timeout=5)
+        async with pool.slot("a") as lease:
+            stream = pool.run(lease, "chat_stream", {})
+            task = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0)
+            job_id = pool._inboxes[0].jobs[0][0]
+            pool._dispatch(("chunk", job_id, "x"))
+            assert await task == ("chunk", "x")
+        # Client ngắt kết nối giữa chừng: slot vẫn bị giữ
+        assert pool._inflight == [1]
+        pool._dispatch(("chunk", job_id, "y"))
+        assert pool._inflight == [1]
+        pool._dispatch(("error", job_id, "lỗi"))
+        assert pool._inflight == [0]
+        assert pool._users == {}
+        await stream.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_finished_job_released_with_caller():
+    async def scenario():
+        pool = _pool(timeout=5)
+        task = asyncio.ensure_future(pool.call("a", "search", {}))
+        await asyncio.sleep(0)
+        pool._dispatch(("result", pool._inboxes[0].jobs[0][0], []))
+        assert await task == []
+        assert pool._inflight == [0]
+        assert pool._abandoned == {}
+
+    asyncio.run(scenario())
@@ -0,0 +1,58 @@
+"""
+Tests cho tri thức dùng chung: phạm vi global/private và reindex các shard
+"""
+
+import pytest
+
+from memory.providers import HashingEmbeddings
+from memory.shared_memory import SCOPE_PRIVATE, SharedKnowledgeIndex
+
+GLOBAL_DOCS = ["Cửa hàng mở cửa từ 8 giờ sáng", "Phí giao hàng là 20 nghìn"]
+PRIVATE_A = ["Mật khẩu wifi nhà A là hoa-sen", "A dị ứng với đậu phộng"]
+PRIVATE_B = ["B đặt lịch khám răng thứ hai"]
+EVERYTHING = GLOBAL_DOCS + PRIVATE_A + PRIVATE_B
+
+
+@pytest.fixture
+def index(tmp_path, embeddings):
+    index = SharedKnowledgeIndex(embeddings, tmp_path / "shared", shards=3, threads=2)
+    index.add(GLOBAL_DOCS)
+    index.add(PRIVATE_A, owner="a", scope=SCOPE_PRIVATE)
+    index.add(PRIVATE_B, owner="b", scope=SCOPE_PRIVATE)
+    return index
+
+
+def _visible(index, user_id, query=""):
+    embedding = index.embeddings.embed_query(query or EVERYTHING[0])
+    return {doc.page_content for doc, _ in index.search(embedding, user_id, k=len(EVERYTHING))}
+
+
+def test_private_documents_only_visible_to_owner(index):
+    assert _visible(index, "a") == set(GLOBAL_DOCS + PRIVATE_A)
+    assert _visible(index, "b") == set(GLOBAL_DOCS + PRIVATE_B)
+    assert _visible(index, "c") == set(GLOBAL_DOCS)
+    assert _visible(index, None) == set(GLOBAL_DOCS)
+    # Kể cả khi câu hỏi trùng khớp document private của người khác
+    assert not _visible(index, "b", PRIVATE_A[0]) & set(PRIVATE_A)
+
+
+def test_private_requires_owner(index):
+    with pytest.raises(ValueError):
+        index.add(["không có owner"], scope=SCOPE_PRIVATE)
+
+
+def test_delete_owner_removes_only_their_private_documents(index):
+    assert index.delete_owner("a") == len(PRIVATE_A)
+    assert index.count() == len(GLOBAL_DOCS) + len(PRIVATE_B)
+    assert _visible(index, "a") == set(GLOBAL_DOCS)
+    assert _visible(index, "b") == set(GLOBAL_DOCS + PRIVATE_B)
+
+
+def test_reindex_after_embedder_change(index, tmp_path):
+    changed = SharedKnowledgeIndex(HashingEmbeddings(32), tmp_path / "shared", shards=3)
+    # Shard của embeddings cũ bị bỏ qua thay vì so sánh hai không gian vector
+    assert _visible(changed, None) == set()
+
+    assert changed.reindex(batch_size=2) == len(EVERYTHING)
+    assert _visible(changed, "a") == set(GLOBAL_DOCS + PRIVATE_A)
+    assert _visible(changed, "b") == set(GLOBAL_DOCS + PRIVATE_B)
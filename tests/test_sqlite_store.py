@@ -0,0 +1,68 @@
+"""
+Tests cho SQLite storage engine
+"""
+
+import sqlite3
+
+import pytest
+
+from memory.sqlite_store import SQLiteDatabase, SQLiteVectorMetadataStore
+
+
+def test_filter_existing_handles_more_ids_than_sql_variables(tmp_path):
+    database = SQLiteDatabase(tmp_path / "m.db")
+    # Giới hạn mặc định của nhiều bản SQLite cũ
+    database._connection().setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    store = SQLiteVectorMetadataStore("u", database)
+    store.add_many((f"id{i}", {"type": "conversation"}) for i in range(0, 2500, 2))
+
+    ids = [f"id{i}" for i in range(2500)]
+    assert store.filter_existing(ids) == {f"id{i}" for i in range(0, 2500, 2)}
+    assert store.filter_existing([]) == set()
+
+
+def test_after_transaction_runs_when_outer_block_ends(tmp_path):
+    database = SQLiteDatabase(tmp_path / "m.db")
+    store = SQLiteVectorMetadataStore("u", database)
+    seen = []
+
+    database.after_transaction(lambda: seen.append("ngay"))
+    with database.transaction():
+        store.add("a", {"type": "conversation"})
+        with database.transaction():
+            database.after_transaction(lambda: seen.append(store.count()))
+        # Lệnh ghi còn chờ, callback chưa chạy
+        assert store.count() == 0
+        assert seen == ["ngay"]
+    assert seen == ["ngay", 1]
+
+    with pytest.raises(RuntimeError):
+        with database.transaction():
+            store.add("b", {"type": "conversation"})
+            database.after_transaction(lambda: seen.append("rollback"))
+            raise RuntimeError()
+    assert seen[-1] == "rollback"
+    assert store.filter_existing(["a", "b"]) == {"a"}
+
+
+def test_memory_added_inside_transaction_visible_after_commit(tmp_path, user_id, embeddings):
+    from memory.vector_memory import VectorStoreMemory
+
+    database = SQLiteDatabase(tmp_path / "m.db")
+    memory = VectorStoreMemory(
+        user_id, embeddings=embeddings, metadata_store=SQLiteVectorMetadataStore(user_id, database)
+    )
+    version = memory.memory_version
+    with database.transaction():
+        memory.add_memory("Tôi thích leo núi")
+        # Metadata chưa commit: đọc lại trong transaction chưa thấy memory mới
+        assert memory.retrieve_memories("leo núi", k=1, cutoff=False) == []
+        assert memory.memory_version == version
+        # Compaction (kể cả ở thread nền) không xóa memory đang chờ commit
+        memory.wait_for_maintenance()
+        assert memory.tombstone_ratio() == 0
+        assert memory.compact() == 0
+    assert memory.memory_version != version
+    results = memory.retrieve_memories("leo núi", k=1, cutoff=False)
+    assert [doc.page_content for doc in results] == ["Tôi thích leo núi"]
+    memory.wait_for_maintenance()
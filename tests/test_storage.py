@@ -0,0 +1,89 @@
+"""
+Tests cho các tiện ích ghi nguyên tử
+"""
+
+import pytest
+
+from memory.storage import atomic_save_dir, dir_generation, load_with_retry, read_json
+
+
+def _writer(text):
+    def write(folder):
+        folder.mkdir(parents=True)
+        (folder / "data.txt").write_text(text)
+
+    return write
+
+
+def _generations(path):
+    return sorted(p.name for p in path.parent.glob(f".{path.name}.*") if p.is_dir())
+
+
+def test_atomic_save_dir_keeps_one_previous_generation(tmp_path):
+    path = tmp_path / "index"
+    first = atomic_save_dir(path, _writer("1"))
+    assert dir_generation(path) == first
+    assert (path / "data.txt").read_text() == "1"
+
+    # Người đọc đã mở thế hệ cũ vẫn đọc được sau khi đổi symlink
+    reader = tmp_path / first
+    second = atomic_save_dir(path, _writer("2"))
+    assert (path / "data.txt").read_text() == "2"
+    assert (reader / "data.txt").read_text() == "1"
+    assert _generations(path) == sorted([first, second])
+
+    third = atomic_save_dir(path, _writer("3"))
+    assert not reader.exists()
+    assert _generations(path) == sorted([second, third])
+    assert (path / "data.txt").read_text() == "3"
+
+
+def test_atomic_save_dir_converts_legacy_directory(tmp_path):
+    path = tmp_path / "index"
+    path.mkdir()
+    (path / "data.txt").write_text("cũ")
+
+    atomic_save_dir(path, _writer("mới"))
+    assert path.is_symlink()
+    assert (path / "data.txt").read_text() == "mới"
+    atomic_save_dir(path, _writer("mới hơn"))
+    atomic_save_dir(path, _writer("mới nhất"))
+    assert len(_generations(path)) == 2
+
+
+def test_read_json_backs_up_corrupt_file(tmp_path):
+    path = tmp_path / "data.json"
+    assert read_json(path, {"x": 1}) == {"x": 1}
+
+    path.write_text('{"a": 1,', encoding="utf-8")
+    assert read_json(path, {}) == {}
+    backups = list(tmp_path.glob("data.json.corrupt-*"))
+    assert len(backups) == 1
+    assert backups[0].read_text(encoding="utf-8") == '{"a": 1,'
+
+
+def test_load_with_retry(monkeypatch):
+    monkeypatch.setattr("memory.storage.time.sleep", lambda seconds: None)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise FileNotFoundError("thế hệ vừa bị thay")
+        return "ok"
+
+    assert load_with_retry(flaky) == "ok"
+    assert len(calls) == 3
+
+    def broken():
+        calls.append(1)
+        # faiss.read_index báo file không tồn tại bằng RuntimeError
+        raise RuntimeError("không đọc được index")
+
+    calls.clear()
+    with pytest.raises(RuntimeError):
+        load_with_retry(broken, attempts=2)
+    assert len(calls) == 2
+
+    with pytest.raises(ValueError):
+        load_with_retry(lambda: int("không phải số"))
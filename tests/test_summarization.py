@@ -0,0 +1,86 @@
+"""
+Tests cho tầng tóm tắt hội thoại theo block
+"""
+
+import pytest
+
+
+@pytest.fixture
+def summarizing(monkeypatch):
+    """Block 2 lượt (4 messages), giữ tối thiểu 2 messages trong file hot"""
+    monkeypatch.setattr("memory.memory_manager.SUMMARY_BLOCK_TURNS", 2)
+    monkeypatch.setattr("memory.memory_manager.HISTORY_HOT_MESSAGES", 2)
+    monkeypatch.setattr("memory.memory_manager.SUMMARY_ARCHIVE_RAW", True)
+
+
+def _chat(manager, turns: int, start: int = 0) -> None:
+    for i in range(start, start + turns):
+        manager.add_user_message(f"Câu hỏi số {i} về chủ đề{i}.")
+        manager.add_ai_message(f"Câu trả lời số {i} về chủ đề{i}.")
+        manager.wait_for_summaries()
+
+
+def test_hot_cap_keeps_unsummarized_messages(summarizing, monkeypatch, user_id, embeddings):
+    monkeypatch.setattr("memory.memory_manager.STORAGE_BACKEND", "json")
+    monkeypatch.setattr("memory.json_chat_history.HISTORY_HOT_MAX_MESSAGES", 2)
+    # Tóm tắt bị chặn: giới hạn file hot không được đẩy messages chưa tóm tắt đi
+    monkeypatch.setattr("memory.memory_manager.MemoryManager._schedule_summarization", lambda self: None)
+    from memory.memory_manager import MemoryManager
+
+    manager = MemoryManager(user_id, embeddings=embeddings)
+    _chat(manager, 3)
+    assert manager.chat_history.get_archived_count() == 0
+
+    manager._summarize_pending_blocks()
+    assert manager.summary_store.get_summarized_until() == 4
+    blocks = manager.summary_store.load()["blocks"]
+    assert "chủ đề0" in blocks[0]["summary"]
+
+    # Sau khi tóm tắt, lần ghi tiếp theo được chuyển phần đã tóm tắt
+    manager.add_user_message("Câu hỏi cuối.")
+    assert manager.chat_history.get_archived_count() == 4
+
+
+def test_blocks_summarized_and_archived(summarizing, manager):
+    _chat(manager, 5)
+
+    assert manager.summary_store.get_summarized_until() == 8
+    blocks = manager.summary_store.load()["blocks"]
+    assert [(block["start"], block["end"]) for block in blocks] == [(0, 4), (4, 8)]
+    assert "chủ đề0" in blocks[0]["summary"]
+    assert manager.summary_store.get_rolling_summary()
+    # Messages đã tóm tắt được lưu trữ, file hot giữ lại HISTORY_HOT_MESSAGES ở cuối
+    history = manager.chat_history
+    assert history.get_archived_count() == 6
+    assert history.get_messages_count() == 4
+    assert [m.content for m in history.messages][-1] == "Câu trả lời số 4 về chủ đề4."
+
+
+def test_block_check_does_not_reparse_history(summarizing, monkeypatch, user_id):
+    from memory.json_chat_history import JSONChatMessageHistory
+
+    history = JSONChatMessageHistory(user_id)
+    for i in range(3):
+        history.add_user_message(f"message {i}")
+    loads = []
+    original = history._load_messages
+    monkeypatch.setattr(history, "_load_messages", lambda: loads.append(1) or original())
+
+    assert history.get_messages_count() == 3
+    assert not loads
+
+    # Process khác ghi lại file: số messages được đếm lại
+    other = JSONChatMessageHistory(user_id)
+    other.add_user_message("message 3")
+    assert history.get_messages_count() == 4
+    assert loads
+
+
+def test_turn_in_transaction_summarized_after_commit(summarizing, manager):
+    _chat(manager, 1)
+    with manager.transaction():
+        manager.add_user_message("Câu hỏi số 1 về chủ đề1.")
+        manager.add_ai_message("Câu trả lời số 1 về chủ đề1.")
+    manager.wait_for_summaries()
+
+    assert manager.summary_store.get_summarized_until() == 4
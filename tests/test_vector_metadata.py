@@ -0,0 +1,43 @@
+"""
+Tests cho log metadata của vector memory: tombstone và compaction
+"""
+
+from memory.vector_metadata import JSONVectorMetadataStore
+
+
+def test_log_tombstones_and_compaction(user_id):
+    store = JSONVectorMetadataStore(user_id)
+    store.add_many((f"id{i}", {"type": "user_message" if i % 2 else "ai_message"}) for i in range(6))
+    store.remove(["id0", "id1", "id2"])
+
+    assert store.count() == 3
+    assert store.filter_existing(["id0", "id3", "id5", "khác"]) == {"id3", "id5"}
+    assert sorted(store.find(type="user_message")) == ["id3", "id5"]
+    assert store.garbage_ratio() == 1 - 3 / 9  # 9 dòng log, 3 memories còn tồn tại
+
+    store.compact()
+    assert store.garbage_ratio() == 0.0
+    assert store.load_all() == {
+        "id3": {"type": "user_message"},
+        "id4": {"type": "ai_message"},
+        "id5": {"type": "user_message"},
+    }
+    with open(store.file_path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 3
+
+
+def test_log_sees_other_writers_and_skips_partial_line(user_id):
+    store = JSONVectorMetadataStore(user_id)
+    other = JSONVectorMetadataStore(user_id)  # như một process khác
+    store.add("a", {"type": "conversation"})
+    assert other.count() == 1
+
+    other.remove(["a"])
+    other.add("b", {"type": "conversation"})
+    with open(store.file_path, "a", encoding="utf-8") as f:
+        f.write('{"op": "add", "id": "c", "metad')  # dòng đang ghi dở
+    assert store.load_all() == {"b": {"type": "conversation"}}
+
+    other.compact()  # ghi lại file (inode mới)
+    assert store.load_all() == {"b": {"type": "conversation"}}
+